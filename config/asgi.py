@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# Varredura periódica de plantões expirados (opcional, SHIFT_EXPIRY_INTERVAL)
+from shifts.expiry import start_expiry_runner  # noqa: E402
+
+start_expiry_runner()
@@ -46,12 +46,14 @@ INSTALLED_APPS = [
     "allauth",
     "allauth.account",
     "django_browser_reload",
+    "django_htmx",
     # Local Apps
     "useraccount",
     "shifts",
 ]
 
 MIDDLEWARE = [
+    "shifts.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -60,6 +62,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "allauth.account.middleware.AccountMiddleware",
+    "django_htmx.middleware.HtmxMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "django_browser_reload.middleware.BrowserReloadMiddleware",
 ]
@@ -101,13 +104,71 @@ DATABASES = {
     )
 }
 
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    # SQLite (dev/testes) com threads (pool de e-mail, teste de concorrência):
+    # WAL deixa leitores e o writer em paralelo, BEGIN IMMEDIATE pega o lock
+    # de escrita no início da transação (sem "database is locked" ao promover
+    # leitura a escrita) e timeout espera o lock em vez de falhar.
+    DATABASES["default"]["OPTIONS"] = {
+        "transaction_mode": "IMMEDIATE",
+        "timeout": 20,
+        "init_command": "PRAGMA journal_mode=WAL;",
+    }
+    # Banco de teste em arquivo: o em memória compartilhado trava por tabela
+    DATABASES["default"]["TEST"] = {"NAME": str(BASE_DIR / "test_db.sqlite3")}
+
+# -----------------------------------------------------------------------------
+# 4.1 Cache
+# -----------------------------------------------------------------------------
+# A invalidação da agenda usa um contador de versão por grupo guardado no
+# cache. Com vários workers (gunicorn) o cache precisa ser compartilhado entre
+# processos, por isso fora do DEBUG o padrão é o DatabaseCache
+# (python manage.py createcachetable).
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND",
+            (
+                "django.core.cache.backends.locmem.LocMemCache"
+                if DEBUG
+                else "django.core.cache.backends.db.DatabaseCache"
+            ),
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", "oncall" if DEBUG else "oncall_cache"),
+    }
+}
+
+AGENDA_CACHE_TIMEOUT = int(os.getenv("AGENDA_CACHE_TIMEOUT", str(60 * 60)))
+
+# GET condicional (ETag) do dashboard: o salt muda a cada deploy (templates
+# novos) e a janela limita por quanto tempo um 304 ignora o relógio.
+ETAG_SALT = os.getenv("RENDER_GIT_COMMIT", "")
+ETAG_TIME_BUCKET = int(os.getenv("ETAG_TIME_BUCKET", "300"))
+
+# Caixa de trocas (TradeInbox) por usuário; curto porque "plantões futuros"
+# muda com o relógio. Mudanças em trocas/plantões invalidam antes disso.
+TRADE_INBOX_CACHE_TIMEOUT = int(os.getenv("TRADE_INBOX_CACHE_TIMEOUT", "300"))
+
+# Sugestões de contra-oferta: quantas mostrar e, para o dono procurar com quem
+# trocar, a distância máxima (dias) entre plantões equivalentes
+SWAP_MATCH_LIMIT = int(os.getenv("SWAP_MATCH_LIMIT", "10"))
+SWAP_MATCH_WINDOW_DAYS = int(os.getenv("SWAP_MATCH_WINDOW_DAYS", "7"))
+
+# Extrato individual: plantões por página ("Carregar mais" via htmx)
+EXTRACT_PAGE_SIZE = int(os.getenv("EXTRACT_PAGE_SIZE", "30"))
+
+# Mural de trocas do grupo: ofertas por página ("Carregar mais" via htmx)
+MARKETPLACE_PAGE_SIZE = int(os.getenv("MARKETPLACE_PAGE_SIZE", "20"))
+
 # -----------------------------------------------------------------------------
 # 5. Templates & Static Files
 # -----------------------------------------------------------------------------
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates com tempo de render para o Server-Timing
+        "BACKEND": "shifts.middleware.MeteredDjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -169,3 +230,59 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv("EMAIL_SENDER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_PASSWORD")
 DEFAULT_FROM_EMAIL = f"On Call <{EMAIL_HOST_USER}>"
+EMAIL_TIMEOUT = int(os.getenv("EMAIL_TIMEOUT", "10"))
+
+# Envio em background (shifts.utils): fila limitada por processo, drenada
+# por um pool fixo de workers que reaproveitam a conexão SMTP e enviam em
+# lote. 0 workers = envio síncrono (padrão dos testes, em shifts.testing).
+EMAIL_WORKER_COUNT = int(os.getenv("EMAIL_WORKER_COUNT", "2"))
+EMAIL_QUEUE_SIZE = int(os.getenv("EMAIL_QUEUE_SIZE", "500"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "20"))
+# Fila cheia: espera até N segundos e então envia na própria requisição
+EMAIL_ENQUEUE_TIMEOUT = float(os.getenv("EMAIL_ENQUEUE_TIMEOUT", "2"))
+# Fecha a conexão SMTP ociosa (o servidor derruba conexões paradas)
+EMAIL_IDLE_TIMEOUT = float(os.getenv("EMAIL_IDLE_TIMEOUT", "30"))
+# Ao encerrar o processo, tempo máximo para esvaziar a fila
+EMAIL_SHUTDOWN_TIMEOUT = float(os.getenv("EMAIL_SHUTDOWN_TIMEOUT", "10"))
+
+# Caixa de saída (OutboundEmail / dispatch_emails)
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+# Backoff exponencial entre tentativas (segundos): base, 2x, 4x... até o teto
+EMAIL_RETRY_BACKOFF = int(os.getenv("EMAIL_RETRY_BACKOFF", "60"))
+EMAIL_RETRY_BACKOFF_MAX = int(os.getenv("EMAIL_RETRY_BACKOFF_MAX", "3600"))
+# Tempo em que uma linha reivindicada fica reservada para quem a pegou
+EMAIL_CLAIM_LEASE = int(os.getenv("EMAIL_CLAIM_LEASE", "300"))
+# Limite de destinatários por mensagem nas difusões para o grupo (BCC)
+EMAIL_MAX_RECIPIENTS = int(os.getenv("EMAIL_MAX_RECIPIENTS", "50"))
+
+# -----------------------------------------------------------------------------
+# 9. Shifts (Expiração)
+# -----------------------------------------------------------------------------
+# Intervalo (segundos) do executor periódico no processo web. 0 desliga e a
+# expiração fica por conta do cron: python manage.py expire_shifts
+SHIFT_EXPIRY_INTERVAL = int(os.getenv("SHIFT_EXPIRY_INTERVAL", "0"))
+SHIFT_EXPIRY_BATCH_SIZE = int(os.getenv("SHIFT_EXPIRY_BATCH_SIZE", "500"))
+
+# -----------------------------------------------------------------------------
+# 10. Observabilidade (Server-Timing / Logs)
+# -----------------------------------------------------------------------------
+# Requisições acima de qualquer orçamento são logadas como WARNING.
+REQUEST_QUERY_BUDGET = int(os.getenv("REQUEST_QUERY_BUDGET", "30"))
+REQUEST_LATENCY_BUDGET_MS = int(os.getenv("REQUEST_LATENCY_BUDGET_MS", "500"))
+# Server-Timing expõe tempos internos (SQL, render) a qualquer cliente: só em
+# desenvolvimento por padrão; em produção, habilite explicitamente.
+REQUEST_METRICS_HEADER = os.getenv("REQUEST_METRICS_HEADER", str(DEBUG)) == "True"
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "shifts": {
+            "handlers": ["console"],
+            "level": os.getenv("SHIFTS_LOG_LEVEL", "WARNING" if DEBUG else "INFO"),
+        },
+    },
+}
@@ -16,6 +16,7 @@ fi
 
 python manage.py collectstatic --noinput
 python manage.py migrate
+python manage.py createcachetable
 
 if [ "$DEBUG" = "True" ]; then
     echo "🔧 Modo Desenvolvimento: Rodando runserver..."
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Shift, ShiftType, Group
+from .models import NotificationEvent, OutboundEmail, Shift, ShiftType, Group
 
 
 @admin.register(Group)
@@ -41,3 +41,18 @@ class ShiftAdmin(admin.ModelAdmin):
         return obj.get_duration_display()
 
     duration_display.short_description = "Duração"
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ("subject", "status", "attempts", "next_attempt_at", "created_at")
+    list_filter = ("status",)
+    search_fields = ("subject", "last_error")
+    readonly_fields = ("created_at", "sent_at", "last_error")
+
+
+@admin.register(NotificationEvent)
+class NotificationEventAdmin(admin.ModelAdmin):
+    list_display = ("recipient", "kind", "title", "created_at", "sent_at")
+    list_filter = ("kind",)
+    search_fields = ("recipient__email", "title")
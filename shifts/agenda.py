@@ -0,0 +1,133 @@
+# agenda.py
+import calendar
+from collections import defaultdict
+from datetime import date
+from functools import lru_cache
+
+from django.utils import timezone
+
+
+@lru_cache(maxsize=64)
+def month_skeleton(year, month):
+    """
+    Esqueleto imutável do mês: (data, é_fim_de_semana) para cada dia.
+    Calculado uma vez por (ano, mês) e reaproveitado entre requisições.
+    """
+    first_weekday, num_days = calendar.monthrange(year, month)
+    return tuple(
+        (date(year, month, day_num), (first_weekday + day_num - 1) % 7 >= 5)
+        for day_num in range(1, num_days + 1)
+    )
+
+
+def bucket_by_local_date(shifts):
+    """
+    Agrupa os plantões pela data local de início em uma única passada.
+    Mantém a ordem de chegada (a query já vem ordenada por start_time).
+    """
+    tz = timezone.get_current_timezone()
+    buckets = defaultdict(list)
+    for shift in shifts:
+        buckets[shift.start_time.astimezone(tz).date()].append(shift)
+    return buckets
+
+
+def drop_trailing_day(shifts):
+    """
+    Remove do fim da página os plantões do último dia, que pode continuar
+    na página seguinte; assim um dia nunca aparece partido em dois blocos.
+    Se a página inteira for de um único dia, mantém tudo.
+    """
+    if not shifts:
+        return shifts
+    tz = timezone.get_current_timezone()
+    last_date = shifts[-1].start_time.astimezone(tz).date()
+    kept = [s for s in shifts if s.start_time.astimezone(tz).date() != last_date]
+    return kept or shifts
+
+
+def _agenda_day(date_obj, is_weekend, day_shifts, today, show_month):
+    return {
+        "date": date_obj,
+        "day_number": date_obj.day,
+        "is_today": date_obj == today,
+        "is_weekend": is_weekend,
+        "shifts": day_shifts,
+        "show_month": show_month,
+    }
+
+
+def build_month_agenda(year, month, shifts, today):
+    """Grid mensal completo (1 a 28/31), com dias livres."""
+    buckets = bucket_by_local_date(shifts)
+    return [
+        _agenda_day(date_obj, is_weekend, buckets.get(date_obj, []), today, False)
+        for date_obj, is_weekend in month_skeleton(year, month)
+    ]
+
+
+def build_extract_agenda(shifts, today):
+    """Somente os dias com plantão (extrato individual / visão anual)."""
+    buckets = bucket_by_local_date(shifts)
+    return [
+        _agenda_day(date_obj, date_obj.weekday() >= 5, day_shifts, today, True)
+        for date_obj, day_shifts in buckets.items()
+    ]
+
+
+def _heat_level(count, max_count):
+    """Intensidade 0-4 do dia em relação ao dia mais cheio do ano."""
+    if not count:
+        return 0
+    return min(4, 1 + (count * 4 - 1) // max_count)
+
+
+def build_year_heatmap(year, day_stats, today):
+    """
+    Monta os 12 meses do mapa de calor a partir das linhas agregadas
+    (dia, tipo, contagem, horas) de annual_day_stats.
+    """
+    days = {}
+    for row in day_stats:
+        day = days.setdefault(row["day"], {"count": 0, "hours": 0, "mix": []})
+        day["count"] += row["count"]
+        day["hours"] += row["hours"] or 0
+        day["mix"].append(
+            {
+                "name": row["shift_type__name"],
+                "color": row["shift_type__color"],
+                "count": row["count"],
+            }
+        )
+
+    max_count = max((d["count"] for d in days.values()), default=0)
+    empty = {"count": 0, "hours": 0, "mix": []}
+
+    months = []
+    for month in range(1, 13):
+        skeleton = month_skeleton(year, month)
+        month_days = []
+        for date_obj, is_weekend in skeleton:
+            stats = days.get(date_obj, empty)
+            month_days.append(
+                {
+                    "date": date_obj,
+                    "day_number": date_obj.day,
+                    "is_today": date_obj == today,
+                    "is_weekend": is_weekend,
+                    "count": stats["count"],
+                    "hours": stats["hours"],
+                    "mix": stats["mix"],
+                    "level": _heat_level(stats["count"], max_count),
+                }
+            )
+        months.append(
+            {
+                "date": skeleton[0][0],
+                "leading_blanks": range(skeleton[0][0].weekday()),
+                "days": month_days,
+                "shift_count": sum(d["count"] for d in month_days),
+                "hours": sum(d["hours"] for d in month_days),
+            }
+        )
+    return months
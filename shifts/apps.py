@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ShiftsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shifts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
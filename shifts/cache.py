@@ -0,0 +1,168 @@
+# cache.py
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import ShiftType
+
+AGENDA_HITS_KEY = "shifts:agenda:hits"
+AGENDA_MISSES_KEY = "shifts:agenda:misses"
+
+
+def _incr(key, delta=1, initial=0):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, initial, None)
+        return cache.incr(key, delta)
+
+
+# ------------------------------------------------------------------------------
+# Versões por grupo e por usuário
+# ------------------------------------------------------------------------------
+
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        # Semente baseada no relógio: se a chave for despejada do cache,
+        # a nova versão nunca colide com entradas antigas.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_on_commit(keys):
+    """
+    Incrementa agora (mesma requisição) e de novo após o commit, para que uma
+    leitura concorrente não grave no cache o estado anterior à transação.
+    """
+    keys = list(keys)
+    if not keys:
+        return
+
+    def bump():
+        for key in keys:
+            _incr(key, initial=time.time_ns())
+
+    bump()
+    transaction.on_commit(bump)
+
+
+# Vale para todos os grupos (ex.: tipo de plantão global renomeado)
+GLOBAL_GROUP_VERSION_KEY = "shifts:group:global:version"
+
+
+def _group_version_key(group_id):
+    return f"shifts:group:{group_id}:version"
+
+
+def _user_version_key(user_id):
+    return f"shifts:user:{user_id}:version"
+
+
+def group_version(group_id):
+    """Versão do grupo combinada com a global, lidas em uma ida ao cache."""
+    keys = [_group_version_key(group_id), GLOBAL_GROUP_VERSION_KEY]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            versions[key] = _version(key)
+    return "{}.{}".format(*(versions[key] for key in keys))
+
+
+def user_version(user_id):
+    return _version(_user_version_key(user_id))
+
+
+def invalidate_group(group_id):
+    """
+    Invalida tudo que é derivado dos plantões/dados do grupo. Sem grupo
+    (dado global, como um tipo de plantão global), invalida todos.
+    """
+    if group_id is None:
+        _bump_on_commit([GLOBAL_GROUP_VERSION_KEY])
+    else:
+        _bump_on_commit([_group_version_key(group_id)])
+
+
+def invalidate_users(*user_ids):
+    """Invalida o estado pessoal (trocas, grupos, perfil) dos usuários."""
+    _bump_on_commit(_user_version_key(uid) for uid in set(user_ids) if uid)
+
+
+# ------------------------------------------------------------------------------
+# Tipos de plantão por grupo
+# ------------------------------------------------------------------------------
+
+GLOBAL_SHIFT_TYPES_VERSION_KEY = "shifts:shift_types:global:version"
+
+
+def _shift_types_version_key(group_id):
+    return f"shifts:shift_types:{group_id}:version"
+
+
+def group_shift_types(group_id):
+    """
+    Registro dos tipos de plantão do grupo (inclui os globais), cacheado.
+    Fonte única para o dashboard, os filtros e o ShiftForm.
+    """
+    key = (
+        f"shifts:shift_types:{group_id}:"
+        f"{_version(_shift_types_version_key(group_id))}:"
+        f"{_version(GLOBAL_SHIFT_TYPES_VERSION_KEY)}"
+    )
+    shift_types = cache.get(key)
+    if shift_types is None:
+        shift_types = list(ShiftType.objects.for_group(group_id))
+        cache.set(key, shift_types, settings.AGENDA_CACHE_TIMEOUT)
+    return shift_types
+
+
+def invalidate_shift_types(group_id):
+    if group_id is None:
+        # Tipo global: aparece em todos os grupos
+        _bump_on_commit([GLOBAL_SHIFT_TYPES_VERSION_KEY])
+    else:
+        _bump_on_commit([_shift_types_version_key(group_id)])
+
+
+# ------------------------------------------------------------------------------
+# Agenda mensal
+# ------------------------------------------------------------------------------
+
+
+def cached_month_agenda(group_id, year, month, shift_type_id, today, build):
+    """
+    Retorna o agenda_days do grid mensal do grupo, montando com build()
+    apenas em caso de miss. "is_today" é recalculado na leitura.
+    """
+    key = (
+        f"shifts:agenda:{group_id}:{group_version(group_id)}:"
+        f"{year}:{month}:{shift_type_id or 'all'}"
+    )
+    agenda_days = cache.get(key)
+
+    if agenda_days is None:
+        _incr(AGENDA_MISSES_KEY)
+        agenda_days = build()
+        cache.set(key, agenda_days, settings.AGENDA_CACHE_TIMEOUT)
+    else:
+        _incr(AGENDA_HITS_KEY)
+        for day in agenda_days:
+            day["is_today"] = day["date"] == today
+
+    return agenda_days
+
+
+def agenda_cache_stats():
+    hits = cache.get(AGENDA_HITS_KEY, 0)
+    misses = cache.get(AGENDA_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 3) if total else 0.0,
+    }
@@ -0,0 +1,150 @@
+# cycles.py
+from collections import defaultdict, deque
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import TradeRequest
+
+
+class TradeGraph:
+    """
+    Propostas pendentes de um grupo como grafo dirigido entre plantões: cada
+    proposta com contra-oferta é uma aresta "plantão oferecido → plantão
+    alvo" (o solicitante entrega um e recebe o outro). Um ciclo no grafo é
+    uma troca circular em que todos recebem o que pediram: cada plantão do
+    ciclo é, ao mesmo tempo, oferecido por quem o tem e desejado por outro.
+
+    Busca em duas etapas, para escalar com milhares de propostas:
+    1. componentes fortemente conexos (Tarjan, iterativo, O(V + E)): só
+       plantões dentro de um mesmo componente podem estar em um ciclo;
+    2. dentro de cada componente, BFS limitado a `max_length` a partir de
+       cada plantão, ficando com um ciclo curto; os plantões usados saem do
+       grafo, então os ciclos devolvidos são disjuntos e executáveis juntos.
+    """
+
+    def __init__(self, edges):
+        # (oferecido, alvo) → proposta mais antiga com essa aresta
+        self.trade_for = {}
+        self.adjacency = defaultdict(list)
+        for trade_id, offered_id, target_id in sorted(edges):
+            if offered_id == target_id or (offered_id, target_id) in self.trade_for:
+                continue
+            self.trade_for[(offered_id, target_id)] = trade_id
+            self.adjacency[offered_id].append(target_id)
+
+    @classmethod
+    def load(cls, group, now=None):
+        """Propostas pendentes cujo solicitante ainda tem o plantão oferecido."""
+        now = now or timezone.now()
+        return cls(
+            TradeRequest.objects.filter(
+                group=group,
+                status=TradeRequest.Status.PENDING,
+                offered_shift__owner=F("requester"),
+                target_shift__is_active=True,
+                target_shift__end_time__gte=now,
+            ).values_list("id", "offered_shift_id", "target_shift_id")
+        )
+
+    def components(self):
+        """Componentes fortemente conexos com mais de um plantão."""
+        index, low = {}, {}
+        stack, on_stack = [], set()
+        found = []
+        counter = 0
+
+        for root in list(self.adjacency):
+            if root in index:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self.adjacency[root]))]
+
+            while work:
+                node, successors = work[-1]
+                for successor in successors:
+                    if successor not in index:
+                        index[successor] = low[successor] = counter
+                        counter += 1
+                        stack.append(successor)
+                        on_stack.add(successor)
+                        work.append((successor, iter(self.adjacency.get(successor, ()))))
+                        break
+                    if successor in on_stack:
+                        low[node] = min(low[node], index[successor])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        component = set()
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.add(member)
+                            if member == node:
+                                break
+                        if len(component) > 1:
+                            found.append(component)
+        return found
+
+    def _shortest_cycle(self, start, allowed, min_length, max_length):
+        """
+        Ciclo simples curto por `start`, com min_length..max_length arestas.
+        Cada plantão entra na fila no máximo uma vez por faixa de
+        profundidade (antes/depois de min_length), o que mantém o BFS linear
+        no componente; em troca, um ciclo que só exista por um caminho mais
+        longo até um plantão já visitado pode ficar de fora nesta rodada.
+        """
+        queue = deque([(start, (start,))])
+        seen = set()
+        while queue:
+            node, path = queue.popleft()
+            for successor in self.adjacency.get(node, ()):
+                if successor == start:
+                    if len(path) >= min_length:
+                        return path
+                    continue
+                if (
+                    successor not in allowed
+                    or successor in path
+                    or len(path) >= max_length
+                ):
+                    continue
+                state = (successor, len(path) + 1 >= min_length)
+                if state in seen:
+                    continue
+                seen.add(state)
+                queue.append((successor, path + (successor,)))
+        return None
+
+    def find_cycles(self, min_length=3, max_length=6):
+        """
+        Ciclos disjuntos, cada um como lista de ids de proposta na ordem do
+        ciclo. Plantões mais antigos (menor id) têm prioridade como início.
+        """
+        cycles = []
+        for component in self.components():
+            available = set(component)
+            for start in sorted(component):
+                if start not in available:
+                    continue
+                path = self._shortest_cycle(start, available, min_length, max_length)
+                if path is None:
+                    continue
+                available.difference_update(path)
+                cycles.append(
+                    [
+                        self.trade_for[(offered, path[(i + 1) % len(path)])]
+                        for i, offered in enumerate(path)
+                    ]
+                )
+        return cycles
+
+
+def find_trade_cycles(group, min_length=3, max_length=6):
+    return TradeGraph.load(group).find_cycles(min_length, max_length)
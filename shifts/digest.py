@@ -0,0 +1,126 @@
+# digest.py
+from itertools import groupby
+from operator import attrgetter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.template.loader import get_template, render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import NotificationEvent, OutboundEmail
+from .outbox import deliver_now, queue_email
+
+User = get_user_model()
+
+
+def notify(user, kind, title, subject, template_name, context, group=None):
+    """
+    Aviso para um usuário: e-mail imediato (renderizado aqui) ou, para quem
+    prefere resumo, apenas um NotificationEvent para o próximo send_digests.
+    """
+    if user.notification_delivery != User.NotificationDelivery.IMMEDIATE:
+        NotificationEvent.objects.create(
+            recipient=user, group=group, kind=kind, title=title[:255]
+        )
+        return
+
+    if not user.email:
+        return
+
+    html_content = render_to_string(template_name, context)
+    queue_email(
+        subject=subject,
+        message=strip_tags(html_content),
+        recipient_list=[user.email],
+        html_message=html_content,
+    )
+
+
+def build_digests(delivery, batch_size=200, now=None, recipient_ids=None):
+    """
+    Um e-mail por usuário com todos os avisos pendentes da janela.
+
+    Os usuários são processados em lotes: uma query traz os avisos do lote
+    (já com destinatário e grupo), o template é carregado uma única vez e
+    os e-mails vão para a caixa de saída com um bulk_create, na mesma
+    transação que marca os avisos como enviados. `recipient_ids` restringe
+    a alguns usuários. Retorna o total de resumos.
+    """
+    now = now or timezone.now()
+    template = get_template("shifts/emails/digest.html")
+    dashboard_url = f"{getattr(settings, 'BASE_URL', 'http://127.0.0.1:8000')}/dashboard/"
+
+    pending = NotificationEvent.objects.filter(
+        sent_at__isnull=True,
+        created_at__lte=now,
+        recipient__notification_delivery=delivery,
+    )
+    if recipient_ids is not None:
+        pending = pending.filter(recipient_id__in=recipient_ids)
+    total = 0
+
+    while True:
+        with transaction.atomic():
+            recipient_ids = list(
+                pending.order_by("recipient_id")
+                .values_list("recipient_id", flat=True)
+                .distinct()[:batch_size]
+            )
+            # Outro send_digests pode estar com parte dos avisos (SKIP LOCKED)
+            events = list(
+                pending.filter(recipient_id__in=recipient_ids)
+                .select_for_update(skip_locked=True, of=("self",))
+                .select_related("recipient", "group")
+                .order_by("recipient_id", "created_at", "id")
+            )
+            if not events:
+                break
+
+            digests = []
+            for _, items in groupby(events, key=attrgetter("recipient_id")):
+                items = list(items)
+                recipient = items[0].recipient
+                if not recipient.email:
+                    continue
+
+                html_content = template.render(
+                    {
+                        "recipient": recipient,
+                        "events": items,
+                        "delivery": recipient.get_notification_delivery_display(),
+                        "dashboard_url": dashboard_url,
+                    }
+                )
+                digests.append(
+                    OutboundEmail(
+                        subject=f"📬 Resumo OnCall: {len(items)} aviso(s)",
+                        body=strip_tags(html_content),
+                        html_body=html_content,
+                        from_email=settings.DEFAULT_FROM_EMAIL,
+                        to=[recipient.email],
+                    )
+                )
+
+            created = OutboundEmail.objects.bulk_create(digests)
+            NotificationEvent.objects.filter(
+                id__in=[event.pk for event in events]
+            ).update(sent_at=now)
+
+        # Fora da transação: as linhas já estão gravadas para o pool
+        for email in created:
+            deliver_now(email.pk)
+        total += len(created)
+
+    return total
+
+
+def flush_digest(user_id, now=None):
+    """
+    Quem voltou para o envio imediato não entra mais em nenhuma janela do
+    send_digests: os avisos que ficaram pendentes vão agora, em um resumo.
+    """
+    return build_digests(
+        User.NotificationDelivery.IMMEDIATE, now=now, recipient_ids=[user_id]
+    )
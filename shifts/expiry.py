@@ -0,0 +1,95 @@
+# expiry.py
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import ExpirySweep, Shift
+
+logger = logging.getLogger(__name__)
+
+SWEEP_NAME = "shifts"
+
+
+def expire_past_shifts(now=None, batch_size=None):
+    """
+    Desativa plantões encerrados em lotes limitados, cada um em sua própria
+    transação curta, para não segurar locks na tabela inteira.
+    Retorna o total de plantões desativados.
+    """
+    now = now or timezone.now()
+    batch_size = batch_size or settings.SHIFT_EXPIRY_BATCH_SIZE
+    total = 0
+
+    while True:
+        # Usa o índice parcial (is_active, end_time)
+        ids = list(
+            Shift.objects.filter(is_active=True, end_time__lt=now)
+            .order_by("end_time")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+
+        with transaction.atomic():
+            total += Shift.objects.filter(id__in=ids, is_active=True).update(
+                is_active=False
+            )
+
+        if len(ids) < batch_size:
+            break
+
+    ExpirySweep.objects.update_or_create(
+        name=SWEEP_NAME, defaults={"swept_until": now, "expired_count": total}
+    )
+    return total
+
+
+def last_sweep():
+    return ExpirySweep.objects.filter(name=SWEEP_NAME).first()
+
+
+class ExpiryRunner(threading.Thread):
+    """
+    Executor periódico opcional dentro do processo web.
+    Ativado por SHIFT_EXPIRY_INTERVAL (segundos); 0 desliga.
+    """
+
+    def __init__(self, interval):
+        super().__init__(name="shift-expiry", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                expired = expire_past_shifts()
+                if expired:
+                    logger.info("Plantões expirados: %s", expired)
+            except Exception:
+                logger.exception("Erro na varredura de plantões expirados")
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def start_expiry_runner():
+    global _runner
+
+    interval = getattr(settings, "SHIFT_EXPIRY_INTERVAL", 0)
+    if not interval:
+        return None
+
+    with _runner_lock:
+        if _runner is None or not _runner.is_alive():
+            _runner = ExpiryRunner(interval)
+            _runner.start()
+    return _runner
@@ -1,4 +1,8 @@
+from datetime import timedelta
+
 from django import forms
+from django.utils import timezone
+from .cache import group_shift_types
 from .models import Shift, Group, ShiftType
 
 
@@ -51,6 +55,47 @@ class ShiftForm(forms.ModelForm):
             "duration": "Duração (Horas)",
         }
 
+    def __init__(self, *args, group=None, owner=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Dono da agenda para a checagem de sobreposição (edição: o atual)
+        self.owner = owner or (self.instance.owner if self.instance.owner_id else None)
+        if group is None:
+            return
+
+        # Só os tipos do grupo (registro cacheado); a validação usa o mesmo escopo
+        field = self.fields["shift_type"]
+        field.queryset = ShiftType.objects.for_group(group)
+        field.choices = [("", field.empty_label)] + [
+            (st.pk, st.name) for st in group_shift_types(group.pk)
+        ]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start = cleaned_data.get("start_time")
+        duration = cleaned_data.get("duration")
+        if self.owner is None or not start or not duration:
+            return cleaned_data
+
+        clash = (
+            Shift.objects.overlapping(
+                self.owner, start, start + timedelta(hours=duration)
+            )
+            .exclude(pk=self.instance.pk)
+            .order_by("start_time")
+            .first()
+        )
+        if clash:
+            raise forms.ValidationError(
+                "Você já tem um plantão neste horário (%(start)s).",
+                code="overlap",
+                params={
+                    "start": timezone.localtime(clash.start_time).strftime(
+                        "%d/%m %H:%M"
+                    )
+                },
+            )
+        return cleaned_data
+
 
 class ShiftTypeForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,79 @@
+# inbox.py
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import group_version, user_version
+from .models import Shift, TradeRequest
+
+
+class TradeInbox:
+    """
+    Estado de trocas do usuário no grupo ativo, lido pelo dashboard, pela
+    navbar e pelos cards:
+
+    - incoming: propostas pendentes para plantões do usuário
+    - pending_target_ids: plantões para os quais o usuário já tem proposta
+      pendente (bloqueia o botão "Propor")
+    - future_shifts: plantões futuros do usuário no grupo (contra-oferta)
+
+    Todas as propostas pendentes (recebidas e enviadas) vêm em uma única
+    query; os plantões futuros em outra. O resultado fica em cache por
+    usuário, chaveado pelas versões do usuário e do grupo, que os signals
+    incrementam a cada mudança de TradeRequest / Shift.
+    """
+
+    def __init__(self, incoming, pending_target_ids, future_shifts):
+        self.incoming = incoming
+        self.pending_target_ids = pending_target_ids
+        self.future_shifts = future_shifts
+
+    @property
+    def incoming_count(self):
+        return len(self.incoming)
+
+    @classmethod
+    def load(cls, user, group):
+        pending = (
+            TradeRequest.objects.filter(status=TradeRequest.Status.PENDING)
+            .filter(Q(target_shift__owner=user) | Q(requester=user))
+            .select_related(
+                "requester", "target_shift__shift_type", "offered_shift__shift_type"
+            )
+            .order_by("created_at", "id")
+        )
+
+        incoming = []
+        pending_target_ids = set()
+        for trade in pending:
+            if trade.target_shift.owner_id == user.pk:
+                incoming.append(trade)
+            if trade.requester_id == user.pk:
+                pending_target_ids.add(trade.target_shift_id)
+
+        future_shifts = []
+        if group is not None:
+            now = timezone.now()
+            future_shifts = list(
+                Shift.objects.live(now)
+                .filter(group=group, owner=user, start_time__gte=now)
+                .select_related("shift_type")
+                .order_by("start_time")
+            )
+
+        return cls(incoming, frozenset(pending_target_ids), future_shifts)
+
+    @classmethod
+    def for_user(cls, user, group):
+        group_id = group.pk if group is not None else None
+        key = (
+            f"shifts:inbox:{user.pk}:{user_version(user.pk)}:"
+            f"{group_id}:{group_version(group_id) if group_id else 0}"
+        )
+        inbox = cache.get(key)
+        if inbox is None:
+            inbox = cls.load(user, group)
+            # Timeout curto: "futuro" depende do relógio, não só das versões
+            cache.set(key, inbox, settings.TRADE_INBOX_CACHE_TIMEOUT)
+        return inbox
@@ -0,0 +1,173 @@
+# intervals.py
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from .models import Shift
+
+Interval = namedtuple("Interval", "start end id")
+
+
+class IntervalIndex:
+    """
+    Intervalos [start, end) por dono, ordenados por início. Saber se um
+    horário colide com a agenda de alguém custa um bisect (O(log n)) mais
+    os poucos vizinhos que começam dentro da janela da maior duração.
+
+    Usado onde muitas checagens acontecem juntas (importação em lote,
+    aceite de trocas em lote, sugestões de troca): a agenda dos donos
+    envolvidos vem em uma única query e cada plantão novo entra no índice,
+    então conflitos dentro do próprio lote também aparecem.
+    """
+
+    def __init__(self, intervals=()):
+        self._starts = defaultdict(list)
+        self._intervals = defaultdict(list)
+        # Maior duração por dono: limita até onde olhar para trás no bisect
+        self._longest = defaultdict(timedelta)
+        self._by_id = {}
+        for owner_id, start, end, pk in intervals:
+            self.add(owner_id, start, end, pk)
+
+    @classmethod
+    def for_owners(cls, owner_ids, since=None, until=None):
+        """
+        Plantões ativos dos donos, em todos os grupos, que terminam depois de
+        `since` (padrão: agora) e, com `until`, começam antes dele.
+        """
+        rows = Shift.objects.filter(
+            owner_id__in=set(owner_ids),
+            is_active=True,
+            end_time__gt=since or timezone.now(),
+        )
+        if until is not None:
+            rows = rows.filter(start_time__lt=until)
+        return cls(rows.values_list("owner_id", "start_time", "end_time", "id"))
+
+    @classmethod
+    def check_moves(cls, moves):
+        """
+        Checa trocas de titularidade já aplicadas (dentro da transação):
+        `moves` são pares (plantão, novo dono). Uma query para todos os donos;
+        retorna os plantões que passaram a sobrepor a agenda do novo dono.
+        """
+        index = cls.for_owners(owner_id for _, owner_id in moves)
+        clashes = []
+        for shift_id, owner_id in moves:
+            interval = index.get(shift_id)
+            if interval is not None and index.overlapping(
+                owner_id, interval.start, interval.end, ignore={shift_id}
+            ):
+                clashes.append(shift_id)
+        return clashes
+
+    def add(self, owner_id, start, end, pk=None):
+        starts = self._starts[owner_id]
+        position = bisect_right(starts, start)
+        starts.insert(position, start)
+        self._intervals[owner_id].insert(position, Interval(start, end, pk))
+        self._longest[owner_id] = max(self._longest[owner_id], end - start)
+        if pk is not None:
+            self._by_id[pk] = Interval(start, end, pk)
+
+    def get(self, pk):
+        """Intervalo do plantão `pk`, ou None se não estiver no índice."""
+        return self._by_id.get(pk)
+
+    def owned(self, owner_id):
+        return self._intervals.get(owner_id, [])
+
+    def overlapping(self, owner_id, start, end, ignore=()):
+        """Intervalos do dono que se sobrepõem a [start, end), exceto `ignore`."""
+        starts = self._starts.get(owner_id)
+        if not starts:
+            return []
+        lo = bisect_left(starts, start - self._longest[owner_id])
+        hi = bisect_left(starts, end)
+        return [
+            interval
+            for interval in self._intervals[owner_id][lo:hi]
+            if interval.end > start and interval.id not in ignore
+        ]
+
+
+def _describe(start):
+    return timezone.localtime(start).strftime("%d/%m %H:%M")
+
+
+def check_new_shifts(shifts, since=None):
+    """
+    Valida um lote de plantões novos contra a agenda atual dos donos e entre
+    si. Uma query para o lote inteiro; levanta ValidationError listando os
+    conflitos.
+    """
+    shifts = list(shifts)
+    for shift in shifts:
+        if shift.end_time is None:
+            shift.end_time = shift.start_time + timedelta(hours=shift.duration)
+
+    index = IntervalIndex.for_owners(
+        (shift.owner_id for shift in shifts),
+        since=since or min((shift.start_time for shift in shifts), default=None),
+    )
+    errors = []
+    for shift in shifts:
+        if shift.is_active:
+            clashes = index.overlapping(shift.owner_id, shift.start_time, shift.end_time)
+            if clashes:
+                errors.append(
+                    ValidationError(
+                        "Conflito de horário: plantão de %(new)s sobrepõe o de %(old)s.",
+                        code="overlap",
+                        params={
+                            "new": _describe(shift.start_time),
+                            "old": _describe(clashes[0].start),
+                        },
+                    )
+                )
+            index.add(shift.owner_id, shift.start_time, shift.end_time, shift.pk)
+    if errors:
+        raise ValidationError(errors)
+    return shifts
+
+
+def bulk_create_shifts(shifts, batch_size=None):
+    """bulk_create com checagem de sobreposição em memória (importações)."""
+    return Shift.objects.bulk_create(check_new_shifts(shifts), batch_size=batch_size)
+
+
+def find_overlaps(queryset=None, group_id=None):
+    """
+    Pares (plantão, plantão anterior do mesmo dono) que se sobrepõem, em uma
+    varredura ordenada por (dono, início): basta comparar cada plantão com o
+    de maior fim visto até ali. Para auditar a base antes da migração 0009.
+
+    Com `group_id`, varre a agenda inteira (todos os grupos) de quem tem
+    plantão no grupo e devolve só os pares com algum plantão dele.
+    """
+    queryset = Shift.objects.all() if queryset is None else queryset
+    if group_id is not None:
+        queryset = queryset.filter(
+            owner_id__in=Shift.objects.filter(group_id=group_id).values("owner_id")
+        )
+    rows = (
+        queryset.filter(is_active=True, end_time__isnull=False)
+        .order_by("owner_id", "start_time", "id")
+        .values_list("owner_id", "start_time", "end_time", "id", "group_id")
+        .iterator(chunk_size=2000)
+    )
+    current_owner, latest, latest_group = None, None, None
+    for owner_id, start, end, pk, shift_group in rows:
+        if owner_id != current_owner:
+            current_owner, latest = owner_id, None
+        if (
+            latest is not None
+            and latest.end > start
+            and group_id in (None, shift_group, latest_group)
+        ):
+            yield pk, latest.id
+        if latest is None or end > latest.end:
+            latest, latest_group = Interval(start, end, pk), shift_group
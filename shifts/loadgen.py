@@ -0,0 +1,181 @@
+# loadgen.py
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+
+from .intervals import IntervalIndex, bulk_create_shifts
+from .models import Group, Shift, ShiftType, TradeRequest
+
+User = get_user_model()
+
+SEED_PASSWORD = "oncall-load"
+
+# (hora de início, duração) dos tipos gerados; 12h diurno/noturno não se sobrepõem
+SLOTS = ((7, 12), (19, 12), (7, 6), (13, 6))
+COLORS = ("#0d6efd", "#6f42c1", "#198754", "#fd7e14", "#dc3545", "#20c997")
+
+
+@transaction.atomic
+def seed_load(
+    groups=1,
+    members=20,
+    shift_types=2,
+    days=365,
+    tradable_ratio=0.1,
+    trades_per_offer=2,
+    seed=None,
+    batch_size=1000,
+):
+    """
+    Gera carga sintética realista via bulk_create: grupos, membros, tipos,
+    um período de plantões (sem sobreposição por dono) e uma mistura de
+    propostas de troca. Retorna um resumo com os objetos principais.
+    """
+    rng = random.Random(seed)
+    fake = Faker("pt_BR")
+    fake.seed_instance(seed)
+    tag = uuid.uuid4().hex[:6]
+    password = make_password(SEED_PASSWORD)
+    now = timezone.now()
+    # Metade do período no passado, metade no futuro (ofertas e trocas)
+    today = timezone.localdate()
+    first_day = timezone.make_aware(
+        datetime(today.year, today.month, today.day) - timedelta(days=days // 2)
+    )
+
+    users = User.objects.bulk_create(
+        [
+            User(
+                email=f"{tag}.{i}.{fake.user_name()}@example.com",
+                full_name=fake.name(),
+                phone=fake.msisdn()[:20],
+                password=password,
+            )
+            for i in range(groups * members)
+        ],
+        batch_size=batch_size,
+    )
+
+    group_objs = Group.objects.bulk_create(
+        [
+            Group(
+                name=f"{fake.company()} ({tag}-{g})",
+                admin=users[g * members],
+                invite_token=f"{tag}{g}"[:50],
+            )
+            for g in range(groups)
+        ]
+    )
+
+    Membership = Group.members.through
+    Membership.objects.bulk_create(
+        [
+            Membership(group_id=group.id, user_id=user.id)
+            for g, group in enumerate(group_objs)
+            for user in users[g * members : (g + 1) * members]
+        ],
+        batch_size=batch_size,
+    )
+
+    type_objs = ShiftType.objects.bulk_create(
+        [
+            ShiftType(
+                group=group,
+                name=f"Plantão {fake.word().title()} {t + 1}",
+                color=COLORS[t % len(COLORS)],
+            )
+            for group in group_objs
+            for t in range(shift_types)
+        ]
+    )
+
+    shifts = []
+    # Agenda já distribuída: o rodízio pula quem estaria ocupado no horário
+    agenda = IntervalIndex()
+    for g, group in enumerate(group_objs):
+        group_members = users[g * members : (g + 1) * members]
+        group_types = type_objs[g * shift_types : (g + 1) * shift_types]
+        for day in range(days):
+            day_start = first_day + timedelta(days=day)
+            for t, shift_type in enumerate(group_types):
+                hour, duration = SLOTS[t % len(SLOTS)]
+                start = day_start + timedelta(hours=hour)
+                end = start + timedelta(hours=duration)
+                # Rodízio a partir do próximo da vez; com membros >= tipos
+                # ninguém é pulado e cada um pega no máximo um plantão por dia
+                rotation = (day * shift_types + t) % members
+                owner = next(
+                    (
+                        member
+                        for offset in range(members)
+                        for member in (group_members[(rotation + offset) % members],)
+                        if not agenda.overlapping(member.pk, start, end)
+                    ),
+                    None,
+                )
+                if owner is None:
+                    raise ValueError(
+                        f"{members} membro(s) não cobrem {shift_types} tipo(s) de "
+                        "plantão sem sobreposição de horário. Aumente --members."
+                    )
+                agenda.add(owner.pk, start, end)
+                shifts.append(
+                    Shift(
+                        group=group,
+                        shift_type=shift_type,
+                        owner=owner,
+                        start_time=start,
+                        duration=duration,
+                        end_time=end,
+                        tradable=start > now and rng.random() < tradable_ratio,
+                    )
+                )
+    shifts = bulk_create_shifts(shifts, batch_size=batch_size)
+
+    future_by_owner = {}
+    for shift in shifts:
+        if shift.start_time > now:
+            future_by_owner.setdefault(shift.owner_id, []).append(shift)
+
+    statuses = (
+        [TradeRequest.Status.PENDING] * 6
+        + [TradeRequest.Status.REJECTED] * 2
+        + [TradeRequest.Status.APPROVED, TradeRequest.Status.CANCELLED]
+    )
+    trades = []
+    for g, group in enumerate(group_objs):
+        group_members = users[g * members : (g + 1) * members]
+        offers = [s for s in shifts if s.group_id == group.id and s.tradable]
+        for target in offers:
+            candidates = [u for u in group_members if u.id != target.owner_id]
+            for requester in rng.sample(candidates, min(trades_per_offer, len(candidates))):
+                own_future = future_by_owner.get(requester.id, [])
+                trades.append(
+                    TradeRequest(
+                        group=group,
+                        requester=requester,
+                        target_shift=target,
+                        offered_shift=(
+                            rng.choice(own_future)
+                            if own_future and rng.random() < 0.5
+                            else None
+                        ),
+                        status=rng.choice(statuses),
+                        message=fake.sentence(),
+                    )
+                )
+    TradeRequest.objects.bulk_create(trades, batch_size=batch_size)
+
+    return {
+        "groups": group_objs,
+        "users": users,
+        "shift_types": len(type_objs),
+        "shifts": len(shifts),
+        "trades": len(trades),
+    }
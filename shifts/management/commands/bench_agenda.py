@@ -0,0 +1,70 @@
+import random
+import timeit
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shifts.agenda import build_month_agenda
+
+
+def legacy_month_agenda(year, month, shifts, today, num_days):
+    """Loop antigo do dashboard: varre todos os plantões para cada dia."""
+    all_shifts_list = list(shifts)
+    agenda_days = []
+    for day_num in range(1, num_days + 1):
+        date_obj = date(year, month, day_num)
+        day_shifts = [s for s in all_shifts_list if s.start_time.day == day_num]
+        agenda_days.append(
+            {
+                "date": date_obj,
+                "day_number": day_num,
+                "is_today": date_obj == today,
+                "is_weekend": date_obj.weekday() >= 5,
+                "shifts": day_shifts,
+                "show_month": False,
+            }
+        )
+    return agenda_days
+
+
+class Command(BaseCommand):
+    help = "Microbenchmark: montagem do grid mensal (loop antigo x passada única)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shifts", type=int, nargs="+", default=[100, 1000, 5000])
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        year, month = 2026, 3
+        num_days = 31
+        today = timezone.localdate()
+        start = timezone.make_aware(datetime(year, month, 1))
+
+        for size in options["shifts"]:
+            rng = random.Random(size)
+            shifts = sorted(
+                (
+                    SimpleNamespace(
+                        start_time=start + timedelta(hours=rng.randrange(num_days * 24))
+                    )
+                    for _ in range(size)
+                ),
+                key=lambda s: s.start_time,
+            )
+
+            legacy = timeit.timeit(
+                lambda: legacy_month_agenda(year, month, shifts, today, num_days),
+                number=options["repeat"],
+            )
+            single_pass = timeit.timeit(
+                lambda: build_month_agenda(year, month, shifts, today),
+                number=options["repeat"],
+            )
+
+            self.stdout.write(
+                f"{size:>6} plantões | loop antigo: {legacy / options['repeat'] * 1000:8.2f} ms"
+                f" | passada única: {single_pass / options['repeat'] * 1000:8.2f} ms"
+                f" | {legacy / single_pass:5.1f}x"
+            )
@@ -0,0 +1,193 @@
+import json
+import logging
+import time
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from shifts.loadgen import seed_load
+from shifts.models import Shift, TradeRequest
+from shifts.utils import reset_email_dispatcher
+
+
+def percentile(values, pct):
+    """Percentil por posição mais próxima (sem interpolação)."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(timings, queries, statuses):
+    if not timings:
+        return None
+    return {
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "queries": {"min": min(queries), "max": max(queries)},
+        "status": sorted(set(statuses)),
+    }
+
+
+def measure(iterations, request, before=None):
+    """Executa request(i) N vezes, medindo latência e número de queries."""
+    timings, queries, statuses = [], [], []
+    for i in range(iterations):
+        if before:
+            before()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = request(i)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(ctx.captured_queries))
+        statuses.append(response.status_code)
+    return summarize(timings, queries, statuses)
+
+
+def bench_size(members, days, iterations, seed=None):
+    """
+    Popula o banco com um grupo de `members` membros e mede, pelo test
+    client, o dashboard em cada modo de exibição e o fluxo de troca.
+    """
+    data = seed_load(groups=1, members=members, days=days, seed=seed)
+    group = data["groups"][0]
+    user, peer = data["users"][1], data["users"][2]
+    today = timezone.localdate()
+    now = timezone.now()
+
+    client = Client()
+    client.force_login(user)
+    dashboard_url = reverse("dashboard")
+    month = {"group_id": group.id, "year": today.year, "month": today.month}
+
+    first_type = Shift.objects.filter(group=group).values_list("shift_type_id", flat=True)[0]
+    scenarios = {
+        "dashboard:monthly_grid:cold": (month, cache.clear),
+        "dashboard:monthly_grid:warm": (month, None),
+        "dashboard:monthly_grid:filter_type": ({**month, "filter_type": first_type}, None),
+        "dashboard:user_extract:month": (
+            {**month, "filter_user": user.id, "view_mode": today.month},
+            None,
+        ),
+        "dashboard:user_extract:year": (
+            {**month, "filter_user": user.id, "view_mode": "all"},
+            None,
+        ),
+        "dashboard:annual_calendar": ({**month, "display": "annual"}, None),
+    }
+
+    results = {}
+    for name, (params, before) in scenarios.items():
+        results[name] = measure(
+            iterations,
+            lambda i, params=params: client.get(dashboard_url, params),
+            before=before,
+        )
+
+    # Proposta de troca: um plantão alvo diferente por iteração
+    targets = list(
+        Shift.objects.filter(group=group, start_time__gt=now)
+        .exclude(owner=user)
+        .values_list("id", flat=True)[:iterations]
+    )
+    Shift.objects.filter(id__in=targets).update(tradable=True)
+    TradeRequest.objects.filter(requester=user, target_shift__in=targets).delete()
+    results["trade:create"] = measure(
+        len(targets),
+        lambda i: client.post(
+            reverse("create_trade_request"), {"target_shift_id": targets[i]}
+        ),
+    )
+
+    # Aceite: propostas pendentes para plantões futuros do próprio usuário
+    own_shifts = list(
+        Shift.objects.filter(group=group, owner=user, start_time__gt=now)[:iterations]
+    )
+    trades = TradeRequest.objects.bulk_create(
+        [
+            TradeRequest(group=group, requester=peer, target_shift=shift)
+            for shift in own_shifts
+        ]
+    )
+    results["trade:accept"] = measure(
+        len(trades),
+        lambda i: client.post(reverse("accept_trade_request", args=[trades[i].id])),
+    )
+
+    return {
+        "members": members,
+        "days": days,
+        "shifts": data["shifts"],
+        "trades": data["trades"],
+        "scenarios": results,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark do dashboard e do fluxo de troca em um banco de teste isolado, "
+        "com carga sintética em vários tamanhos. Saída em JSON (p50/p95 e queries)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[10, 50, 200],
+            help="Número de membros do grupo em cada rodada.",
+        )
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", help="Grava o JSON em arquivo.")
+
+    def handle(self, *args, **options):
+        # Mesmo ambiente da suíte de testes: banco test_*, e-mail em memória
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+
+        # O middleware de métricas loga cada requisição acima do orçamento
+        metrics_logger = logging.getLogger("shifts.metrics")
+        old_level = metrics_logger.level
+        metrics_logger.setLevel(logging.ERROR)
+
+        runs = []
+        try:
+            for members in options["sizes"]:
+                call_command("flush", interactive=False, verbosity=0)
+                cache.clear()
+                self.stderr.write(f"Rodando com {members} membros...")
+                runs.append(
+                    bench_size(
+                        members, options["days"], options["iterations"], options["seed"]
+                    )
+                )
+        finally:
+            metrics_logger.setLevel(old_level)
+            # Workers de e-mail e conexões abertas impediriam o checkpoint do
+            # WAL: sem isso, test_db.sqlite3-wal/-shm ficam na raiz do projeto
+            reset_email_dispatcher()
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = json.dumps(
+            {"generated_at": timezone.now().isoformat(), "runs": runs}, indent=2
+        )
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                fh.write(report)
+        self.stdout.write(report)
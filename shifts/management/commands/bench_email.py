@@ -0,0 +1,260 @@
+import json
+import logging
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from shifts.management.commands.bench_dashboard import percentile
+from shifts.models import Group, Shift, ShiftType, TradeRequest
+from shifts.smtpsink import SMTPSink
+from shifts.utils import get_email_dispatcher, reset_email_dispatcher
+
+User = get_user_model()
+
+
+def build_pairs(size):
+    """Grupo com `size` pares (dono, colega); cada dono tem um plantão ofertado."""
+    owners = User.objects.bulk_create(
+        User(email=f"dono{i}@bench.local", full_name=f"Dono {i}") for i in range(size)
+    )
+    peers = User.objects.bulk_create(
+        User(email=f"colega{i}@bench.local", full_name=f"Colega {i}")
+        for i in range(size)
+    )
+    group = Group.objects.create(name="Bench E-mail", admin=owners[0])
+    group.members.add(*owners, *peers)
+    shift_type = ShiftType.objects.create(name="Noturno", group=group)
+    start = timezone.now() + timezone.timedelta(days=7)
+    shifts = Shift.objects.bulk_create(
+        Shift(
+            group=group,
+            owner=owner,
+            shift_type=shift_type,
+            start_time=start + timezone.timedelta(hours=12 * i),
+            end_time=start + timezone.timedelta(hours=12 * i + 12),
+            duration=12,
+            tradable=True,
+        )
+        for i, owner in enumerate(owners)
+    )
+
+    def logged_in(user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    return [
+        (logged_in(owner), logged_in(peer), owner, peer, shift)
+        for owner, peer, shift in zip(owners, peers, shifts)
+    ]
+
+
+def run_phase(sink, requests, timeout):
+    """
+    Dispara as requisições em sequência e espera o último e-mail chegar ao
+    sink. `requests` é uma lista de (destinatário esperado, função).
+    Latência ponta a ponta: início da requisição → chegada no SMTP.
+    """
+    sink.reset()
+    started, request_ms = {}, []
+    phase_start = time.perf_counter()
+
+    for recipient, request in requests:
+        started[recipient] = time.perf_counter()
+        response = request()
+        request_ms.append((time.perf_counter() - started[recipient]) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f"HTTP {response.status_code} para {recipient}")
+
+    complete = sink.wait_for(len(requests), timeout)
+    get_email_dispatcher().flush(timeout)
+
+    arrivals = sink.arrivals()
+    latency_ms = [
+        (arrivals[recipient] - start) * 1000
+        for recipient, start in started.items()
+        if recipient in arrivals
+    ]
+    elapsed = (max(arrivals.values(), default=phase_start) - phase_start) or 1e-9
+
+    return {
+        "messages": len(sink.messages),
+        "expected": len(requests),
+        "complete": complete,
+        "seconds": round(elapsed, 3),
+        "messages_per_sec": round(len(sink.messages) / elapsed, 1),
+        "connections_opened": sink.connections,
+        "request_ms": {
+            "p50": round(percentile(request_ms, 50), 2),
+            "p95": round(percentile(request_ms, 95), 2),
+        },
+        "end_to_end_ms": (
+            {
+                "p50": round(percentile(latency_ms, 50), 2),
+                "p95": round(percentile(latency_ms, 95), 2),
+                "max": round(max(latency_ms), 2),
+            }
+            if latency_ms
+            else None
+        ),
+    }
+
+
+def bench_burst(sink, size, timeout):
+    """Rajada de propostas; metade é aceita e metade recusada."""
+    pairs = build_pairs(size)
+    results = {}
+
+    results["trade"] = run_phase(
+        sink,
+        [
+            (
+                owner.email,
+                lambda peer_client=peer_client, shift=shift: peer_client.post(
+                    reverse("create_trade_request"), {"target_shift_id": shift.id}
+                ),
+            )
+            for _, peer_client, owner, _, shift in pairs
+        ],
+        timeout,
+    )
+
+    trades = dict(
+        TradeRequest.objects.filter(status=TradeRequest.Status.PENDING).values_list(
+            "requester_id", "id"
+        )
+    )
+    half = size // 2
+    for phase, view, chunk in (
+        ("accept", "accept_trade_request", pairs[:half]),
+        ("reject", "reject_trade_request", pairs[half:]),
+    ):
+        results[phase] = run_phase(
+            sink,
+            [
+                (
+                    peer.email,
+                    lambda owner_client=owner_client, trade_id=trades[peer.pk]: (
+                        owner_client.post(reverse(view, args=[trade_id]))
+                    ),
+                )
+                for owner_client, _, _, peer, _ in chunk
+            ],
+            timeout,
+        )
+    return results
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark do pipeline de e-mail (views → caixa de saída → pool SMTP) "
+        "contra um servidor SMTP local, em um banco de teste isolado. "
+        "Saída em JSON: mensagens/s, conexões abertas e latência ponta a ponta."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--bursts",
+            type=int,
+            nargs="+",
+            default=[20, 100],
+            help="Número de propostas em cada rajada.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            nargs="+",
+            default=[0, 4],
+            help="EMAIL_WORKER_COUNT a comparar (0 = envio dentro da requisição).",
+        )
+        parser.add_argument(
+            "--smtp-latency",
+            type=float,
+            default=5.0,
+            help="Tempo de resposta simulado do servidor por mensagem (ms).",
+        )
+        parser.add_argument("--timeout", type=float, default=60.0)
+        parser.add_argument("--output", help="Grava o JSON em arquivo.")
+
+    def handle(self, *args, **options):
+        sink = SMTPSink(latency=options["smtp_latency"] / 1000)
+        host, port = sink.start()
+
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+
+        # Log por requisição/lote atrapalharia a medição
+        loggers = [logging.getLogger(name) for name in ("shifts.metrics", "shifts.email")]
+        old_levels = [logger.level for logger in loggers]
+        for logger in loggers:
+            logger.setLevel(logging.ERROR)
+
+        runs = []
+        try:
+            for workers in options["workers"]:
+                for size in options["bursts"]:
+                    call_command("flush", interactive=False, verbosity=0)
+                    cache.clear()
+                    self.stderr.write(f"Rajada de {size} com {workers} worker(s)...")
+
+                    with override_settings(
+                        EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+                        EMAIL_HOST=host,
+                        EMAIL_PORT=port,
+                        EMAIL_HOST_USER="",
+                        EMAIL_HOST_PASSWORD="",
+                        EMAIL_USE_TLS=False,
+                        EMAIL_USE_SSL=False,
+                        EMAIL_WORKER_COUNT=workers,
+                    ):
+                        reset_email_dispatcher()
+                        phases = bench_burst(sink, size, options["timeout"])
+                        stats = get_email_dispatcher().stats()
+                        reset_email_dispatcher()
+
+                    runs.append(
+                        {
+                            "burst": size,
+                            "workers": workers,
+                            "phases": phases,
+                            "dispatcher": stats,
+                        }
+                    )
+        finally:
+            for logger, level in zip(loggers, old_levels):
+                logger.setLevel(level)
+            # Workers de e-mail e conexões abertas impediriam o checkpoint do
+            # WAL: sem isso, test_db.sqlite3-wal/-shm ficam na raiz do projeto
+            reset_email_dispatcher()
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            sink.stop()
+
+        report = json.dumps(
+            {
+                "generated_at": timezone.now().isoformat(),
+                "smtp_latency_ms": options["smtp_latency"],
+                "runs": runs,
+            },
+            indent=2,
+        )
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                fh.write(report)
+        self.stdout.write(report)
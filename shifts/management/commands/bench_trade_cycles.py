@@ -0,0 +1,113 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shifts.cycles import TradeGraph
+
+
+def synthetic_edges(requests, shifts, planted, rng):
+    """
+    `requests` propostas aleatórias entre `shifts` plantões, mais `planted`
+    ciclos de 3 a 5 plantões exclusivos (que o solver deve encontrar).
+    Retorna (arestas, ciclos plantados como conjuntos de plantões).
+    """
+    edges = []
+    for trade_id in range(requests):
+        offered, target = rng.randrange(shifts), rng.randrange(shifts)
+        edges.append((trade_id, offered, target))
+
+    cycles = []
+    next_shift = shifts
+    for _ in range(planted):
+        length = rng.randint(3, 5)
+        nodes = list(range(next_shift, next_shift + length))
+        next_shift += length
+        for i, offered in enumerate(nodes):
+            edges.append((len(edges), offered, nodes[(i + 1) % length]))
+        cycles.append(frozenset(nodes))
+    return edges, cycles
+
+
+def bench_graph(requests, density, planted, max_length, seed):
+    rng = random.Random(seed)
+    shifts = max(int(requests / density), 2)
+    edges, planted_cycles = synthetic_edges(requests, shifts, planted, rng)
+
+    start = time.perf_counter()
+    graph = TradeGraph(edges)
+    built = time.perf_counter()
+    components = graph.components()
+    scc = time.perf_counter()
+    cycles = graph.find_cycles(min_length=3, max_length=max_length)
+    done = time.perf_counter()
+
+    # O id de cada proposta sintética é a sua posição na lista
+    found = {frozenset(edges[trade_id][1] for trade_id in cycle) for cycle in cycles}
+
+    return {
+        "requests": len(edges),
+        "shifts": shifts + sum(len(c) for c in planted_cycles),
+        "components": len(components),
+        "largest_component": max((len(c) for c in components), default=0),
+        "cycles_found": len(cycles),
+        "planted_found": sum(1 for c in planted_cycles if c in found),
+        "planted": len(planted_cycles),
+        "cycle_lengths": sorted({len(c) for c in cycles}),
+        "ms": {
+            "build": round((built - start) * 1000, 2),
+            "components": round((scc - built) * 1000, 2),
+            "find_cycles": round((done - scc) * 1000, 2),
+            "total": round((done - start) * 1000, 2),
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark do solver de trocas circulares em grafos sintéticos "
+        "(em memória, sem banco). Saída em JSON com tempos por etapa."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests",
+            type=int,
+            nargs="+",
+            default=[1000, 5000, 20000],
+            help="Propostas aleatórias em cada grafo.",
+        )
+        parser.add_argument(
+            "--density",
+            type=float,
+            default=1.5,
+            help="Propostas por plantão (acima de 1 surge um componente gigante).",
+        )
+        parser.add_argument("--planted", type=int, default=50)
+        parser.add_argument("--max-length", type=int, default=6)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", help="Grava o JSON em arquivo.")
+
+    def handle(self, *args, **options):
+        runs = []
+        for requests in options["requests"]:
+            self.stderr.write(f"Grafo com {requests} propostas...")
+            runs.append(
+                bench_graph(
+                    requests,
+                    options["density"],
+                    options["planted"],
+                    options["max_length"],
+                    options["seed"],
+                )
+            )
+
+        report = json.dumps(
+            {"generated_at": timezone.now().isoformat(), "runs": runs}, indent=2
+        )
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                fh.write(report)
+        self.stdout.write(report)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from shifts.cache import agenda_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Mostra os contadores de hit/miss do cache da agenda mensal."
+
+    def handle(self, *args, **options):
+        stats = agenda_cache_stats()
+        self.stdout.write(
+            f"Agenda: {stats['hits']} hits / {stats['misses']} misses "
+            f"(hit rate {stats['hit_rate']:.1%})"
+        )
@@ -0,0 +1,85 @@
+import logging
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from shifts.outbox import dispatch_pending
+from shifts.utils import close_connection
+
+logger = logging.getLogger("shifts.email")
+
+
+class Command(BaseCommand):
+    help = (
+        "Entrega os e-mails pendentes da caixa de saída em lotes "
+        "(SELECT ... FOR UPDATE SKIP LOCKED), com nova tentativa e backoff."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="E-mails por lote (padrão: EMAIL_BATCH_SIZE).",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Esvazia a fila uma vez e sai (cron), em vez de rodar continuamente.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Espera (segundos) quando não há e-mails vencidos.",
+        )
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        # Uma conexão SMTP reaproveitada entre os lotes, aberta dentro do laço:
+        # se o servidor cair, o worker espera e reconecta em vez de sair
+        connection = None
+
+        try:
+            while True:
+                try:
+                    if connection is None:
+                        connection = get_connection(fail_silently=False)
+                        connection.open()
+                    sent, failed = dispatch_pending(connection, options["batch_size"])
+                except Exception as exc:
+                    logger.exception("Falha no dispatch_emails")
+                    self.stderr.write(
+                        f"Falha ao conectar/enviar ({exc}); nova tentativa em "
+                        f"{options['interval']}s."
+                    )
+                    connection = close_connection(connection)
+                    if options["once"]:
+                        break
+                    close_old_connections()
+                    time.sleep(options["interval"])
+                    continue
+
+                total_sent += sent
+                total_failed += failed
+
+                if sent or failed:
+                    self.stdout.write(f"Lote: {sent} enviado(s), {failed} falha(s).")
+                    continue
+                if options["once"]:
+                    break
+
+                close_old_connections()
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            close_connection(connection)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{total_sent} e-mail(s) enviado(s), {total_failed} falha(s)."
+            )
+        )
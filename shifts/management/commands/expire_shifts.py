@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from shifts.expiry import expire_past_shifts
+
+
+class Command(BaseCommand):
+    help = "Desativa plantões já encerrados, em lotes (use via cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Quantidade de plantões por lote (padrão: SHIFT_EXPIRY_BATCH_SIZE).",
+        )
+
+    def handle(self, *args, **options):
+        expired = expire_past_shifts(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{expired} plantão(ões) expirado(s)."))
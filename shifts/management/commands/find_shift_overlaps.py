@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from shifts.intervals import find_overlaps
+
+
+class Command(BaseCommand):
+    help = (
+        "Lista plantões ativos sobrepostos do mesmo dono. Rode antes de "
+        "aplicar a exclusão shift_owner_no_overlap no PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--group",
+            type=int,
+            help=(
+                "Só conflitos com plantões deste grupo (id), contra a agenda "
+                "dos donos em todos os grupos."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        found = 0
+        # Com --group, a agenda dos donos é lida em todos os grupos: conflitos
+        # com plantões de outro hospital também contam
+        for shift_id, previous_id in find_overlaps(group_id=options["group"]):
+            found += 1
+            self.stdout.write(f"plantão {shift_id} sobrepõe o plantão {previous_id}")
+
+        style = self.style.WARNING if found else self.style.SUCCESS
+        self.stdout.write(style(f"{found} sobreposição(ões) encontrada(s)."))
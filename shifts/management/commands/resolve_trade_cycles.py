@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+
+from shifts.cycles import find_trade_cycles
+from shifts.models import Group
+from shifts.trades import TradeConflict, execute_cycle, send_trade_notification
+
+
+class Command(BaseCommand):
+    help = (
+        "Encontra trocas circulares (3 ou mais pessoas) entre as propostas "
+        "pendentes e as efetiva, cada ciclo em uma transação."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--group", type=int, help="Só este grupo (id).")
+        parser.add_argument("--min-length", type=int, default=3)
+        parser.add_argument("--max-length", type=int, default=6)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Apenas lista os ciclos encontrados.",
+        )
+
+    def handle(self, *args, **options):
+        groups = Group.objects.order_by("id")
+        if options["group"]:
+            groups = groups.filter(id=options["group"])
+
+        executed = 0
+        for group in groups:
+            cycles = find_trade_cycles(
+                group, options["min_length"], options["max_length"]
+            )
+            for trade_ids in cycles:
+                label = " → ".join(str(pk) for pk in trade_ids)
+                if options["dry_run"]:
+                    self.stdout.write(f"[{group.name}] ciclo: {label}")
+                    continue
+                try:
+                    trades = execute_cycle(trade_ids)
+                except TradeConflict as exc:
+                    self.stdout.write(f"[{group.name}] ignorado ({exc}): {label}")
+                    continue
+                for trade in trades:
+                    send_trade_notification(trade)
+                executed += 1
+                self.stdout.write(f"[{group.name}] troca circular efetivada: {label}")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{executed} troca(s) circular(es) efetivada(s).")
+        )
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shifts.loadgen import SEED_PASSWORD, seed_load
+
+
+class Command(BaseCommand):
+    help = "Gera carga sintética (grupos, membros, tipos, plantões e trocas) via bulk_create."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--groups", type=int, default=1)
+        parser.add_argument("--members", type=int, default=20, help="Membros por grupo.")
+        parser.add_argument("--shift-types", type=int, default=2, help="Tipos por grupo.")
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument(
+            "--tradable-ratio",
+            type=float,
+            default=0.1,
+            help="Fração dos plantões futuros ofertados para troca.",
+        )
+        parser.add_argument(
+            "--trades-per-offer",
+            type=int,
+            default=2,
+            help="Propostas geradas para cada plantão ofertado.",
+        )
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            data = seed_load(
+                groups=options["groups"],
+                members=options["members"],
+                shift_types=options["shift_types"],
+                days=options["days"],
+                tradable_ratio=options["tradable_ratio"],
+                trades_per_offer=options["trades_per_offer"],
+                seed=options["seed"],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(data['groups'])} grupo(s), {len(data['users'])} usuário(s), "
+                f"{data['shift_types']} tipo(s), {data['shifts']} plantão(ões), "
+                f"{data['trades']} proposta(s) de troca. Senha: {SEED_PASSWORD}"
+            )
+        )
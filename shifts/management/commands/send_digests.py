@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from shifts.digest import build_digests
+
+User = get_user_model()
+
+WINDOWS = {
+    "hourly": User.NotificationDelivery.HOURLY,
+    "daily": User.NotificationDelivery.DAILY,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Envia um e-mail de resumo por usuário com os avisos pendentes "
+        "(agende --window hourly a cada hora e --window daily uma vez ao dia)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--window", choices=sorted(WINDOWS), required=True)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="Usuários por lote (padrão: 200).",
+        )
+
+    def handle(self, *args, **options):
+        sent = build_digests(
+            WINDOWS[options["window"]], batch_size=options["batch_size"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"{sent} resumo(s) enviado(s)."))
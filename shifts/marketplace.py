@@ -0,0 +1,59 @@
+# marketplace.py
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .cache import group_version
+from .models import Shift
+from .queries import keyset_page
+
+
+def open_offers(group, now=None):
+    """
+    Plantões ofertados para troca no grupo que ainda não começaram.
+    tradable + is_active é o predicado do índice parcial
+    shift_group_tradable_idx (group, start_time, id): a leitura percorre só
+    as ofertas, na ordem do keyset, sem tocar o resto da escala.
+    """
+    return Shift.objects.filter(
+        group=group,
+        tradable=True,
+        is_active=True,
+        start_time__gte=now or timezone.now(),
+    )
+
+
+def marketplace_page(
+    group, cursor=None, start=None, end=None, shift_type_id=None, size=None
+):
+    """
+    Página do mural: ofertas em [start, end) do tipo escolhido, a partir do
+    cursor. Retorna (plantões, tem_mais), como keyset_page.
+    """
+    offers = open_offers(group)
+    if start:
+        offers = offers.filter(start_time__gte=start)
+    if end:
+        offers = offers.filter(start_time__lt=end)
+    if shift_type_id:
+        offers = offers.filter(shift_type_id=shift_type_id)
+
+    return keyset_page(
+        offers.select_related("shift_type", "owner"),
+        cursor,
+        size or settings.MARKETPLACE_PAGE_SIZE,
+    )
+
+
+def open_offers_count(group_id):
+    """
+    Contador de ofertas abertas da navbar, cacheado pela versão do grupo
+    (ofertar, retirar ou trocar um plantão incrementa a versão). Timeout
+    curto: ofertas saem do mural quando começam, sem escrita no banco.
+    """
+    key = f"shifts:offers:{group_id}:{group_version(group_id)}"
+    count = cache.get(key)
+    if count is None:
+        count = open_offers(group_id).count()
+        cache.set(key, count, settings.TRADE_INBOX_CACHE_TIMEOUT)
+    return count
@@ -0,0 +1,151 @@
+# matching.py
+from bisect import insort
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .intervals import IntervalIndex
+from .models import Shift
+from .queries import date_range
+
+Slot = namedtuple(
+    "Slot",
+    "id owner_id owner_name shift_type_id shift_type_name duration start end tradable",
+)
+
+_SLOT_FIELDS = (
+    "id",
+    "owner_id",
+    "owner__full_name",
+    "owner__email",
+    "shift_type_id",
+    "shift_type__name",
+    "duration",
+    "start_time",
+    "end_time",
+    "tradable",
+)
+
+
+def _slots(queryset):
+    return [
+        Slot(pk, owner_id, name or email, type_id, type_name, duration, start, end, tradable)
+        for pk, owner_id, name, email, type_id, type_name, duration, start, end, tradable in (
+            queryset.values_list(*_SLOT_FIELDS)
+        )
+    ]
+
+
+class SwapIndex:
+    """
+    Contra-ofertas para um plantão, montadas por consulta só com o que ela
+    precisa, em duas queries de tamanho independente do grupo:
+
+    - o pool: plantões futuros do solicitante no grupo, ou ofertas
+      equivalentes (mesmo tipo e duração) de outros membros na janela de
+      SWAP_MATCH_WINDOW_DAYS dias (shift_group_tradable_idx);
+    - a agenda dos donos envolvidos, em todos os grupos, no período coberto
+      pelo pool (IntervalIndex.for_owners): a mesma sobreposição que o
+      accept_trade e a constraint shift_owner_no_overlap recusariam.
+    """
+
+    def __init__(self, target, pool, agenda):
+        self.target = target
+        self.pool = pool
+        self.agenda = agenda
+
+    @classmethod
+    def for_target(cls, target, requester_id=None, now=None):
+        """
+        Com `requester_id`: plantões que ele pode oferecer ao dono do alvo.
+        Sem: ofertas de colegas equivalentes ao alvo, para o dono escolher.
+        """
+        now = now or timezone.now()
+        group_id = target.group_id
+        target = Slot(
+            target.pk,
+            target.owner_id,
+            "",
+            target.shift_type_id,
+            "",
+            target.duration,
+            target.start_time,
+            target.end_time,
+            target.tradable,
+        )
+        if target.end < now or requester_id == target.owner_id:
+            return cls(target, [], IntervalIndex())
+
+        live = Shift.objects.live(now).filter(group_id=group_id)
+        if requester_id is not None:
+            pool = live.filter(owner_id=requester_id)
+        else:
+            window = settings.SWAP_MATCH_WINDOW_DAYS
+            day = timezone.localtime(target.start).date()
+            start, end = date_range(
+                day - timedelta(days=window), day + timedelta(days=window)
+            )
+            pool = (
+                live.filter(
+                    tradable=True,
+                    shift_type_id=target.shift_type_id,
+                    duration=target.duration,
+                    start_time__gte=start,
+                    start_time__lt=end,
+                    owner__isnull=False,
+                )
+                .exclude(owner_id=target.owner_id)
+            )
+        pool = _slots(pool.exclude(pk=target.id))
+        if not pool:
+            return cls(target, [], IntervalIndex())
+
+        agenda = IntervalIndex.for_owners(
+            {target.owner_id, *(slot.owner_id for slot in pool)},
+            since=min(target.start, *(slot.start for slot in pool)),
+            until=max(target.end, *(slot.end for slot in pool)),
+        )
+        return cls(target, pool, agenda)
+
+    def _fits(self, candidate):
+        """A troca não cria sobreposição para nenhum dos dois lados."""
+        target = self.target
+        return not self.agenda.overlapping(
+            candidate.owner_id, target.start, target.end, ignore={candidate.id}
+        ) and not self.agenda.overlapping(
+            target.owner_id, candidate.start, candidate.end, ignore={target.id}
+        )
+
+    def _rank(self, candidate):
+        # Mesmo tipo, mesma duração e data mais próxima primeiro
+        target = self.target
+        return (
+            candidate.shift_type_id != target.shift_type_id,
+            abs(candidate.duration - target.duration),
+            abs(candidate.start - target.start),
+            candidate.start,
+        )
+
+    def candidates(self, limit=None):
+        """Contra-ofertas que cabem nas duas agendas, da melhor para a pior."""
+        limit = limit or settings.SWAP_MATCH_LIMIT
+        matches = []
+        for candidate in self.pool:
+            if not self._fits(candidate):
+                continue
+            insort(matches, (self._rank(candidate), candidate.id, candidate))
+            if len(matches) > limit:
+                matches.pop()
+        return [candidate for _, _, candidate in matches]
+
+
+def swap_candidates(target, user, limit=None):
+    """
+    Sugestões de troca para `target` vistas por `user`: contra-ofertas dele
+    se o plantão for de outra pessoa, ou plantões equivalentes ofertados por
+    colegas se o plantão for dele.
+    """
+    requester_id = None if target.owner_id == user.pk else user.pk
+    return SwapIndex.for_target(target, requester_id).candidates(limit)
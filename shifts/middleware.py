@@ -0,0 +1,122 @@
+# middleware.py
+import contextvars
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger("shifts.metrics")
+
+_current_metrics = contextvars.ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.render_ms = 0.0
+
+
+class MeteredTemplate(Template):
+    """
+    Template do backend que soma o tempo de render na requisição medida.
+    Só o ponto de entrada (render / render_to_string) passa por aqui;
+    includes usam o Template interno e não são contados duas vezes.
+    """
+
+    def render(self, context=None, request=None):
+        metrics = _current_metrics.get()
+        if metrics is None:
+            return super().render(context, request)
+
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.render_ms += (time.perf_counter() - start) * 1000
+
+
+class MeteredDjangoTemplates(DjangoTemplates):
+    """Backend DjangoTemplates cujos templates são MeteredTemplate (TEMPLATES)."""
+
+    def from_string(self, template_code):
+        return MeteredTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return MeteredTemplate(super().get_template(template_name).template, self)
+
+
+class RequestMetricsMiddleware:
+    """
+    Para cada requisição: número de queries e tempo de SQL
+    (connection.execute_wrapper), tempo de render dos templates
+    (MeteredDjangoTemplates, só com REQUEST_METRICS_HEADER) e tempo da
+    view. Publica no header Server-Timing e em uma linha de log estruturada;
+    requisições acima do orçamento (REQUEST_QUERY_BUDGET /
+    REQUEST_LATENCY_BUDGET_MS) são logadas como warning.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        # Tempo de template só é medido quando vai para o Server-Timing
+        timed_render = settings.REQUEST_METRICS_HEADER
+        token = _current_metrics.set(metrics if timed_render else None)
+
+        def record_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                metrics.queries += 1
+                metrics.sql_ms += (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record_query))
+                response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        total_ms = (time.perf_counter() - start) * 1000
+
+        view_ms = max(total_ms - metrics.sql_ms - metrics.render_ms, 0.0)
+
+        if settings.REQUEST_METRICS_HEADER:
+            response["Server-Timing"] = ", ".join(
+                (
+                    f'db;dur={metrics.sql_ms:.1f};desc="{metrics.queries} queries"',
+                    f"tpl;dur={metrics.render_ms:.1f}",
+                    f"view;dur={view_ms:.1f}",
+                    f"total;dur={total_ms:.1f}",
+                )
+            )
+
+        over_budget = (
+            metrics.queries > settings.REQUEST_QUERY_BUDGET
+            or total_ms > settings.REQUEST_LATENCY_BUDGET_MS
+        )
+        line = json.dumps(
+            {
+                "event": "request",
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "queries": metrics.queries,
+                "db_ms": round(metrics.sql_ms, 1),
+                "tpl_ms": round(metrics.render_ms, 1) if timed_render else None,
+                "view_ms": round(view_ms, 1),
+                "total_ms": round(total_ms, 1),
+                "over_budget": over_budget,
+            }
+        )
+        logger.log(logging.WARNING if over_budget else logging.INFO, line)
+
+        return response
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.10 on 2026-10-18 05:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shifts', '0003_shift_expiry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shift',
+            index=models.Index(fields=['group', 'start_time'], name='shift_group_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shift',
+            index=models.Index(fields=['owner', 'start_time'], name='shift_owner_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shift',
+            index=models.Index(condition=models.Q(('tradable', True)), fields=['group', 'start_time'], name='shift_group_tradable_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='traderequest',
+            index=models.Index(fields=['target_shift', 'status'], name='trade_target_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='traderequest',
+            index=models.Index(fields=['requester', 'target_shift', 'status'], name='trade_requester_target_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='traderequest',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['target_shift'], name='trade_pending_target_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='traderequest',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['requester'], name='trade_pending_requester_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.10 on 2026-10-18 05:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shifts', '0004_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='shift',
+            name='shift_owner_start_idx',
+        ),
+        migrations.AddIndex(
+            model_name='shift',
+            index=models.Index(fields=['owner', 'start_time', 'id'], name='shift_owner_start_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Exclusão de sobreposição por dono, só no PostgreSQL (SQLite não tem
+# EXCLUDE nem tstzrange: lá a checagem fica no formulário e nos serviços).
+# Falha se já existirem plantões sobrepostos: rode find_shift_overlaps antes.
+
+from django.db import migrations
+
+CONSTRAINT = "shift_owner_no_overlap"
+
+
+def add_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    schema_editor.execute(
+        f"""
+        ALTER TABLE shifts_shift ADD CONSTRAINT {CONSTRAINT}
+        EXCLUDE USING gist (
+            owner_id WITH =,
+            tstzrange(start_time, end_time, '[)') WITH &&
+        )
+        WHERE (is_active AND end_time IS NOT NULL)
+        DEFERRABLE INITIALLY DEFERRED
+        """
+    )
+
+
+def drop_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        f"ALTER TABLE shifts_shift DROP CONSTRAINT IF EXISTS {CONSTRAINT}"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shifts", "0008_notification_event"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_constraint, drop_constraint),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.10 on 2026-10-18 06:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shifts', '0009_shift_no_overlap'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='shift',
+            name='shift_group_tradable_idx',
+        ),
+        migrations.AddIndex(
+            model_name='shift',
+            index=models.Index(condition=models.Q(('is_active', True), ('tradable', True)), fields=['group', 'start_time', 'id'], name='shift_group_tradable_idx'),
+        ),
+    ]
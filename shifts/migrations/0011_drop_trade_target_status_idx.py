@@ -0,0 +1,17 @@
+# Generated by Django 5.2.10 on 2026-10-18 06:56
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shifts', '0010_marketplace_tradable_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='traderequest',
+            name='trade_target_status_idx',
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from datetime import timedelta
 from django.contrib.auth import get_user_model
 import uuid
@@ -42,6 +43,14 @@ class Group(models.Model):
         return self.name
 
 
+class ShiftTypeQuerySet(models.QuerySet):
+    def for_group(self, group):
+        """Tipos do grupo mais os globais (sem grupo), em ordem alfabética."""
+        return self.filter(
+            models.Q(group=group) | models.Q(group__isnull=True)
+        ).order_by("name")
+
+
 class ShiftType(models.Model):
     """
     Define os tipos de plantão e suas cores no calendário.
@@ -63,10 +72,36 @@ class ShiftType(models.Model):
     )
     is_active = models.BooleanField(default=True)
 
+    objects = ShiftTypeQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
 
+class ShiftQuerySet(models.QuerySet):
+    def live(self, now=None):
+        """
+        Plantões ativos que ainda não terminaram. A expiração é feita pelo
+        comando expire_shifts, então a leitura não depende dele ter rodado.
+        """
+        return self.filter(is_active=True, end_time__gte=now or timezone.now())
+
+    def overlapping(self, owner, start, end):
+        """
+        Plantões ativos do dono que se sobrepõem a [start, end). O início é
+        limitado à janela da maior duração possível, então a busca é um
+        intervalo em shift_owner_start_idx em vez de varrer a agenda inteira.
+        """
+        longest = timedelta(hours=max(Shift.Duration.values))
+        return self.filter(
+            owner=owner,
+            is_active=True,
+            start_time__gt=start - longest,
+            start_time__lt=end,
+            end_time__gt=start,
+        )
+
+
 class Shift(models.Model):
     """
     Model do Plantão
@@ -95,14 +130,47 @@ class Shift(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     tradable = models.BooleanField("Disponível para Troca", default=False)
 
+    objects = ShiftQuerySet.as_manager()
+
     class Meta:
         ordering = ["start_time"]
         verbose_name = "Plantão"
         verbose_name_plural = "Plantões"
+        indexes = [
+            # Grid mensal / anual: plantões do grupo por período
+            models.Index(fields=["group", "start_time"], name="shift_group_start_idx"),
+            # Extrato individual (keyset por start_time, id) e plantões
+            # futuros do usuário
+            # (também atende a checagem de sobreposição; no PostgreSQL a
+            # exclusão shift_owner_no_overlap é criada na migração 0009)
+            models.Index(
+                fields=["owner", "start_time", "id"], name="shift_owner_start_idx"
+            ),
+            # Ofertas de troca do grupo (poucas linhas): mural com keyset
+            # por (start_time, id) e contador de ofertas abertas
+            models.Index(
+                fields=["group", "start_time", "id"],
+                name="shift_group_tradable_idx",
+                condition=models.Q(tradable=True, is_active=True),
+            ),
+            # Varredura de expiração: só plantões ainda ativos, por fim
+            models.Index(
+                fields=["end_time"],
+                name="shift_active_end_time_idx",
+                condition=models.Q(is_active=True),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.shift_type} - ({self.get_duration_display()})"
 
+    @property
+    def is_live(self):
+        """Ativo e ainda não encerrado, mesmo que a varredura não tenha rodado."""
+        if not self.is_active:
+            return False
+        return self.end_time is None or self.end_time >= timezone.now()
+
     def save(self, *args, **kwargs):
         if self.start_time and self.duration:
             self.end_time = self.start_time + timedelta(hours=self.duration)
@@ -139,5 +207,134 @@ class TradeRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     message = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Checagem de duplicidade
+            models.Index(
+                fields=["requester", "target_shift", "status"],
+                name="trade_requester_target_idx",
+            ),
+            # Caixa de entrada e concorrentes: só as pendentes. Buscas por alvo
+            # em qualquer status usam o índice da própria FK target_shift
+            models.Index(
+                fields=["target_shift"],
+                name="trade_pending_target_idx",
+                condition=models.Q(status="PENDING"),
+            ),
+            models.Index(
+                fields=["requester"],
+                name="trade_pending_requester_idx",
+                condition=models.Q(status="PENDING"),
+            ),
+        ]
+
     def __str__(self):
         return f"Troca: {self.requester} quer {self.target_shift}"
+
+
+class ExpirySweep(models.Model):
+    """
+    Marca d'água da última varredura de plantões expirados.
+    """
+
+    name = models.CharField(max_length=50, unique=True)
+    swept_until = models.DateTimeField("Expirado até")
+    expired_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.swept_until:%d/%m/%Y %H:%M})"
+
+
+class OutboundEmail(models.Model):
+    """
+    Caixa de saída durável: gravada na mesma transação da ação que gera a
+    notificação e entregue pelo pool do processo ou pelo dispatch_emails.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pendente"
+        SENT = "SENT", "Enviado"
+        FAILED = "FAILED", "Falhou"
+
+    subject = models.CharField("Assunto", max_length=255)
+    body = models.TextField("Texto")
+    html_body = models.TextField("HTML", blank=True)
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    bcc = models.JSONField(default=list, blank=True)
+    # Difusão para o grupo: expandida depois em lotes de destinatários
+    fanout_group = models.ForeignKey(
+        Group, on_delete=models.CASCADE, null=True, blank=True, related_name="+"
+    )
+    fanout_exclude = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Próxima tentativa; ao reivindicar a linha vira o fim da "concessão"
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "E-mail de Saída"
+        verbose_name_plural = "E-mails de Saída"
+        indexes = [
+            # Fila do dispatcher: só as pendentes, por vencimento
+            models.Index(
+                fields=["next_attempt_at"],
+                name="outbound_pending_due_idx",
+                condition=models.Q(status="PENDING"),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} ({self.get_status_display()})"
+
+
+class NotificationEvent(models.Model):
+    """
+    Aviso guardado para o resumo (por hora ou diário) de quem não quer um
+    e-mail por aviso; o send_digests junta os pendentes de cada usuário
+    em um único e-mail.
+    """
+
+    class Kind(models.TextChoices):
+        NEW_OPPORTUNITY = "new_opportunity", "Nova oportunidade"
+        TRADE_PROPOSAL = "trade_proposal", "Proposta de troca"
+
+    recipient = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="notification_events",
+    )
+    group = models.ForeignKey(
+        Group, on_delete=models.CASCADE, null=True, blank=True, related_name="+"
+    )
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    title = models.CharField("Resumo", max_length=255)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Aviso para Resumo"
+        verbose_name_plural = "Avisos para Resumo"
+        indexes = [
+            # Avisos ainda não resumidos, agrupados por destinatário
+            models.Index(
+                fields=["recipient", "created_at"],
+                name="notification_pending_idx",
+                condition=models.Q(sent_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.title}"
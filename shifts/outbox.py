@@ -0,0 +1,292 @@
+# outbox.py
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMultiAlternatives
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import NotificationEvent, OutboundEmail
+from .utils import get_email_dispatcher
+
+logger = logging.getLogger("shifts.email")
+
+User = get_user_model()
+
+# Expansão das difusões fora da requisição (uma por vez por processo)
+_fanout_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="email-fanout")
+
+
+def queue_email(subject, message, recipient_list, html_message=None, bcc_list=None):
+    """
+    Grava o e-mail na caixa de saída, dentro da transação da requisição, e
+    entrega pelo pool do processo (ou na hora, com 0 workers) logo após o
+    commit. Se o processo for
+    reciclado antes disso, o dispatch_emails entrega depois.
+    """
+    email = OutboundEmail.objects.create(
+        subject=subject[:255],
+        body=message,
+        html_body=html_message or "",
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=list(recipient_list),
+        bcc=list(bcc_list or []),
+    )
+
+    # Também no modo síncrono: o envio SMTP espera a rede, e dentro da
+    # transação seguraria o lock de escrita da requisição
+    transaction.on_commit(lambda: deliver_now(email.pk))
+    return email
+
+
+def queue_broadcast(group, subject, message, html_message=None, exclude_user=None):
+    """
+    Difusão para os membros do grupo em tempo constante: grava uma única
+    linha (assunto e corpo já renderizados) e a lista de destinatários é
+    expandida depois, fora da requisição, em lotes de EMAIL_MAX_RECIPIENTS.
+    """
+    email = OutboundEmail.objects.create(
+        subject=subject[:255],
+        body=message,
+        html_body=html_message or "",
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[settings.DEFAULT_FROM_EMAIL],
+        fanout_group=group,
+        fanout_exclude=exclude_user,
+    )
+
+    transaction.on_commit(lambda: deliver_now(email.pk))
+    return email
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def expand_broadcast(email, size=None, batch_size=500):
+    """
+    Transforma a difusão em mensagens com até `size` destinatários em BCC.
+    Os e-mails vêm em streaming (values_list + iterator), sem carregar os
+    usuários; as mensagens são gravadas com bulk_create e a difusão é
+    marcada como enviada na mesma transação. Membros em modo resumo ganham
+    um NotificationEvent em vez de entrar no BCC. Retorna os ids criados.
+    """
+    size = size or settings.EMAIL_MAX_RECIPIENTS
+    members = User.objects.filter(
+        work_groups=email.fanout_group_id, is_active=True
+    ).exclude(email="")
+    if email.fanout_exclude_id:
+        members = members.exclude(pk=email.fanout_exclude_id)
+
+    immediate = User.NotificationDelivery.IMMEDIATE
+    recipients = (
+        members.filter(notification_delivery=immediate)
+        .order_by("pk")
+        .values_list("email", flat=True)
+    )
+    # Quem prefere resumo recebe só um aviso para o próximo send_digests
+    digest_members = (
+        members.exclude(notification_delivery=immediate)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+    ids = []
+    pending = []
+    with transaction.atomic():
+        for chunk in _chunks(digest_members.iterator(chunk_size=2000), batch_size):
+            NotificationEvent.objects.bulk_create(
+                NotificationEvent(
+                    recipient_id=user_id,
+                    group_id=email.fanout_group_id,
+                    kind=NotificationEvent.Kind.NEW_OPPORTUNITY,
+                    title=email.subject,
+                    created_at=email.created_at,
+                )
+                for user_id in chunk
+            )
+        for chunk in _chunks(recipients.iterator(chunk_size=2000), size):
+            pending.append(
+                OutboundEmail(
+                    subject=email.subject,
+                    body=email.body,
+                    html_body=email.html_body,
+                    from_email=email.from_email,
+                    to=email.to,
+                    bcc=chunk,
+                )
+            )
+            if len(pending) >= batch_size:
+                ids += [e.pk for e in OutboundEmail.objects.bulk_create(pending)]
+                pending = []
+        if pending:
+            ids += [e.pk for e in OutboundEmail.objects.bulk_create(pending)]
+        mark_sent([email.pk])
+    return ids
+
+
+def _run_in_background(func, *args):
+    try:
+        func(*args)
+    finally:
+        close_old_connections()
+
+
+def _expand_and_deliver(email):
+    try:
+        for email_id in expand_broadcast(email):
+            deliver_now(email_id)
+    except Exception:
+        # A linha continua reivindicada; o dispatch_emails expande após a concessão
+        logger.exception("Erro ao expandir a difusão %s", email.pk)
+
+
+def build_message(email):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.to,
+        bcc=email.bcc,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, "text/html")
+    return message
+
+
+def _lease_until(now):
+    return now + timedelta(seconds=settings.EMAIL_CLAIM_LEASE)
+
+
+def retry_delay(attempts):
+    """Backoff exponencial: base, 2x base, 4x base... até o teto."""
+    return timedelta(
+        seconds=min(
+            settings.EMAIL_RETRY_BACKOFF * 2 ** max(attempts - 1, 0),
+            settings.EMAIL_RETRY_BACKOFF_MAX,
+        )
+    )
+
+
+def _pending(now):
+    return OutboundEmail.objects.filter(
+        status=OutboundEmail.Status.PENDING, next_attempt_at__lte=now
+    )
+
+
+def claim_batch(size=None, now=None):
+    """
+    Reivindica até `size` e-mails vencidos. FOR UPDATE SKIP LOCKED deixa
+    vários dispatchers rodarem em paralelo sem pegar as mesmas linhas; a
+    concessão (next_attempt_at no futuro) devolve a linha à fila se o
+    processo morrer no meio do envio.
+    """
+    now = now or timezone.now()
+    size = size or settings.EMAIL_BATCH_SIZE
+
+    with transaction.atomic():
+        ids = list(
+            _pending(now)
+            .select_for_update(skip_locked=True)
+            .order_by("next_attempt_at")
+            .values_list("id", flat=True)[:size]
+        )
+        if not ids:
+            return []
+        OutboundEmail.objects.filter(id__in=ids).update(
+            attempts=F("attempts") + 1, next_attempt_at=_lease_until(now)
+        )
+    return list(OutboundEmail.objects.filter(id__in=ids).order_by("id"))
+
+
+def mark_sent(ids, now=None):
+    OutboundEmail.objects.filter(id__in=ids).update(
+        status=OutboundEmail.Status.SENT, sent_at=now or timezone.now(), last_error=""
+    )
+
+
+def mark_failed(email, error, now=None):
+    """Agenda nova tentativa com backoff ou desiste após EMAIL_MAX_ATTEMPTS."""
+    now = now or timezone.now()
+    if email.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+        status, next_attempt_at = OutboundEmail.Status.FAILED, now
+        logger.error(
+            "E-mail %s falhou após %s tentativas: %s", email.pk, email.attempts, error
+        )
+    else:
+        status = OutboundEmail.Status.PENDING
+        next_attempt_at = now + retry_delay(email.attempts)
+        logger.warning(
+            "E-mail %s falhou (tentativa %s): %s", email.pk, email.attempts, error
+        )
+
+    OutboundEmail.objects.filter(pk=email.pk).update(
+        status=status, next_attempt_at=next_attempt_at, last_error=str(error)[:1000]
+    )
+
+
+def deliver_now(email_id):
+    """Entrega um e-mail recém-gravado pelo pool do processo (se ainda pendente)."""
+    now = timezone.now()
+    claimed = _pending(now).filter(pk=email_id).update(
+        attempts=F("attempts") + 1, next_attempt_at=_lease_until(now)
+    )
+    if not claimed:
+        return
+    email = OutboundEmail.objects.get(pk=email_id)
+
+    if email.fanout_group_id:
+        if settings.EMAIL_WORKER_COUNT:
+            _fanout_executor.submit(_run_in_background, _expand_and_deliver, email)
+        else:
+            _expand_and_deliver(email)
+        return
+
+    def on_done(ok, error):
+        if ok:
+            mark_sent([email_id])
+        else:
+            mark_failed(email, error)
+
+    get_email_dispatcher().submit(build_message(email), on_done=on_done)
+
+
+def dispatch_pending(connection, size=None, now=None):
+    """
+    Um ciclo do dispatcher: reivindica um lote e envia pela conexão já
+    aberta (reaproveitada entre lotes). Retorna (enviados, falhas); uma
+    difusão expandida conta como enviada.
+    """
+    emails = claim_batch(size, now)
+    sent_ids = []
+    expanded = failed = 0
+
+    for email in emails:
+        if email.fanout_group_id:
+            # Difusão: as mensagens geradas entram nos próximos lotes
+            expand_broadcast(email)
+            expanded += 1
+            continue
+        try:
+            connection.send_messages([build_message(email)])
+            sent_ids.append(email.pk)
+        except Exception as exc:
+            failed += 1
+            mark_failed(email, exc)
+            # Conexão pode ter ficado inutilizável: reabre para o próximo
+            connection.close()
+            try:
+                connection.open()
+            except Exception:
+                pass
+
+    if sent_ids:
+        mark_sent(sent_ids)
+    return len(sent_ids) + expanded, failed
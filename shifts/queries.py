@@ -0,0 +1,123 @@
+# queries.py
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Shift
+
+
+def _local_midnight(year, month, day=1):
+    return timezone.make_aware(datetime(year, month, day))
+
+
+def month_range(year, month):
+    """[início, fim) do mês no fuso atual, como datetimes aware."""
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return _local_midnight(year, month), _local_midnight(next_year, next_month)
+
+
+def year_range(year):
+    return _local_midnight(year, 1), _local_midnight(year + 1, 1)
+
+
+def _day_start(day):
+    """
+    Meia-noite local de `day`, ou None se ela não couber em datetime em UTC
+    (ex.: 9999-12-31 em fuso negativo), como o banco a gravaria.
+    """
+    try:
+        start = _local_midnight(day.year, day.month, day.day)
+        start.astimezone(dt_timezone.utc)
+    except OverflowError:
+        return None
+    return start
+
+
+def date_range(first=None, last=None):
+    """
+    Datas inclusivas [first, last] como [início, fim) aware no fuso atual;
+    pontas ausentes ou fora do intervalo representável ficam None (aberto).
+    """
+    start = _day_start(first) if first else None
+    end = None
+    if last and last < date.max:
+        end = _day_start(last + timedelta(days=1))
+    return start, end
+
+
+def period_range(year, month=None, view_mode=None):
+    """
+    Converte (ano, mês, view_mode) em um intervalo semiaberto [início, fim).
+
+    Filtrar por intervalo (start_time >= início AND start_time < fim) permite
+    range scan no índice, ao contrário de __year/__month, que viram
+    conversão de fuso + EXTRACT por linha.
+
+    view_mode segue o parâmetro do extrato: "all" = ano inteiro, número =
+    mês específico. Valores inválidos caem no ano inteiro.
+    """
+    if view_mode == "all":
+        month = None
+    elif view_mode:
+        try:
+            month = int(view_mode)
+        except ValueError:
+            month = None
+
+    if month and 1 <= month <= 12:
+        return month_range(year, month)
+    return year_range(year)
+
+
+def shift_cursor(shift):
+    """Cursor opaco (start_time em µs UTC + id) do último item da página."""
+    micros = round(shift.start_time.timestamp() * 1_000_000)
+    return f"{micros}.{shift.id}"
+
+
+def parse_shift_cursor(value):
+    """(start_time, id) do cursor, ou None se ausente/inválido."""
+    try:
+        micros, pk = value.split(".")
+        start_time = datetime.fromtimestamp(int(micros) / 1_000_000, tz=dt_timezone.utc)
+        return start_time, int(pk)
+    except (AttributeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def keyset_page(queryset, cursor=None, size=30):
+    """
+    Paginação por chave (start_time, id): a página seguinte começa logo
+    após o último item visto, então o custo não depende de quantas páginas
+    ficaram para trás (ao contrário de OFFSET). Retorna (itens, tem_mais).
+    """
+    queryset = queryset.order_by("start_time", "id")
+    after = parse_shift_cursor(cursor)
+    if after:
+        start_time, pk = after
+        queryset = queryset.filter(
+            Q(start_time__gt=start_time) | Q(start_time=start_time, id__gt=pk)
+        )
+
+    rows = list(queryset[: size + 1])
+    return rows[:size], len(rows) > size
+
+
+def annual_day_stats(group, year, shift_type_id=None):
+    """
+    Uma única query GROUP BY (dia local, tipo) com contagem e horas, em vez
+    de carregar todos os plantões do ano como instâncias do model.
+    """
+    start, end = year_range(year)
+    shifts = Shift.objects.filter(group=group, start_time__gte=start, start_time__lt=end)
+    if shift_type_id:
+        shifts = shifts.filter(shift_type__id=shift_type_id)
+
+    return (
+        shifts.annotate(day=TruncDate("start_time"))
+        .values("day", "shift_type__name", "shift_type__color")
+        .annotate(count=Count("id"), hours=Sum("duration"))
+        .order_by("day", "shift_type__name")
+    )
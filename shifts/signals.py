@@ -0,0 +1,99 @@
+# signals.py
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import invalidate_group, invalidate_shift_types, invalidate_users
+from .digest import flush_digest
+from .models import Group, Shift, ShiftType, TradeRequest
+
+
+@receiver([post_save, post_delete], sender=Shift)
+def shift_changed(sender, instance, **kwargs):
+    invalidate_group(instance.group_id)
+    # Caixa de entrada do dono: propostas para o plantão (de qualquer grupo)
+    # mostram data/tipo, e somem em cascata quando ele é excluído
+    invalidate_users(instance.owner_id)
+
+
+@receiver([post_save, post_delete], sender=ShiftType)
+def shift_type_changed(sender, instance, **kwargs):
+    invalidate_shift_types(instance.group_id)
+    # Nome e cor aparecem nos cards do grid (tipo global: em todos os grupos)
+    invalidate_group(instance.group_id)
+
+
+@receiver([post_save, post_delete], sender=TradeRequest)
+def trade_request_changed(sender, instance, origin=None, **kwargs):
+    # Caixa de entrada do dono do plantão alvo e pendências do solicitante
+    if TradeRequest.target_shift.is_cached(instance):
+        target_owner_id = instance.target_shift.owner_id
+    elif isinstance(origin, (Shift, Group)):
+        # Exclusão em cascata: dono / membros já invalidados pelo handler da
+        # origem. Evita uma query por proposta removida.
+        target_owner_id = None
+    else:
+        target_owner_id = (
+            Shift.objects.filter(id=instance.target_shift_id)
+            .values_list("owner_id", flat=True)
+            .first()
+        )
+    invalidate_users(instance.requester_id, target_owner_id)
+
+
+@receiver(post_save, sender=Group)
+def group_changed(sender, instance, created, **kwargs):
+    # Nome e convite aparecem na navbar/modais de todos os membros
+    invalidate_group(instance.id)
+    if not created:
+        invalidate_users(*instance.members.values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    # pre_delete: depois do delete a tabela de membros já foi limpa
+    invalidate_group(instance.id)
+    invalidate_users(*instance.members.values_list("id", flat=True))
+
+
+@receiver(m2m_changed, sender=Group.members.through)
+def membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+
+    if reverse:
+        # user.work_groups.add(...): instance é o usuário
+        invalidate_users(instance.pk)
+        group_ids = (
+            pk_set
+            if action != "pre_clear"
+            else instance.work_groups.values_list("id", flat=True)
+        )
+        for group_id in group_ids:
+            invalidate_group(group_id)
+    else:
+        invalidate_group(instance.pk)
+        user_ids = (
+            pk_set
+            if action != "pre_clear"
+            else instance.members.values_list("id", flat=True)
+        )
+        invalidate_users(*user_ids)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, created, raw, update_fields=None, **kwargs):
+    if created or raw:
+        return
+    if instance.notification_delivery == instance.NotificationDelivery.IMMEDIATE and (
+        update_fields is None or "notification_delivery" in update_fields
+    ):
+        # Saiu do resumo: entrega o que tinha ficado para a próxima janela
+        transaction.on_commit(partial(flush_digest, instance.pk))
+    # Navbar e lista de membros exibem e-mail/nome
+    invalidate_users(instance.pk)
+    for group_id in instance.work_groups.values_list("id", flat=True):
+        invalidate_group(group_id)
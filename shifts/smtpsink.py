@@ -0,0 +1,122 @@
+# smtpsink.py
+import asyncio
+import threading
+import time
+
+
+class SMTPSink:
+    """
+    Servidor SMTP local (asyncio) que aceita e descarta as mensagens, para
+    medir o pipeline de e-mail sem depender de um provedor real.
+
+    Roda em uma thread própria com o seu event loop e registra, para cada
+    mensagem, o instante de chegada (time.perf_counter) e os destinatários.
+    `latency` simula o tempo de resposta do provedor a cada DATA.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.connections = 0
+        self.messages = []
+        self._cond = threading.Condition()
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    # --- Controle (thread do chamador) ---
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="smtp-sink", daemon=True
+        )
+        self._thread.start()
+        self._server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._handle, self.host, self.port), self._loop
+        ).result()
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.host, self.port
+
+    def stop(self):
+        if self._loop is None:
+            return
+
+        async def close():
+            self._server.close()
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    def reset(self):
+        with self._cond:
+            self.connections = 0
+            self.messages = []
+
+    def wait_for(self, count, timeout=None):
+        """Espera até `count` mensagens recebidas. False se o tempo acabar."""
+        with self._cond:
+            return self._cond.wait_for(lambda: len(self.messages) >= count, timeout)
+
+    def arrivals(self):
+        """Instante de chegada da primeira mensagem para cada destinatário."""
+        with self._cond:
+            result = {}
+            for received_at, recipients in self.messages:
+                for address in recipients:
+                    result.setdefault(address, received_at)
+            return result
+
+    # --- Protocolo (event loop) ---
+
+    async def _handle(self, reader, writer):
+        with self._cond:
+            self.connections += 1
+
+        recipients = []
+        writer.write(b"220 oncall-sink ESMTP\r\n")
+        try:
+            while True:
+                await writer.drain()
+                line = await reader.readline()
+                if not line:
+                    break
+                verb = line[:4].upper()
+
+                if verb == b"EHLO":
+                    writer.write(b"250-oncall-sink\r\n250 8BITMIME\r\n")
+                elif verb == b"MAIL":
+                    recipients = []
+                    writer.write(b"250 OK\r\n")
+                elif verb == b"RCPT":
+                    address = line.split(b":", 1)[1].strip().strip(b"<>")
+                    recipients.append(address.decode())
+                    writer.write(b"250 OK\r\n")
+                elif verb == b"DATA":
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await writer.drain()
+                    while (await reader.readline()) not in (b".\r\n", b""):
+                        pass
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                    with self._cond:
+                        self.messages.append((time.perf_counter(), recipients))
+                        self._cond.notify_all()
+                    writer.write(b"250 OK: queued\r\n")
+                elif verb == b"QUIT":
+                    writer.write(b"221 Bye\r\n")
+                    await writer.drain()
+                    break
+                elif verb in (b"HELO", b"RSET", b"NOOP"):
+                    writer.write(b"250 OK\r\n")
+                else:
+                    writer.write(b"502 Command not implemented\r\n")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
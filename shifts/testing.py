@@ -0,0 +1,16 @@
+# testing.py
+from django.test import TestCase as DjangoTestCase
+from django.test import TransactionTestCase as DjangoTransactionTestCase
+from django.test import override_settings
+
+
+# Base dos testes do app: e-mail síncrono (EMAIL_WORKER_COUNT=0), qualquer
+# que seja o runner. Testes do caminho assíncrono sobrescrevem o valor.
+@override_settings(EMAIL_WORKER_COUNT=0)
+class TestCase(DjangoTestCase):
+    pass
+
+
+@override_settings(EMAIL_WORKER_COUNT=0)
+class TransactionTestCase(DjangoTransactionTestCase):
+    pass
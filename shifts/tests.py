@@ -1,10 +1,54 @@
-from django.test import TestCase, Client
+import json
+import smtplib
+import threading
+import time
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.conf import settings
 from django.utils import timezone
-from datetime import timedelta
-from shifts.models import Group, Shift, ShiftType, TradeRequest
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest.mock import patch
+from shifts.agenda import build_month_agenda
+from shifts.cache import agenda_cache_stats, group_shift_types
+from shifts.cycles import TradeGraph, find_trade_cycles
+from shifts.digest import build_digests
+from shifts.forms import ShiftForm
+from shifts.marketplace import open_offers_count
+from shifts.intervals import IntervalIndex, bulk_create_shifts, find_overlaps
+from shifts.matching import SwapIndex, swap_candidates
+from shifts.expiry import last_sweep
+from shifts.models import (
+    Group,
+    NotificationEvent,
+    OutboundEmail,
+    Shift,
+    ShiftType,
+    TradeRequest,
+)
+from shifts.outbox import claim_batch, dispatch_pending
+from shifts.queries import period_range
+from shifts.smtpsink import SMTPSink
+from shifts.testing import TestCase, TransactionTestCase
+from shifts.trades import (
+    TradeConflict,
+    accept_trade,
+    bulk_accept_trades,
+    bulk_reject_trades,
+    execute_cycle,
+    reject_trade,
+    send_trade_notifications,
+)
+from shifts.utils import EmailDispatcher
 from django.core import mail
+from django.core.mail import EmailMultiAlternatives
+from django.core.mail.backends import locmem
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection
 
 User = get_user_model()
 
@@ -185,10 +229,11 @@ class OnCallFullJourneyTest(TestCase):
         mail.outbox = []  # Limpa a caixa
 
         self.client.force_login(self.user_colaborador)
-        self.client.post(
-            reverse("create_trade_request"),
-            {"target_shift_id": shift.id, "message": "Posso cobrir!"},
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("create_trade_request"),
+                {"target_shift_id": shift.id, "message": "Posso cobrir!"},
+            )
 
         # VERIFICAÇÃO DE EMAIL 1: O Admin deve receber aviso de nova proposta
 
@@ -204,7 +249,8 @@ class OnCallFullJourneyTest(TestCase):
 
         trade_req = TradeRequest.objects.first()
         self.client.force_login(self.user_admin)
-        self.client.post(reverse("accept_trade_request", args=[trade_req.id]))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("accept_trade_request", args=[trade_req.id]))
 
         # VERIFICAÇÃO DE EMAIL 2: A Ana deve receber confirmação
 
@@ -271,3 +317,1937 @@ class OnCallFullJourneyTest(TestCase):
         self.assertEqual(shift_admin.owner, self.user_colaborador)
         self.assertEqual(shift_ana.owner, self.user_admin)
         self.log("✅ Sucesso: Ambos os plantões trocaram de dono corretamente.")
+
+
+class ShiftExpiryTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="expira@hospital.com", password="password123", full_name="Dr. Expira"
+        )
+        self.group = Group.objects.create(name="UTI Expira", admin=self.user)
+        self.group.members.add(self.user)
+        self.st = ShiftType.objects.create(name="Geral", group=self.group)
+
+    def _shift(self, days):
+        return Shift.objects.create(
+            owner=self.user,
+            group=self.group,
+            shift_type=self.st,
+            start_time=timezone.now() + timedelta(days=days),
+            duration=12,
+        )
+
+    def test_expire_shifts_command_in_batches(self):
+        print("\n🧪 TESTE: Varredura de plantões expirados (expire_shifts)")
+
+        past = [self._shift(-d) for d in range(2, 7)]
+        future = self._shift(3)
+
+        call_command("expire_shifts", batch_size=2, stdout=StringIO())
+
+        self.assertFalse(
+            Shift.objects.filter(id__in=[s.id for s in past], is_active=True).exists()
+        )
+        future.refresh_from_db()
+        self.assertTrue(future.is_active)
+
+        sweep = last_sweep()
+        self.assertIsNotNone(sweep)
+        self.assertEqual(sweep.expired_count, len(past))
+
+    def test_dashboard_never_writes(self):
+        print("\n🧪 TESTE: Dashboard não executa UPDATE de expiração")
+
+        past = self._shift(-3)
+        self.client.force_login(self.user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("dashboard"))
+
+        self.assertFalse(
+            any(q["sql"].startswith('UPDATE "shifts_shift"') for q in ctx.captured_queries)
+        )
+        past.refresh_from_db()
+        self.assertTrue(past.is_active)
+        self.assertFalse(past.is_live)
+
+
+class AgendaBuilderTest(TestCase):
+
+    def test_month_agenda_buckets_by_local_date(self):
+        print("\n🧪 TESTE: Agenda mensal agrupa por data local em uma passada")
+
+        user = User.objects.create_user(email="grid@hospital.com", password="x")
+        group = Group.objects.create(name="Grid", admin=user)
+        st = ShiftType.objects.create(name="Noturno", group=group)
+
+        # 23h em São Paulo já é dia seguinte em UTC
+        late = Shift.objects.create(
+            owner=user,
+            group=group,
+            shift_type=st,
+            start_time=timezone.make_aware(datetime(2026, 3, 10, 23, 0)),
+            duration=12,
+        )
+
+        agenda = build_month_agenda(2026, 3, [late], date(2026, 3, 10))
+
+        self.assertEqual(len(agenda), 31)
+        self.assertEqual(agenda[9]["shifts"], [late])
+        self.assertTrue(agenda[9]["is_today"])
+        self.assertEqual(agenda[10]["shifts"], [])
+        self.assertTrue(agenda[6]["is_weekend"])  # 07/03/2026 é sábado
+
+
+class MonthAgendaCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="cache@hospital.com", password="password123"
+        )
+        self.group = Group.objects.create(name="UTI Cache", admin=self.user)
+        self.group.members.add(self.user)
+        self.st = ShiftType.objects.create(name="Geral", group=self.group)
+        self.shift = Shift.objects.create(
+            owner=self.user,
+            group=self.group,
+            shift_type=self.st,
+            start_time=timezone.now() + timedelta(hours=2),
+            duration=6,
+        )
+        self.client.force_login(self.user)
+
+    def test_hit_then_invalidation_on_shift_change(self):
+        print("\n🧪 TESTE: Cache da agenda mensal (hit, miss e invalidação)")
+
+        local_start = timezone.localtime(self.shift.start_time)
+        url = f"{reverse('dashboard')}?month={local_start.month}&year={local_start.year}"
+
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(agenda_cache_stats()["hits"], 1)
+        self.assertEqual(agenda_cache_stats()["misses"], 1)
+
+        self.shift.tradable = True
+        self.shift.save()
+
+        response = self.client.get(url)
+        self.assertEqual(agenda_cache_stats()["misses"], 2)
+
+        cached_shifts = [s for day in response.context["agenda_days"] for s in day["shifts"]]
+        self.assertTrue(cached_shifts[0].tradable)
+
+
+class DashboardIndexUsageTest(TestCase):
+    """
+    Roda EXPLAIN em cada SELECT do dashboard sobre uma base semeada
+    e verifica que os índices compostos/parciais são usados.
+    """
+
+    HOT_INDEXES = (
+        "shift_group_start_idx",
+        "shift_owner_start_idx",
+        "shift_group_tradable_idx",
+        "trade_requester_target_idx",
+        "trade_pending_target_idx",
+        "trade_pending_requester_idx",
+    )
+
+    def setUp(self):
+        cache.clear()
+        users = [
+            User.objects.create_user(email=f"idx{i}@hospital.com", password="x")
+            for i in range(8)
+        ]
+        self.user = users[0]
+        now = timezone.now()
+
+        for g in range(3):
+            group = Group.objects.create(name=f"Grupo {g}", admin=users[0])
+            group.members.add(*users)
+            st = ShiftType.objects.create(name="Geral", group=group)
+            shifts = Shift.objects.bulk_create(
+                Shift(
+                    owner=users[i % len(users)],
+                    group=group,
+                    shift_type=st,
+                    start_time=now + timedelta(hours=6 * i - 24 * 180),
+                    end_time=now + timedelta(hours=6 * i - 24 * 180 + 6),
+                    duration=6,
+                    tradable=i % 7 == 0,
+                )
+                for i in range(1500)
+            )
+            TradeRequest.objects.bulk_create(
+                TradeRequest(
+                    group=group,
+                    requester=users[(i + 1) % len(users)],
+                    target_shift=shift,
+                    status=(
+                        TradeRequest.Status.PENDING
+                        if i % 3
+                        else TradeRequest.Status.REJECTED
+                    ),
+                )
+                for i, shift in enumerate(shifts[::5])
+            )
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+            if connection.vendor == "postgresql":
+                cursor.execute("SET enable_seqscan = off")
+
+        self.group = Group.objects.get(name="Grupo 0")
+        self.client.force_login(self.user)
+
+    def _explain(self, sql):
+        prefix = "EXPLAIN QUERY PLAN" if connection.vendor == "sqlite" else "EXPLAIN"
+        with connection.cursor() as cursor:
+            cursor.execute(f"{prefix} {sql}")
+            return "\n".join(" ".join(map(str, row)) for row in cursor.fetchall())
+
+    def test_dashboard_queries_use_indexes(self):
+        print("\n🧪 TESTE: EXPLAIN das queries do dashboard usa os índices")
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("dashboard"), {"group_id": self.group.id})
+
+        hot_queries = [
+            q["sql"]
+            for q in ctx.captured_queries
+            if q["sql"].startswith("SELECT")
+            and ('FROM "shifts_shift"' in q["sql"] or 'FROM "shifts_traderequest"' in q["sql"])
+        ]
+        self.assertGreaterEqual(len(hot_queries), 3)
+
+        for sql in hot_queries:
+            plan = self._explain(sql)
+            self.assertTrue(
+                any(name in plan for name in self.HOT_INDEXES),
+                f"Nenhum índice usado:\n{sql}\n{plan}",
+            )
+
+
+class PeriodRangeTest(TestCase):
+
+    def test_half_open_local_ranges(self):
+        print("\n🧪 TESTE: Intervalos [início, fim) por período")
+
+        start, end = period_range(2026, 12)
+        self.assertEqual(timezone.localtime(start), timezone.make_aware(datetime(2026, 12, 1)))
+        self.assertEqual(timezone.localtime(end), timezone.make_aware(datetime(2027, 1, 1)))
+
+        self.assertEqual(period_range(2026, 5, view_mode="all"), period_range(2026))
+        self.assertEqual(period_range(2026, view_mode="3"), period_range(2026, 3))
+        self.assertEqual(period_range(2026, view_mode="xx"), period_range(2026))
+        self.assertEqual(period_range(2026, view_mode="13"), period_range(2026))
+        self.assertEqual(period_range(2026, view_mode="-1"), period_range(2026))
+
+    def test_out_of_range_view_mode_falls_back_to_year(self):
+        user = User.objects.create(email="extrato@periodo.com")
+        group = Group.objects.create(name="Período", admin=user)
+        group.members.add(user)
+        self.client.force_login(user)
+        for view_mode in ("13", "-1", "0"):
+            response = self.client.get(
+                reverse("dashboard"),
+                {"group_id": group.id, "filter_user": user.id, "view_mode": view_mode},
+            )
+            self.assertEqual(response.status_code, 200, view_mode)
+
+
+class AnnualCalendarTest(TestCase):
+
+    def test_annual_heatmap_uses_single_aggregate_query(self):
+        print("\n🧪 TESTE: Visão anual com uma única query agregada")
+
+        cache.clear()
+        user = User.objects.create_user(email="ano@hospital.com", password="x")
+        group = Group.objects.create(name="Anual", admin=user)
+        group.members.add(user)
+        day_st = ShiftType.objects.create(name="Diurno", group=group)
+        night_st = ShiftType.objects.create(name="Noturno", group=group)
+
+        for st, hour in ((day_st, 7), (night_st, 19), (night_st, 1)):
+            Shift.objects.create(
+                owner=user,
+                group=group,
+                shift_type=st,
+                start_time=timezone.make_aware(datetime(2026, 4, 15, hour)),
+                duration=6,
+            )
+
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                reverse("dashboard"), {"display": "annual", "year": 2026}
+            )
+
+        shift_queries = [q["sql"] for q in ctx.captured_queries if 'FROM "shifts_shift"' in q["sql"]]
+        aggregate = [sql for sql in shift_queries if "GROUP BY" in sql]
+        self.assertEqual(len(aggregate), 1)
+        # Fora o agregado, só a lista de plantões futuros do próprio usuário
+        # (modal de troca) e o contador de ofertas do mural (COUNT, sem linhas)
+        for sql in shift_queries:
+            if sql not in aggregate and not sql.startswith("SELECT COUNT(*)"):
+                self.assertIn('"owner_id" =', sql)
+
+        heatmap = response.context["year_heatmap"]
+        self.assertEqual(len(heatmap), 12)
+        april_15 = heatmap[3]["days"][14]
+        self.assertEqual(april_15["count"], 3)
+        self.assertEqual(april_15["hours"], 18)
+        self.assertEqual(april_15["level"], 4)
+        self.assertEqual({m["name"]: m["count"] for m in april_15["mix"]}, {"Diurno": 1, "Noturno": 2})
+
+
+class CalendarFragmentTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="htmx@hospital.com", password="x")
+        self.group = Group.objects.create(name="UTI htmx", admin=self.user)
+        self.group.members.add(self.user)
+        self.client.force_login(self.user)
+
+    def test_fragment_renders_only_the_grid(self):
+        print("\n🧪 TESTE: Fragmento htmx do calendário")
+
+        params = {"group_id": self.group.id, "month": 2, "year": 2026}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                reverse("calendar_fragment"), params, HTTP_HX_REQUEST="true"
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "shifts/components/calendar.html")
+        self.assertTemplateNotUsed(response, "shifts/components/incoming_trades.html")
+        self.assertTemplateNotUsed(response, "shifts/components/modals.html")
+        self.assertContains(response, 'hx-swap-oob="true"')
+        self.assertIn("month=2", response["HX-Push-Url"])
+        self.assertFalse(
+            any("shifts_traderequest" in q["sql"] for q in ctx.captured_queries)
+        )
+
+    def test_plain_request_redirects_to_dashboard(self):
+        response = self.client.get(reverse("calendar_fragment"), {"month": 2})
+        self.assertRedirects(
+            response, f"{reverse('dashboard')}?month=2", fetch_redirect_response=False
+        )
+
+
+class DashboardConditionalGetTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="etag@hospital.com", password="x")
+        self.other = User.objects.create_user(email="outro@hospital.com", password="x")
+        self.group = Group.objects.create(name="UTI ETag", admin=self.user)
+        self.group.members.add(self.user, self.other)
+        self.st = ShiftType.objects.create(name="Geral", group=self.group)
+        self.client.force_login(self.user)
+        self.url = f"{reverse('dashboard')}?group_id={self.group.id}"
+
+    def _etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def test_not_modified_until_group_or_user_changes(self):
+        print("\n🧪 TESTE: Dashboard responde 304 com ETag por versão")
+
+        self._etag()  # primeira visita define o cookie CSRF
+        etag = self._etag()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any("shifts_shift" in q["sql"] for q in ctx.captured_queries))
+
+        # Plantão novo no grupo
+        shift = Shift.objects.create(
+            owner=self.other,
+            group=self.group,
+            shift_type=self.st,
+            start_time=timezone.now() + timedelta(days=2),
+            tradable=True,
+        )
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Proposta de troca do próprio usuário
+        etag = self._etag()
+        TradeRequest.objects.create(group=self.group, requester=self.user, target_shift=shift)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Novo membro entra no grupo
+        etag = self._etag()
+        newcomer = User.objects.create_user(email="novo@hospital.com", password="x")
+        self.group.members.add(newcomer)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_follows_rendered_group_for_stale_group_id(self):
+        # Favorito com o id de um grupo do qual o usuário saiu: o dashboard
+        # cai no grupo dele, e o ETag precisa acompanhar esse grupo
+        left = Group.objects.create(name="Antigo", admin=self.other)
+        self.url = f"{reverse('dashboard')}?group_id={left.id}"
+        self._etag()
+        etag = self._etag()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Shift.objects.create(
+            owner=self.other,
+            group=self.group,
+            shift_type=self.st,
+            start_time=timezone.now() + timedelta(days=2),
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["active_group"], self.group)
+
+
+    def test_global_shift_type_change_invalidates_every_group(self):
+        # Tipo global (sem grupo) aparece nos cards de todos os grupos
+        shared = ShiftType.objects.create(name="Sobreaviso", group=None)
+        Shift.objects.create(
+            owner=self.other,
+            group=self.group,
+            shift_type=shared,
+            start_time=timezone.now() + timedelta(days=2),
+        )
+        self._etag()
+        etag = self._etag()
+
+        shared.name = "Sobreaviso remoto"
+        shared.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Sobreaviso remoto")
+
+class GroupShiftTypeRegistryTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="tipos@hospital.com", password="x")
+        self.group = Group.objects.create(name="UTI Tipos", admin=self.user)
+        self.other_group = Group.objects.create(name="Outro Hospital", admin=self.user)
+        self.mine = ShiftType.objects.create(name="Noturno", group=self.group)
+        self.foreign = ShiftType.objects.create(name="Alheio", group=self.other_group)
+
+    def test_form_choices_are_group_scoped_and_cached(self):
+        print("\n🧪 TESTE: Tipos de plantão escopados por grupo e cacheados")
+
+        form = ShiftForm(group=self.group)
+        ids = [value for value, _ in form.fields["shift_type"].choices if value]
+        self.assertEqual(ids, [self.mine.pk])
+
+        with self.assertNumQueries(0):
+            ShiftForm(group=self.group).fields["shift_type"].choices
+
+        # Tipo de outro grupo é rejeitado na validação
+        form = ShiftForm(
+            {"shift_type": self.foreign.pk, "start_time": timezone.now(), "duration": 12},
+            group=self.group,
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("shift_type", form.errors)
+
+        # Novo tipo invalida o registro
+        extra = ShiftType.objects.create(name="Diurno", group=self.group)
+        self.assertEqual(
+            [st.pk for st in group_shift_types(self.group.pk)], [extra.pk, self.mine.pk]
+        )
+
+
+class RequestMetricsMiddlewareTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="metricas@hospital.com", password="x")
+        group = Group.objects.create(name="UTI Métricas", admin=self.user)
+        group.members.add(self.user)
+        self.client.force_login(self.user)
+
+    @override_settings(REQUEST_METRICS_HEADER=False)
+    def test_server_timing_header_disabled(self):
+        response = self.client.get(reverse("dashboard"))
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(REQUEST_METRICS_HEADER=True)
+    def test_server_timing_header(self):
+        print("\n🧪 TESTE: Header Server-Timing com queries, SQL, template e view")
+
+        response = self.client.get(reverse("dashboard"))
+        timing = response["Server-Timing"]
+
+        for metric in ("db;dur=", "tpl;dur=", "view;dur=", "total;dur="):
+            self.assertIn(metric, timing)
+        self.assertRegex(timing, r'desc="[1-9]\d* queries"')
+        self.assertNotIn("tpl;dur=0.0", timing)
+
+    @override_settings(REQUEST_QUERY_BUDGET=0)
+    def test_over_budget_request_is_logged(self):
+        with self.assertLogs("shifts.metrics", level="WARNING") as logs:
+            self.client.get(reverse("dashboard"))
+
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertTrue(entry["over_budget"])
+        self.assertEqual(entry["path"], reverse("dashboard"))
+        self.assertGreater(entry["queries"], 0)
+
+
+class SeedLoadTest(TestCase):
+
+    def test_seed_load_generates_consistent_dataset(self):
+        print("\n🧪 TESTE: Carga sintética sem sobreposição de plantões por dono")
+
+        out = StringIO()
+        call_command("seed_load", members=4, days=30, tradable_ratio=0.5, seed=1, stdout=out)
+
+        group = Group.objects.get()
+        self.assertEqual(group.members.count(), 4)
+        self.assertEqual(Shift.objects.count(), 30 * 2)
+
+        by_owner = {}
+        for shift in Shift.objects.order_by("start_time"):
+            self.assertEqual(shift.end_time, shift.start_time + timedelta(hours=shift.duration))
+            previous = by_owner.get(shift.owner_id)
+            if previous:
+                self.assertLessEqual(previous.end_time, shift.start_time)
+            by_owner[shift.owner_id] = shift
+
+        for trade in TradeRequest.objects.select_related("target_shift"):
+            self.assertNotEqual(trade.requester_id, trade.target_shift.owner_id)
+            self.assertTrue(trade.target_shift.tradable)
+
+    def test_fewer_members_than_types_never_double_books(self):
+        call_command("seed_load", members=2, shift_types=3, days=10, seed=1, stdout=StringIO())
+        self.assertEqual(Shift.objects.count(), 10 * 3)
+        self.assertEqual(list(find_overlaps()), [])
+
+        # 07-19 e 07-13 no mesmo dia: um membro só não cobre
+        with self.assertRaises(CommandError):
+            call_command("seed_load", members=1, shift_types=3, days=2, stdout=StringIO())
+
+    def test_bench_size_reports_every_scenario(self):
+        from shifts.management.commands.bench_dashboard import bench_size
+
+        result = bench_size(members=3, days=20, iterations=2, seed=1)
+        self.assertIsNotNone(result["scenarios"]["trade:create"])
+
+        self.assertIn("dashboard:annual_calendar", result["scenarios"])
+        self.assertIn("trade:accept", result["scenarios"])
+        for name, stats in result["scenarios"].items():
+            self.assertLessEqual(stats["p50_ms"], stats["p95_ms"], name)
+            self.assertTrue(set(stats["status"]) <= {200, 302}, name)
+
+
+@override_settings(EXTRACT_PAGE_SIZE=5)
+class ExtractKeysetPaginationTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="extrato@hospital.com", password="x")
+        self.group = Group.objects.create(name="UTI Extrato", admin=self.user)
+        self.group.members.add(self.user)
+        st = ShiftType.objects.create(name="Diurno", group=self.group)
+
+        # 14 plantões em 9 dias; dias com 2 plantões caem na borda das páginas
+        year = timezone.localdate().year
+        start = timezone.make_aware(datetime(year, 2, 1, 7))
+        offsets = [0, 1, 2, 3, 4, 4, 5, 5, 6, 6, 7, 7, 8, 8]
+        for i, day in enumerate(offsets):
+            Shift.objects.create(
+                group=self.group,
+                owner=self.user,
+                shift_type=st,
+                start_time=start + timedelta(days=day, hours=12 * (i % 2)),
+                duration=6,
+            )
+        self.params = {
+            "group_id": self.group.id,
+            "year": year,
+            "filter_user": self.user.id,
+            "view_mode": "all",
+        }
+        self.client.force_login(self.user)
+
+    def test_pages_cover_extract_without_splitting_days(self):
+        print("\n🧪 TESTE: Extrato paginado por (start_time, id) sem partir dias")
+
+        response = self.client.get(reverse("dashboard"), self.params)
+        pages = [response.context["agenda_days"]]
+        next_query = response.context["extract_next_query"]
+        self.assertContains(response, 'id="extract-more"')
+
+        while next_query:
+            response = self.client.get(
+                f"{reverse('extract_page')}?{next_query}", HTTP_HX_REQUEST="true"
+            )
+            self.assertTemplateUsed(response, "shifts/components/extract_page.html")
+            pages.append(response.context["agenda_days"])
+            next_query = response.context["extract_next_query"]
+
+        self.assertGreater(len(pages), 2)
+        for page in pages:
+            self.assertLessEqual(sum(len(d["shifts"]) for d in page), 5)
+
+        days = [d["date"] for page in pages for d in page]
+        self.assertEqual(len(days), len(set(days)), "Dia repetido entre páginas")
+
+        shifts = [s for page in pages for d in page for s in d["shifts"]]
+        self.assertEqual(
+            [s.id for s in shifts],
+            list(Shift.objects.order_by("start_time", "id").values_list("id", flat=True)),
+        )
+
+    def test_extract_page_requires_htmx(self):
+        response = self.client.get(reverse("extract_page"), {**self.params, "cursor": "1.1"})
+        self.assertRedirects(
+            response,
+            f"{reverse('dashboard')}?group_id={self.group.id}&year={self.params['year']}"
+            f"&filter_user={self.user.id}&view_mode=all",
+            fetch_redirect_response=False,
+        )
+
+
+class TradeInboxTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(email="dono@hospital.com", password="x")
+        self.requester = User.objects.create_user(email="pede@hospital.com", password="x")
+        self.group = Group.objects.create(name="UTI Caixa", admin=self.owner)
+        self.group.members.add(self.owner, self.requester)
+        st = ShiftType.objects.create(name="Noturno", group=self.group)
+        start = timezone.now() + timedelta(days=3)
+        self.target = Shift.objects.create(
+            group=self.group, owner=self.owner, shift_type=st,
+            start_time=start, duration=12, tradable=True,
+        )
+        self.offered = Shift.objects.create(
+            group=self.group, owner=self.requester, shift_type=st,
+            start_time=start + timedelta(days=1), duration=12,
+        )
+
+    def test_inbox_is_one_round_trip_and_cached(self):
+        print("\n🧪 TESTE: Caixa de trocas em query única e cacheada por usuário")
+        from shifts.inbox import TradeInbox
+
+        TradeRequest.objects.create(
+            group=self.group, requester=self.requester,
+            target_shift=self.target, offered_shift=self.offered,
+        )
+
+        # Pendentes (recebidas + enviadas) e plantões futuros
+        with self.assertNumQueries(2):
+            inbox = TradeInbox.load(self.owner, self.group)
+        self.assertEqual(inbox.incoming_count, 1)
+        self.assertEqual(inbox.future_shifts, [self.target])
+
+        TradeInbox.for_user(self.requester, self.group)
+        with self.assertNumQueries(0):
+            inbox = TradeInbox.for_user(self.requester, self.group)
+            inbox.incoming[:]
+        self.assertEqual(inbox.pending_target_ids, {self.target.id})
+        self.assertEqual(inbox.incoming_count, 0)
+
+    def test_trade_state_changes_invalidate_inbox(self):
+        print("\n🧪 TESTE: Caixa de trocas invalidada ao propor e aceitar")
+        from shifts.inbox import TradeInbox
+
+        self.assertEqual(TradeInbox.for_user(self.owner, self.group).incoming_count, 0)
+
+        self.client.force_login(self.requester)
+        self.client.post(
+            reverse("create_trade_request"), {"target_shift_id": self.target.id}
+        )
+        self.assertEqual(TradeInbox.for_user(self.owner, self.group).incoming_count, 1)
+
+        # Dashboard do dono: badge na navbar e bloco de pendências
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse("dashboard"))
+        self.assertContains(response, 'href="#incoming-trades"')
+        self.assertContains(response, 'id="incoming-trades"')
+
+        trade = TradeRequest.objects.get()
+        self.client.post(reverse("accept_trade_request", args=[trade.id]))
+        self.assertEqual(TradeInbox.for_user(self.owner, self.group).incoming_count, 0)
+        self.assertEqual(
+            TradeInbox.for_user(self.requester, self.group).future_shifts,
+            [self.target, self.offered],
+        )
+
+
+class GatedEmailBackend(locmem.EmailBackend):
+    """Backend de teste: nos workers, só envia quando o portão abre."""
+
+    gate = threading.Event()
+    connections_opened = 0
+
+    def open(self):
+        type(self).connections_opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        if threading.current_thread().name.startswith("email-worker"):
+            self.gate.wait(5)
+        return super().send_messages(messages)
+
+
+class RefusingEmailBackend(GatedEmailBackend):
+    """Recusa sempre o destinatário ruim@h.com (erro permanente)."""
+
+    def send_messages(self, messages):
+        if any("ruim@h.com" in message.to for message in messages):
+            raise smtplib.SMTPRecipientsRefused({"ruim@h.com": (550, b"no such user")})
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND="shifts.tests.GatedEmailBackend")
+class EmailDispatcherTest(TestCase):
+
+    def setUp(self):
+        GatedEmailBackend.gate.clear()
+        GatedEmailBackend.connections_opened = 0
+
+    def message(self, n):
+        return EmailMultiAlternatives(f"Assunto {n}", "corpo", to=[f"r{n}@h.com"])
+
+    def test_pool_batches_over_reused_connections(self):
+        print("\n🧪 TESTE: Pool de e-mail em lotes com conexão reaproveitada")
+        dispatcher = EmailDispatcher(workers=2, queue_size=50, batch_size=10)
+
+        for n in range(30):
+            dispatcher.submit(self.message(n))
+        GatedEmailBackend.gate.set()
+
+        self.assertTrue(dispatcher.flush(timeout=5))
+        dispatcher.shutdown(timeout=5)
+
+        self.assertEqual(len(mail.outbox), 30)
+        stats = dispatcher.stats()
+        self.assertEqual(stats["sent"], 30)
+        self.assertEqual(stats["inline"], 0)
+        self.assertEqual(stats["workers"], 0)
+        self.assertLessEqual(GatedEmailBackend.connections_opened, 2)
+        self.assertLess(stats["batches"], 30)
+
+    def test_full_queue_applies_backpressure_without_dropping(self):
+        print("\n🧪 TESTE: Fila cheia envia na requisição (backpressure)")
+        dispatcher = EmailDispatcher(
+            workers=1, queue_size=1, batch_size=1, enqueue_timeout=0.05
+        )
+
+        # 1º fica preso no worker, 2º ocupa a fila, 3º não cabe
+        dispatcher.submit(self.message(1))
+        deadline = time.monotonic() + 2
+        while dispatcher.queue.qsize() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        dispatcher.submit(self.message(2))
+        dispatcher.submit(self.message(3))
+
+        self.assertEqual(dispatcher.stats()["inline"], 1)
+        self.assertEqual([m.subject for m in mail.outbox], ["Assunto 3"])
+
+        GatedEmailBackend.gate.set()
+        dispatcher.shutdown(timeout=5)
+        self.assertEqual(len(mail.outbox), 3)
+
+    @override_settings(EMAIL_BACKEND="shifts.tests.RefusingEmailBackend")
+    def test_one_refused_message_does_not_fail_the_batch(self):
+        print("\n🧪 TESTE: Falha de uma mensagem não reenvia nem falha o lote")
+        dispatcher = EmailDispatcher(workers=1, queue_size=50, batch_size=10)
+        results = {}
+
+        recipients = ["r1@h.com", "r2@h.com", "ruim@h.com", "r4@h.com", "r5@h.com"]
+        for recipient in recipients:
+            dispatcher.submit(
+                EmailMultiAlternatives("Oi", "corpo", to=[recipient]),
+                on_done=lambda ok, error, recipient=recipient: results.__setitem__(recipient, ok),
+            )
+        GatedEmailBackend.gate.set()
+        dispatcher.shutdown(timeout=5)
+
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), sorted(set(recipients) - {"ruim@h.com"}))
+        self.assertEqual(results, {r: r != "ruim@h.com" for r in recipients})
+        self.assertEqual(dispatcher.stats()["sent"], 4)
+        self.assertEqual(dispatcher.stats()["failed"], 1)
+
+    def test_sync_mode_sends_immediately(self):
+        dispatcher = EmailDispatcher()
+        dispatcher.submit(
+            EmailMultiAlternatives("Oi", "corpo", to=["a@h.com"], bcc=["b@h.com"])
+        )
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].bcc, ["b@h.com"])
+
+
+class FailingEmailBackend(locmem.EmailBackend):
+    def send_messages(self, messages):
+        raise smtplib.SMTPServerDisconnected("Conexão recusada")
+
+
+class FlakyConnectEmailBackend(locmem.EmailBackend):
+    """Recusa a primeira conexão (servidor fora do ar), aceita as seguintes."""
+    opens = 0
+
+    def open(self):
+        FlakyConnectEmailBackend.opens += 1
+        if FlakyConnectEmailBackend.opens == 1:
+            raise smtplib.SMTPConnectError(421, "Serviço indisponível")
+
+
+class OutboundEmailTest(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(email="dono@caixa.com", password="x")
+        self.requester = User.objects.create_user(email="pede@caixa.com", password="x")
+        group = Group.objects.create(name="UTI Saída", admin=self.owner)
+        group.members.add(self.owner, self.requester)
+        st = ShiftType.objects.create(name="Noturno", group=group)
+        self.target = Shift.objects.create(
+            group=group, owner=self.owner, shift_type=st,
+            start_time=timezone.now() + timedelta(days=2), duration=12, tradable=True,
+        )
+        self.client.force_login(self.requester)
+
+    def propose(self):
+        self.client.post(
+            reverse("create_trade_request"), {"target_shift_id": self.target.id}
+        )
+
+    def test_sync_mode_records_and_sends(self):
+        print("\n🧪 TESTE: Notificação gravada na caixa de saída e enviada")
+        # Mesmo síncrono, o envio espera o commit da requisição
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.propose()
+        self.assertEqual(len(mail.outbox), 0)
+        for callback in callbacks:
+            callback()
+
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.status, OutboundEmail.Status.SENT)
+        self.assertEqual(email.to, ["dono@caixa.com"])
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(EMAIL_WORKER_COUNT=2)
+    def test_pending_rows_survive_and_are_dispatched(self):
+        print("\n🧪 TESTE: dispatch_emails entrega o que ficou pendente")
+
+        # Processo "reciclado": o on_commit nunca roda
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.propose()
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.Status.PENDING)
+        self.assertEqual(len(mail.outbox), 0)
+
+        out = StringIO()
+        call_command("dispatch_emails", once=True, stdout=out)
+
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.status, OutboundEmail.Status.SENT)
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+        # Já entregue: o callback tardio não reenvia
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(EMAIL_WORKER_COUNT=2)
+    def test_claimed_rows_are_not_claimed_twice(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            self.propose()
+        self.assertEqual(len(claim_batch()), 1)
+        self.assertEqual(claim_batch(), [])
+
+    @override_settings(
+        EMAIL_BACKEND="shifts.tests.FailingEmailBackend",
+        EMAIL_MAX_ATTEMPTS=2,
+        EMAIL_RETRY_BACKOFF=60,
+    )
+    def test_failures_back_off_then_give_up(self):
+        print("\n🧪 TESTE: Falhas de envio com backoff e desistência")
+        with self.assertLogs("shifts.email", level="WARNING"), self.captureOnCommitCallbacks(
+            execute=True
+        ):
+            self.propose()
+
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.status, OutboundEmail.Status.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertIn("Conexão recusada", email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+        # Antes do vencimento nada é reivindicado; depois, falha de novo e desiste
+        self.assertEqual(claim_batch(), [])
+        later = email.next_attempt_at + timedelta(seconds=1)
+        with self.assertLogs("shifts.email", level="ERROR"):
+            dispatch_pending(mail.get_connection(), now=later)
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.Status.FAILED)
+        self.assertEqual(email.attempts, 2)
+
+    @override_settings(
+        EMAIL_WORKER_COUNT=2, EMAIL_BACKEND="shifts.tests.FlakyConnectEmailBackend"
+    )
+    def test_dispatch_emails_backs_off_when_smtp_is_down(self):
+        print("\n🧪 TESTE: dispatch_emails espera e reconecta se o SMTP cair")
+        FlakyConnectEmailBackend.opens = 0
+        with self.captureOnCommitCallbacks(execute=False):
+            self.propose()
+
+        # --once: registra a falha e sai sem exceção, sem reivindicar nada
+        err = StringIO()
+        with self.assertLogs("shifts.email", level="ERROR"):
+            call_command("dispatch_emails", once=True, stdout=StringIO(), stderr=err)
+        self.assertIn("nova tentativa", err.getvalue())
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.status, OutboundEmail.Status.PENDING)
+        self.assertEqual(email.attempts, 0)
+
+        # Contínuo: espera --interval, reconecta e entrega
+        FlakyConnectEmailBackend.opens = 0
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) > 1:
+                raise KeyboardInterrupt
+
+        # close_old_connections fecharia a conexão da transação do TestCase
+        command = "shifts.management.commands.dispatch_emails"
+        with patch(f"{command}.time.sleep", side_effect=sleep), patch(
+            f"{command}.close_old_connections"
+        ), self.assertLogs("shifts.email", level="ERROR"):
+            call_command(
+                "dispatch_emails", interval=7, stdout=StringIO(), stderr=StringIO()
+            )
+
+        self.assertEqual(sleeps[0], 7)
+        self.assertEqual(FlakyConnectEmailBackend.opens, 2)
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.Status.SENT)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class BroadcastFanoutTest(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(email="dono@difusao.com", password="x")
+        self.group = Group.objects.create(name="UTI Difusão", admin=self.owner)
+        self.group.members.add(self.owner)
+        st = ShiftType.objects.create(name="Diurno", group=self.group)
+        self.shift = Shift.objects.create(
+            group=self.group, owner=self.owner, shift_type=st,
+            start_time=timezone.now() + timedelta(days=3), duration=12,
+        )
+        self.client.force_login(self.owner)
+
+    def add_members(self, count, start=0):
+        members = User.objects.bulk_create(
+            User(email=f"membro{i}@difusao.com")
+            for i in range(start, start + count)
+        )
+        self.group.members.add(*members)
+
+    def offer(self):
+        self.client.post(reverse("switch_shift_tradable", args=[self.shift.id]))
+        Shift.objects.filter(pk=self.shift.pk).update(tradable=False)
+
+    @override_settings(EMAIL_MAX_RECIPIENTS=3)
+    def test_recipients_split_into_chunks(self):
+        print("\n🧪 TESTE: Difusão dividida em lotes de BCC, sem o dono")
+        self.add_members(7)
+        User.objects.filter(email="membro6@difusao.com").update(is_active=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.offer()
+
+        self.assertEqual([len(m.bcc) for m in mail.outbox], [3, 3])
+        self.assertEqual(
+            sorted(email for m in mail.outbox for email in m.bcc),
+            [f"membro{i}@difusao.com" for i in range(6)],
+        )
+        self.assertTrue(all(m.to == [settings.DEFAULT_FROM_EMAIL] for m in mail.outbox))
+        self.assertFalse(
+            OutboundEmail.objects.exclude(status=OutboundEmail.Status.SENT).exists()
+        )
+
+    @override_settings(EMAIL_WORKER_COUNT=2, EMAIL_MAX_RECIPIENTS=10)
+    def test_view_cost_independent_of_group_size(self):
+        print("\n🧪 TESTE: Oferta em tempo constante, expansão pelo dispatch_emails")
+        counts = []
+        for size in (2, 40):
+            self.add_members(size, start=len(counts) * 100)
+            with self.captureOnCommitCallbacks(execute=False):
+                with CaptureQueriesContext(connection) as captured:
+                    self.offer()
+            counts.append(len(captured.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+        # Uma linha por oferta; o dispatcher expande (com os 42 membros atuais)
+        # e entrega as mensagens geradas nos lotes seguintes
+        self.assertEqual(OutboundEmail.objects.count(), 2)
+        call_command("dispatch_emails", once=True, stdout=StringIO())
+
+        self.assertEqual(
+            sorted(len(m.bcc) for m in mail.outbox), [2, 2] + [10] * 8
+        )
+        self.assertFalse(
+            OutboundEmail.objects.exclude(status=OutboundEmail.Status.SENT).exists()
+        )
+
+
+class NotificationDigestTest(TestCase):
+
+    def setUp(self):
+        Delivery = User.NotificationDelivery
+        self.owner = User.objects.create_user(email="dono@resumo.com", password="x")
+        self.hourly = User.objects.create_user(
+            email="hora@resumo.com", password="x", notification_delivery=Delivery.HOURLY
+        )
+        self.daily = User.objects.create_user(
+            email="dia@resumo.com", password="x", notification_delivery=Delivery.DAILY
+        )
+        self.now = User.objects.create_user(email="agora@resumo.com", password="x")
+        self.group = Group.objects.create(name="UTI Resumo", admin=self.owner)
+        self.group.members.add(self.owner, self.hourly, self.daily, self.now)
+        self.st = ShiftType.objects.create(name="Noturno", group=self.group)
+
+    def shift(self, owner, days, **extra):
+        return Shift.objects.create(
+            group=self.group, owner=owner, shift_type=self.st,
+            start_time=timezone.now() + timedelta(days=days), duration=12, **extra,
+        )
+
+    def test_digest_users_get_one_email_per_window(self):
+        print("\n🧪 TESTE: Avisos acumulados viram um único resumo por usuário")
+        self.client.force_login(self.owner)
+        for days in (2, 3):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    reverse("switch_shift_tradable", args=[self.shift(self.owner, days).id])
+                )
+
+        # Só quem escolheu "imediato" recebeu as oportunidades na hora
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertTrue(all(m.bcc == ["agora@resumo.com"] for m in mail.outbox))
+
+        # Proposta para o plantão de quem prefere resumo: só vira aviso
+        target = self.shift(self.hourly, 4, tradable=True)
+        self.client.post(reverse("create_trade_request"), {"target_shift_id": target.id})
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(self.hourly.notification_events.count(), 3)
+
+        mail.outbox.clear()
+        call_command("send_digests", window="hourly", stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 1)
+        digest = mail.outbox[0]
+        self.assertEqual(digest.to, ["hora@resumo.com"])
+        self.assertIn("3 aviso(s)", digest.subject)
+        self.assertIn("propôs troca", digest.body)
+        self.assertIn("UTI Resumo", digest.body)
+        self.assertFalse(
+            self.hourly.notification_events.filter(sent_at__isnull=True).exists()
+        )
+        # Resumo diário fica para a sua própria janela
+        self.assertEqual(
+            self.daily.notification_events.filter(sent_at__isnull=True).count(), 2
+        )
+
+        # Nada pendente: nenhum reenvio
+        call_command("send_digests", window="hourly", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_switch_back_to_immediate_flushes_pending_events(self):
+        print("\n🧪 TESTE: Voltar para o envio imediato entrega os avisos pendentes")
+        self.client.force_login(self.owner)
+        target = self.shift(self.hourly, 4, tradable=True)
+        self.client.post(reverse("create_trade_request"), {"target_shift_id": target.id})
+        self.assertEqual(self.hourly.notification_events.count(), 1)
+
+        self.client.force_login(self.hourly)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("profile_view"),
+                {
+                    "full_name": "Hora",
+                    "role": self.hourly.role,
+                    "notification_delivery": User.NotificationDelivery.IMMEDIATE,
+                },
+            )
+
+        self.hourly.refresh_from_db()
+        self.assertEqual(self.hourly.notification_delivery, User.NotificationDelivery.IMMEDIATE)
+        self.assertEqual([m.to for m in mail.outbox], [["hora@resumo.com"]])
+        self.assertIn("1 aviso(s)", mail.outbox[0].subject)
+        self.assertFalse(
+            self.hourly.notification_events.filter(sent_at__isnull=True).exists()
+        )
+
+    def test_digest_queries_do_not_grow_with_users(self):
+        counts = []
+        for size in (2, 12):
+            members = User.objects.bulk_create(
+                User(
+                    email=f"lote{len(counts)}-{i}@resumo.com",
+                    notification_delivery=User.NotificationDelivery.DAILY,
+                )
+                for i in range(size)
+            )
+            NotificationEvent.objects.bulk_create(
+                NotificationEvent(
+                    recipient=user, group=self.group,
+                    kind=NotificationEvent.Kind.NEW_OPPORTUNITY, title="Oportunidade",
+                )
+                for user in members
+                for _ in range(3)
+            )
+            # Só a montagem: a entrega de cada resumo é do outbox
+            with CaptureQueriesContext(connection) as captured:
+                with patch("shifts.digest.deliver_now") as deliver:
+                    sent = build_digests(User.NotificationDelivery.DAILY)
+            self.assertEqual(sent, size)
+            self.assertEqual(deliver.call_count, size)
+            counts.append(len(captured.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class SMTPSinkTest(TestCase):
+
+    def setUp(self):
+        self.sink = SMTPSink()
+        host, port = self.sink.start()
+        self.addCleanup(self.sink.stop)
+        self.smtp = override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST=host,
+            EMAIL_PORT=port,
+            EMAIL_HOST_USER="",
+            EMAIL_HOST_PASSWORD="",
+            EMAIL_USE_TLS=False,
+            EMAIL_USE_SSL=False,
+        )
+        self.smtp.enable()
+        self.addCleanup(self.smtp.disable)
+
+    def test_pool_reuses_connection_against_local_smtp(self):
+        print("\n🧪 TESTE: Pool de e-mail contra o SMTP local reaproveita a conexão")
+        dispatcher = EmailDispatcher(workers=1, batch_size=5)
+        self.addCleanup(dispatcher.shutdown, 5)
+
+        for i in range(10):
+            dispatcher.submit(
+                EmailMultiAlternatives(
+                    subject=f"Aviso {i} 🔄", body="Olá", to=[f"pessoa{i}@sink.local"]
+                )
+            )
+
+        self.assertTrue(self.sink.wait_for(10, timeout=10))
+        self.assertEqual(self.sink.connections, 1)
+        self.assertEqual(
+            sorted(self.sink.arrivals()), sorted(f"pessoa{i}@sink.local" for i in range(10))
+        )
+
+
+class TradeContentionTest(TransactionTestCase):
+    """
+    Aceites concorrentes de verdade (threads, cada uma com a sua conexão e
+    transação). Exige um banco com locks entre conexões: PostgreSQL ou o
+    SQLite em arquivo/WAL configurado em settings.
+    """
+
+    def setUp(self):
+        self.admin = User.objects.create(email="chefe@disputa.com")
+        self.group = Group.objects.create(name="UTI Disputa", admin=self.admin)
+        self.st = ShiftType.objects.create(name="Noturno", group=self.group)
+        self.day = 0
+
+    def user(self, name):
+        # Sem senha: o hash de cada usuário dominaria o tempo do teste
+        user = User.objects.create(email=f"{name}@disputa.com")
+        self.group.members.add(user)
+        return user
+
+    def shift(self, owner):
+        self.day += 1
+        return Shift.objects.create(
+            group=self.group, owner=owner, shift_type=self.st,
+            start_time=timezone.now() + timedelta(days=self.day), duration=12,
+            tradable=True,
+        )
+
+    def trade(self, requester, target, offered=None):
+        trade = TradeRequest.objects.create(
+            group=self.group, requester=requester, target_shift=target,
+            offered_shift=offered,
+        )
+        return TradeRequest.objects.get(pk=trade.pk)
+
+    def race(self, calls, workers=None):
+        """Dispara as chamadas ao mesmo tempo; retorna 'ok' ou 'conflict' de cada."""
+        barrier = threading.Barrier(len(calls) if workers is None else workers)
+        results = [None] * len(calls)
+        pending = list(enumerate(calls))
+        lock = threading.Lock()
+
+        def work():
+            barrier.wait()
+            try:
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        index, call = pending.pop()
+                    try:
+                        call()
+                        results[index] = "ok"
+                    except TradeConflict:
+                        results[index] = "conflict"
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work) for _ in range(workers or len(calls))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+        return results
+
+    def test_competing_proposals_have_a_single_winner(self):
+        print("\n🧪 TESTE: Aceites simultâneos de propostas para o mesmo plantão")
+        owner = self.user("dono")
+        target = self.shift(owner)
+        requesters = [self.user(f"colega{i}") for i in range(6)]
+        offered = [self.shift(requester) for requester in requesters]
+        trades = [
+            self.trade(requester, target, shift)
+            for requester, shift in zip(requesters, offered)
+        ]
+
+        results = self.race(
+            [lambda trade=trade: accept_trade(trade, owner) for trade in trades]
+        )
+
+        self.assertEqual(results.count("ok"), 1)
+        winner = trades[results.index("ok")]
+        target.refresh_from_db()
+        self.assertEqual(target.owner_id, winner.requester_id)
+        self.assertEqual(
+            list(
+                TradeRequest.objects.filter(
+                    status=TradeRequest.Status.APPROVED
+                ).values_list("id", flat=True)
+            ),
+            [winner.id],
+        )
+        # Só a contra-oferta vencedora mudou de dono
+        for requester, shift in zip(requesters, offered):
+            shift.refresh_from_db()
+            expected = owner.pk if requester.pk == winner.requester_id else requester.pk
+            self.assertEqual(shift.owner_id, expected)
+
+    def test_same_offered_shift_is_not_given_twice(self):
+        print("\n🧪 TESTE: Mesma contra-oferta aceita por dois donos ao mesmo tempo")
+        requester = self.user("colega")
+        offered = self.shift(requester)
+        owners = [self.user(f"dono{i}") for i in range(4)]
+        targets = [self.shift(owner) for owner in owners]
+        trades = [self.trade(requester, target, offered) for target in targets]
+
+        results = self.race(
+            [
+                lambda trade=trade, owner=owner: accept_trade(trade, owner)
+                for trade, owner in zip(trades, owners)
+            ]
+        )
+
+        # Sem atualização perdida: o plantão oferecido tem um único novo dono
+        # e só o dono vencedor perdeu o seu plantão
+        self.assertEqual(results.count("ok"), 1)
+        winner = results.index("ok")
+        offered.refresh_from_db()
+        self.assertEqual(offered.owner_id, owners[winner].pk)
+        for i, (owner, target) in enumerate(zip(owners, targets)):
+            target.refresh_from_db()
+            self.assertEqual(
+                target.owner_id, requester.pk if i == winner else owner.pk
+            )
+        self.assertEqual(
+            TradeRequest.objects.filter(status=TradeRequest.Status.APPROVED).count(), 1
+        )
+
+    def test_accept_and_reject_race(self):
+        owner = self.user("dono")
+        requester = self.user("colega")
+        for _ in range(5):
+            target = self.shift(owner)
+            trade = self.trade(requester, target)
+            results = self.race(
+                [
+                    lambda: accept_trade(trade, owner),
+                    lambda: reject_trade(trade, owner),
+                ]
+            )
+            self.assertEqual(sorted(results), ["conflict", "ok"])
+
+            trade.refresh_from_db()
+            target.refresh_from_db()
+            approved = trade.status == TradeRequest.Status.APPROVED
+            self.assertEqual(target.owner_id, requester.pk if approved else owner.pk)
+
+    def test_throughput_without_lost_updates(self):
+        print("\n🧪 TESTE: Vazão de aceites independentes em paralelo")
+        pairs = []
+        for i in range(40):
+            owner, requester = self.user(f"dono{i}"), self.user(f"colega{i}")
+            target, offered = self.shift(owner), self.shift(requester)
+            trade = self.trade(requester, target, offered)
+            pairs.append((owner, requester, target, offered, trade))
+
+        start = time.perf_counter()
+        results = self.race(
+            [
+                lambda trade=trade, owner=owner: accept_trade(trade, owner)
+                for owner, _, _, _, trade in pairs
+            ],
+            workers=8,
+        )
+        elapsed = time.perf_counter() - start
+        print(f"   👉 {len(pairs)} aceites em {elapsed:.2f}s ({len(pairs) / elapsed:.0f}/s)")
+
+        self.assertEqual(results, ["ok"] * len(pairs))
+        for owner, requester, target, offered, _ in pairs:
+            target.refresh_from_db()
+            offered.refresh_from_db()
+            self.assertEqual((target.owner_id, offered.owner_id), (requester.pk, owner.pk))
+
+
+class SwapCandidatesTest(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(email="dono@match.com", password="x")
+        self.requester = User.objects.create_user(email="pede@match.com", password="x")
+        self.peer = User.objects.create_user(email="colega@match.com", password="x")
+        self.group = Group.objects.create(name="UTI Match", admin=self.owner)
+        self.group.members.add(self.owner, self.requester, self.peer)
+        self.night = ShiftType.objects.create(name="Noturno", group=self.group)
+        self.day_type = ShiftType.objects.create(name="Diurno", group=self.group)
+        self.base = timezone.localtime().replace(
+            hour=19, minute=0, second=0, microsecond=0
+        ) + timedelta(days=5)
+        self.target = self.shift(self.owner, 0, tradable=True)
+
+    def shift(self, owner, days, hours=0, duration=12, shift_type=None, tradable=False):
+        return Shift.objects.create(
+            group=self.group, owner=owner, shift_type=shift_type or self.night,
+            start_time=self.base + timedelta(days=days, hours=hours),
+            duration=duration, tradable=tradable,
+        )
+
+    def test_ranked_and_free_of_overlaps(self):
+        print("\n🧪 TESTE: Contra-ofertas ordenadas e sem sobreposição para os dois lados")
+        different = self.shift(self.requester, 4, hours=-12, duration=6, shift_type=self.day_type)
+        far = self.shift(self.requester, 6)
+        near = self.shift(self.requester, 3)
+        # O dono já trabalha nesse horário: a troca o deixaria com dois plantões
+        clash = self.shift(self.requester, -2)
+        self.shift(self.owner, -2, hours=6)
+
+        # Pool do solicitante + agenda dos dois donos, sem carregar o grupo
+        with self.assertNumQueries(2):
+            index = SwapIndex.for_target(self.target, self.requester.pk)
+        with self.assertNumQueries(0):
+            ids = [slot.id for slot in index.candidates()]
+
+        self.assertEqual(ids, [near.id, far.id, different.id])
+        self.assertNotIn(clash.id, ids)
+
+    def test_requester_shift_overlapping_target_is_the_only_option(self):
+        overlapping = self.shift(self.requester, 0, hours=6, duration=6)
+        self.shift(self.requester, 3)
+
+        self.assertEqual(
+            [slot.id for slot in swap_candidates(self.target, self.requester)],
+            [overlapping.id],
+        )
+
+    def test_overlap_in_another_group_is_not_suggested(self):
+        print("\n🧪 TESTE: Sugestão respeita a agenda do solicitante em outros grupos")
+        near = self.shift(self.requester, 3)
+        self.shift(self.requester, 6)
+        # O solicitante já trabalha no horário do alvo, mas em outro hospital
+        other = Group.objects.create(name="Outro Hospital", admin=self.requester)
+        other.members.add(self.requester)
+        Shift.objects.create(
+            group=other, owner=self.requester,
+            shift_type=ShiftType.objects.create(name="Geral", group=other),
+            start_time=self.base + timedelta(hours=2), duration=6,
+        )
+
+        self.assertEqual(swap_candidates(self.target, self.requester), [])
+
+        # E o dono do alvo, no outro grupo, no horário de um dos candidatos
+        Shift.objects.filter(group=other).update(
+            start_time=self.base + timedelta(days=20),
+            end_time=self.base + timedelta(days=20, hours=6),
+        )
+        other.members.add(self.owner)
+        Shift.objects.create(
+            group=other, owner=self.owner, shift_type=ShiftType.objects.get(group=other),
+            start_time=self.base + timedelta(days=6, hours=1), duration=6,
+        )
+        self.assertEqual(
+            [slot.id for slot in swap_candidates(self.target, self.requester)], [near.id]
+        )
+
+    @override_settings(SWAP_MATCH_WINDOW_DAYS=3)
+    def test_owner_sees_equivalent_offers_from_peers(self):
+        offered = self.shift(self.peer, 2, tradable=True)
+        self.shift(self.peer, 1)  # não ofertado
+        self.shift(self.peer, 5, tradable=True)  # fora da janela
+        self.shift(self.peer, 3, duration=6, tradable=True)  # duração diferente
+
+        self.assertEqual(
+            [slot.id for slot in swap_candidates(self.target, self.owner)], [offered.id]
+        )
+
+    def test_endpoint_json_htmx_and_membership(self):
+        near = self.shift(self.requester, 3)
+        url = reverse("swap_candidates", args=[self.target.id])
+
+        self.client.force_login(self.requester)
+        data = self.client.get(url).json()
+        self.assertEqual([c["id"] for c in data["candidates"]], [near.id])
+
+        response = self.client.get(url, HTTP_HX_REQUEST="true")
+        self.assertContains(response, f'value="{near.id}"')
+
+        outsider = User.objects.create_user(email="fora@match.com", password="x")
+        self.client.force_login(outsider)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class TradeCycleTest(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create(email="chefe@ciclo.com")
+        self.group = Group.objects.create(name="UTI Ciclo", admin=self.admin)
+        st = ShiftType.objects.create(name="Noturno", group=self.group)
+        self.users = [User.objects.create(email=f"p{i}@ciclo.com") for i in range(4)]
+        self.group.members.add(*self.users)
+        self.shifts = [
+            Shift.objects.create(
+                group=self.group, owner=user, shift_type=st,
+                start_time=timezone.now() + timedelta(days=i + 1), duration=12,
+                tradable=True,
+            )
+            for i, user in enumerate(self.users)
+        ]
+
+    def propose(self, who, offered, target):
+        return TradeRequest.objects.create(
+            group=self.group, requester=self.users[who],
+            offered_shift=self.shifts[offered], target_shift=self.shifts[target],
+        )
+
+    def test_graph_finds_disjoint_cycles(self):
+        graph = TradeGraph(
+            [
+                (1, "a", "b"), (2, "b", "c"), (3, "c", "a"),  # ciclo de 3
+                (4, "x", "y"), (5, "y", "x"),  # só 2: fica para o aceite simples
+                (6, "c", "d"), (7, "d", "a"),  # reaproveitaria "a" e "c"
+                (8, "m", "n"),
+            ]
+        )
+        self.assertEqual(graph.find_cycles(min_length=3), [[1, 2, 3]])
+        self.assertEqual(
+            sorted(graph.find_cycles(min_length=2)), [[1, 2, 3], [4, 5]]
+        )
+
+    def test_three_way_swap_is_executed_atomically(self):
+        print("\n🧪 TESTE: Troca circular entre três pessoas")
+        cycle = [
+            self.propose(0, 0, 1).id,
+            self.propose(1, 1, 2).id,
+            self.propose(2, 2, 0).id,
+        ]
+        # Concorrente para um plantão do ciclo: será recusada
+        sibling = self.propose(3, 3, 1)
+
+        self.assertEqual(find_trade_cycles(self.group), [cycle])
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("resolve_trade_cycles", stdout=StringIO())
+
+        owners = [
+            Shift.objects.values_list("owner_id", flat=True).get(pk=shift.pk)
+            for shift in self.shifts[:3]
+        ]
+        self.assertEqual(owners, [self.users[2].pk, self.users[0].pk, self.users[1].pk])
+        self.assertEqual(
+            set(
+                TradeRequest.objects.filter(id__in=cycle).values_list("status", flat=True)
+            ),
+            {TradeRequest.Status.APPROVED},
+        )
+        sibling.refresh_from_db()
+        self.assertEqual(sibling.status, TradeRequest.Status.REJECTED)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_stale_cycle_changes_nothing(self):
+        cycle = [
+            self.propose(0, 0, 1).id,
+            self.propose(1, 1, 2).id,
+            self.propose(2, 2, 0).id,
+        ]
+        # Depois da busca, um dos plantões troca de dono por outro caminho
+        Shift.objects.filter(pk=self.shifts[2].pk).update(owner=self.users[3])
+
+        with self.assertRaises(TradeConflict):
+            execute_cycle(cycle)
+        self.assertFalse(
+            TradeRequest.objects.exclude(status=TradeRequest.Status.PENDING).exists()
+        )
+        self.assertEqual(
+            Shift.objects.values_list("owner_id", flat=True).get(pk=self.shifts[0].pk),
+            self.users[0].pk,
+        )
+
+
+class ShiftOverlapTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email="dono@sobreposicao.com")
+        self.peer = User.objects.create(email="colega@sobreposicao.com")
+        self.group = Group.objects.create(name="UTI Agenda", admin=self.user)
+        self.group.members.add(self.user, self.peer)
+        self.st = ShiftType.objects.create(name="Diurno", group=self.group)
+        self.start = (timezone.now() + timedelta(days=3)).replace(
+            minute=0, second=0, microsecond=0
+        )
+        self.shift = self.make(self.user, self.start)
+
+    def make(self, owner, start, duration=12):
+        return Shift.objects.create(
+            group=self.group, owner=owner, shift_type=self.st,
+            start_time=start, duration=duration,
+        )
+
+    def form(self, start, duration=12, **kwargs):
+        return ShiftForm(
+            {
+                "shift_type": self.st.pk,
+                "start_time": timezone.localtime(start).strftime("%Y-%m-%dT%H:%M"),
+                "duration": duration,
+            },
+            group=self.group,
+            **kwargs,
+        )
+
+    def test_index_bisect(self):
+        index = IntervalIndex(
+            [
+                (1, self.start, self.start + timedelta(hours=24), 10),
+                (1, self.start + timedelta(days=2), self.start + timedelta(days=2, hours=6), 11),
+                (2, self.start, self.start + timedelta(hours=6), 20),
+            ]
+        )
+        # Começa depois do plantão de 24h, mas ainda dentro dele
+        probe = self.start + timedelta(hours=20)
+        self.assertEqual(
+            [i.id for i in index.overlapping(1, probe, probe + timedelta(hours=6))], [10]
+        )
+        # Fim exclusivo: encostar no fim não é sobreposição
+        end = self.start + timedelta(hours=24)
+        self.assertEqual(index.overlapping(1, end, end + timedelta(hours=6)), [])
+        self.assertEqual(index.overlapping(1, probe, end, ignore={10}), [])
+        self.assertEqual(index.get(20).end, self.start + timedelta(hours=6))
+        self.assertIsNone(index.get(99))
+
+    def test_form_rejects_overlap_for_owner_only(self):
+        print("\n🧪 TESTE: Formulário bloqueia plantão sobreposto")
+        form = self.form(self.start + timedelta(hours=6), owner=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()["__all__"][0].code, "overlap")
+
+        self.assertTrue(self.form(self.start + timedelta(hours=6), owner=self.peer).is_valid())
+        self.assertTrue(self.form(self.start + timedelta(hours=12), owner=self.user).is_valid())
+
+        # Edição não conflita com o próprio plantão
+        edit = ShiftForm(
+            {
+                "shift_type": self.st.pk,
+                "start_time": timezone.localtime(self.start + timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M"),
+                "duration": 12,
+            },
+            instance=self.shift,
+            group=self.group,
+        )
+        self.assertTrue(edit.is_valid())
+
+    def test_dashboard_does_not_create_overlap(self):
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse("dashboard"),
+            {
+                "shift_type": self.st.pk,
+                "start_time": timezone.localtime(self.start + timedelta(hours=3)).strftime("%Y-%m-%dT%H:%M"),
+                "duration": 6,
+            },
+        )
+        self.assertEqual(Shift.objects.filter(owner=self.user).count(), 1)
+
+    def test_bulk_create_checks_batch_with_one_query(self):
+        print("\n🧪 TESTE: Importação em lote valida sobreposição em memória")
+        later = self.start + timedelta(days=1)
+        batch = [
+            Shift(group=self.group, owner=self.peer, shift_type=self.st,
+                  start_time=later, duration=12),
+            # Sobrepõe o anterior do mesmo lote
+            Shift(group=self.group, owner=self.peer, shift_type=self.st,
+                  start_time=later + timedelta(hours=6), duration=6),
+            # Sobrepõe o plantão já salvo
+            Shift(group=self.group, owner=self.user, shift_type=self.st,
+                  start_time=self.start - timedelta(hours=6), duration=12),
+        ]
+        with self.assertNumQueries(1):
+            with self.assertRaises(ValidationError) as ctx:
+                bulk_create_shifts(batch)
+        self.assertEqual(len(ctx.exception.error_list), 2)
+
+        created = bulk_create_shifts(batch[:1])
+        self.assertEqual(len(created), 1)
+        self.assertEqual(list(find_overlaps()), [])
+
+    def test_find_overlaps_reports_existing_rows(self):
+        other = self.make(self.user, self.start + timedelta(hours=6), duration=6)
+        self.assertEqual(list(find_overlaps()), [(other.pk, self.shift.pk)])
+        out = StringIO()
+        call_command("find_shift_overlaps", stdout=out)
+        self.assertIn("1 sobreposição", out.getvalue())
+
+    def test_find_overlaps_for_group_reads_other_groups(self):
+        other_group = Group.objects.create(name="Outro Hospital", admin=self.user)
+        elsewhere = Shift.objects.create(
+            group=other_group, owner=self.user,
+            shift_type=ShiftType.objects.create(name="Geral", group=other_group),
+            start_time=self.start + timedelta(hours=6), duration=6,
+        )
+        self.assertEqual(
+            list(find_overlaps(group_id=self.group.pk)), [(elsewhere.pk, self.shift.pk)]
+        )
+        out = StringIO()
+        call_command("find_shift_overlaps", group=self.group.pk, stdout=out)
+        self.assertIn("1 sobreposição", out.getvalue())
+
+        # Grupo sem plantão envolvido no conflito
+        third = Group.objects.create(name="Terceiro", admin=self.peer)
+        self.assertEqual(list(find_overlaps(group_id=third.pk)), [])
+
+    def test_trade_that_double_books_is_rejected(self):
+        print("\n🧪 TESTE: Aceite de troca não cria sobreposição")
+        # O colega já trabalha no mesmo horário do plantão que quer receber
+        self.make(self.peer, self.start + timedelta(hours=2), duration=6)
+        offered = self.make(self.peer, self.start + timedelta(days=5))
+        trade = TradeRequest.objects.create(
+            group=self.group, requester=self.peer,
+            target_shift=self.shift, offered_shift=offered,
+        )
+        with self.assertRaises(TradeConflict):
+            accept_trade(trade, self.user)
+
+        trade.refresh_from_db()
+        self.assertEqual(trade.status, TradeRequest.Status.PENDING)
+        self.assertEqual(
+            Shift.objects.values_list("owner_id", flat=True).get(pk=self.shift.pk),
+            self.user.pk,
+        )
+
+    def test_direct_swap_of_overlapping_shifts_is_allowed(self):
+        # Trocar um pelo outro: cada um sai da agenda de quem o entrega
+        offered = self.make(self.peer, self.start + timedelta(hours=6))
+        trade = TradeRequest.objects.create(
+            group=self.group, requester=self.peer,
+            target_shift=self.shift, offered_shift=offered,
+        )
+        accept_trade(trade, self.user)
+        offered.refresh_from_db()
+        self.assertEqual(offered.owner_id, self.user.pk)
+
+
+@override_settings(MARKETPLACE_PAGE_SIZE=4)
+class MarketplaceTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="mural@hospital.com")
+        self.peer = User.objects.create(email="colega@mural.com")
+        self.group = Group.objects.create(name="UTI Mural", admin=self.user)
+        self.group.members.add(self.user, self.peer)
+        self.day = ShiftType.objects.create(name="Diurno", group=self.group)
+        self.night = ShiftType.objects.create(name="Noturno", group=self.group)
+        self.base = timezone.make_aware(
+            datetime.combine(timezone.localdate() + timedelta(days=2), datetime.min.time())
+        )
+
+        def shift(day, hour=7, shift_type=None, **kwargs):
+            return Shift(
+                group=self.group, owner=self.peer, shift_type=shift_type or self.day,
+                start_time=self.base + timedelta(days=day, hours=hour),
+                end_time=self.base + timedelta(days=day, hours=hour + 6),
+                duration=6, **{"tradable": True, **kwargs},
+            )
+
+        self.offers = Shift.objects.bulk_create(
+            [shift(d) for d in range(5)]
+            + [shift(d, hour=19, shift_type=self.night) for d in range(5)]
+        )
+        other = Group.objects.create(name="Outro", admin=self.peer)
+        Shift.objects.bulk_create(
+            [
+                shift(0, hour=13, tradable=False),
+                shift(1, hour=13, is_active=False),
+                Shift(
+                    group=self.group, owner=self.peer, shift_type=self.day,
+                    start_time=timezone.now() - timedelta(days=1),
+                    end_time=timezone.now() - timedelta(hours=18),
+                    duration=6, tradable=True,
+                ),
+                Shift(
+                    group=other, owner=self.peer, shift_type=self.day,
+                    start_time=self.base, end_time=self.base + timedelta(hours=6),
+                    duration=6, tradable=True,
+                ),
+            ]
+        )
+        self.client.force_login(self.user)
+
+    def listed(self, response):
+        return [s.id for day in response.context["agenda_days"] for s in day["shifts"]]
+
+    def test_keyset_pages_cover_open_offers(self):
+        print("\n🧪 TESTE: Mural de trocas paginado por keyset")
+        url = reverse("marketplace")
+        response = self.client.get(url, {"group_id": self.group.id})
+        self.assertTemplateUsed(response, "shifts/marketplace.html")
+        self.assertContains(response, "10 ofertas abertas")
+
+        seen = self.listed(response)
+        next_query = response.context["marketplace_next_query"]
+        while next_query:
+            response = self.client.get(f"{url}?{next_query}", HTTP_HX_REQUEST="true")
+            self.assertTemplateNotUsed(response, "shifts/marketplace.html")
+            seen += self.listed(response)
+            next_query = response.context["marketplace_next_query"]
+
+        expected = sorted(self.offers, key=lambda s: (s.start_time, s.id))
+        self.assertEqual(seen, [s.id for s in expected])
+
+    def test_filters_by_period_and_type(self):
+        day = (self.base + timedelta(days=1)).date()
+        response = self.client.get(
+            reverse("marketplace"),
+            {
+                "group_id": self.group.id,
+                "date_from": day.isoformat(),
+                "date_to": (day + timedelta(days=1)).isoformat(),
+                "filter_type": self.night.id,
+            },
+            HTTP_HX_REQUEST="true",
+        )
+        self.assertEqual(
+            self.listed(response),
+            [s.id for s in self.offers if s.shift_type == self.night][1:3],
+        )
+
+    def test_extreme_dates_leave_the_period_open(self):
+        print("\n🧪 TESTE: Datas no limite do calendário não derrubam o mural")
+        unfiltered = self.client.get(
+            reverse("marketplace"), {"group_id": self.group.id}, HTTP_HX_REQUEST="true"
+        )
+        response = self.client.get(
+            reverse("marketplace"),
+            {"group_id": self.group.id, "date_to": "9999-12-31"},
+            HTTP_HX_REQUEST="true",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.listed(response), self.listed(unfiltered))
+
+        response = self.client.get(
+            reverse("marketplace"),
+            {"group_id": self.group.id, "date_from": "9999-12-31"},
+            HTTP_HX_REQUEST="true",
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_open_offers_counter_is_cached_and_invalidated(self):
+        print("\n🧪 TESTE: Contador de ofertas abertas em cache")
+        self.assertEqual(open_offers_count(self.group.id), 10)
+        with self.assertNumQueries(0):
+            self.assertEqual(open_offers_count(self.group.id), 10)
+
+        shift = self.offers[0]
+        shift.tradable = False
+        shift.save()
+        self.assertEqual(open_offers_count(self.group.id), 9)
+
+        response = self.client.get(reverse("dashboard"), {"group_id": self.group.id})
+        self.assertEqual(response.context["open_offers"], 9)
+
+    def test_page_query_uses_partial_index(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("marketplace"), {"group_id": self.group.id}, HTTP_HX_REQUEST="true")
+        sql = next(
+            q["sql"] for q in ctx.captured_queries
+            if q["sql"].startswith("SELECT") and '"shifts_shift"."tradable"' in q["sql"]
+        )
+        prefix = "EXPLAIN QUERY PLAN" if connection.vendor == "sqlite" else "EXPLAIN"
+        with connection.cursor() as cursor:
+            cursor.execute(f"{prefix} {sql}")
+            plan = " ".join(" ".join(map(str, row)) for row in cursor.fetchall())
+        self.assertIn("shift_group_tradable_idx", plan)
+
+    def test_non_member_is_redirected(self):
+        outsider = User.objects.create(email="fora@mural.com")
+        self.client.force_login(outsider)
+        response = self.client.get(reverse("marketplace"), {"group_id": self.group.id})
+        self.assertRedirects(response, reverse("dashboard"), fetch_redirect_response=False)
+
+
+class BulkTradeActionTest(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create(email="dono@lote.com")
+        self.ana = User.objects.create(email="ana@lote.com", full_name="Ana")
+        self.bia = User.objects.create(email="bia@lote.com")
+        self.group = Group.objects.create(name="UTI Lote", admin=self.owner)
+        self.group.members.add(self.owner, self.ana, self.bia)
+        self.st = ShiftType.objects.create(name="Diurno", group=self.group)
+        self.day = (timezone.now() + timedelta(days=1)).replace(
+            minute=0, second=0, microsecond=0
+        )
+        self.mine = [self.make(self.owner, d) for d in range(3)]
+
+    def make(self, owner, day, hour=0):
+        return Shift.objects.create(
+            group=self.group, owner=owner, shift_type=self.st,
+            start_time=self.day + timedelta(days=day, hours=hour),
+            duration=6, tradable=True,
+        )
+
+    def propose(self, requester, target, offered=None):
+        return TradeRequest.objects.create(
+            group=self.group, requester=requester,
+            target_shift=target, offered_shift=offered,
+        )
+
+    def owner_of(self, shift):
+        return Shift.objects.values_list("owner_id", flat=True).get(pk=shift.pk)
+
+    def test_bulk_accept_with_one_email_per_requester(self):
+        print("\n🧪 TESTE: Aceite em lote com um e-mail por solicitante")
+        ana_offers = [self.make(self.ana, d, hour=12) for d in (10, 11)]
+        trades = [
+            self.propose(self.ana, self.mine[0], ana_offers[0]),
+            self.propose(self.ana, self.mine[1], ana_offers[1]),
+            self.propose(self.ana, self.mine[2]),  # doação
+            # Mesmo plantão de uma proposta mais antiga: fica de fora, recusada
+            self.propose(self.bia, self.mine[0]),
+        ]
+
+        self.client.force_login(self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("bulk_accept_trade_requests"),
+                {"trade_ids": [t.id for t in trades]},
+            )
+        self.assertEqual(response.status_code, 302)
+
+        statuses = list(
+            TradeRequest.objects.filter(id__in=[t.id for t in trades])
+            .order_by("id")
+            .values_list("status", flat=True)
+        )
+        self.assertEqual(statuses, [TradeRequest.Status.APPROVED] * 3 + [TradeRequest.Status.REJECTED])
+        self.assertEqual([self.owner_of(s) for s in self.mine], [self.ana.pk] * 3)
+        self.assertEqual([self.owner_of(s) for s in ana_offers], [self.owner.pk] * 2)
+        self.assertFalse(Shift.objects.filter(pk=self.mine[0].pk, tradable=True).exists())
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.ana.email])
+        self.assertIn("3 confirmada(s)", mail.outbox[0].subject)
+
+    def test_loser_of_an_offered_shift_is_rejected(self):
+        print("\n🧪 TESTE: Proposta que perde o plantão oferecido é recusada")
+        offer = self.make(self.ana, 10, hour=12)
+        foreign = self.make(self.bia, 5)
+        trades = [
+            self.propose(self.ana, self.mine[0], offer),
+            # Mesmo plantão oferecido: vai para o dono com a primeira
+            self.propose(self.ana, self.mine[1], offer),
+            self.propose(self.bia, foreign),  # plantão de outra pessoa
+        ]
+
+        self.client.force_login(self.owner)
+        response = self.client.post(
+            reverse("bulk_accept_trade_requests"),
+            {"trade_ids": [t.id for t in trades]},
+            follow=True,
+        )
+        self.assertContains(response, "2 proposta(s) não puderam ser aceitas")
+
+        statuses = list(
+            TradeRequest.objects.filter(id__in=[t.id for t in trades])
+            .order_by("id")
+            .values_list("status", flat=True)
+        )
+        self.assertEqual(
+            statuses,
+            [
+                TradeRequest.Status.APPROVED,
+                TradeRequest.Status.REJECTED,
+                TradeRequest.Status.PENDING,
+            ],
+        )
+        self.assertEqual(self.owner_of(self.mine[1]), self.owner.pk)
+        self.assertEqual(self.owner_of(offer), self.owner.pk)
+
+    def test_bulk_accept_updates_are_set_based(self):
+        few = [self.propose(self.ana, self.mine[0])]
+        many = [self.propose(self.bia, shift) for shift in self.mine[1:]]
+        with CaptureQueriesContext(connection) as one:
+            bulk_accept_trades([t.id for t in few], self.owner)
+        with CaptureQueriesContext(connection) as two:
+            bulk_accept_trades([t.id for t in many], self.owner)
+        self.assertEqual(len(one.captured_queries), len(two.captured_queries))
+
+    def test_overlap_rolls_back_the_whole_batch(self):
+        # Bia já trabalha no horário do segundo plantão
+        self.make(self.bia, 1, hour=2)
+        trades = [self.propose(self.bia, self.mine[0]), self.propose(self.bia, self.mine[1])]
+        with self.assertRaises(TradeConflict):
+            bulk_accept_trades([t.id for t in trades], self.owner)
+        self.assertEqual(self.owner_of(self.mine[0]), self.owner.pk)
+        self.assertFalse(
+            TradeRequest.objects.exclude(status=TradeRequest.Status.PENDING).exists()
+        )
+
+    def test_bulk_reject_only_touches_own_pending(self):
+        print("\n🧪 TESTE: Recusa em lote com um único UPDATE")
+        foreign = self.make(self.bia, 5)
+        trades = [
+            self.propose(self.ana, self.mine[0]),
+            self.propose(self.ana, self.mine[1]),
+            self.propose(self.bia, self.mine[2]),
+            self.propose(self.ana, foreign),  # plantão de outra pessoa
+        ]
+        rejected = bulk_reject_trades([t.id for t in trades], self.owner)
+        self.assertEqual([t.id for t in rejected], [t.id for t in trades[:3]])
+        self.assertEqual(
+            TradeRequest.objects.get(pk=trades[3].pk).status, TradeRequest.Status.PENDING
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            send_trade_notifications(rejected)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [self.ana.email, self.bia.email])
+        self.assertIn("2 recusada(s)", next(m.subject for m in mail.outbox if m.to == [self.ana.email]))
@@ -0,0 +1,349 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from shifts.loadgen import seed_load
+from shifts.models import Shift, TradeRequest
+from shifts.testing import TestCase
+
+User = get_user_model()
+
+
+# (membros, dias): o segundo cenário tem ~8x mais plantões, trocas e membros
+SIZES = ((3, 10), (8, 80))
+
+
+class QueryCountScalingTest(TestCase):
+    """
+    Cada view de shifts/urls.py e useraccount/urls.py deve executar o mesmo
+    número de queries, independente do tamanho do grupo. Se um template
+    passar a acessar uma relação por item (N+1), a contagem cresce com os
+    dados e o teste falha.
+    """
+
+    def scenario(self, members, days):
+        """
+        Grupo novo com carga sintética. O usuário logado é o admin do grupo,
+        com propostas pendentes (com contra-oferta) para todos os seus
+        plantões futuros, exceto o primeiro, que fica livre (não ofertado).
+        """
+        cache.clear()
+        data = seed_load(
+            groups=1, members=members, days=days, tradable_ratio=0.3, seed=members
+        )
+        group = data["groups"][0]
+        user, peer = data["users"][0], data["users"][1]
+        now = timezone.now()
+
+        own_future = list(
+            Shift.objects.filter(group=group, owner=user, start_time__gt=now)
+        )
+        peer_future = list(
+            Shift.objects.filter(group=group, owner=peer, start_time__gt=now)
+        )
+        Shift.objects.filter(id__in=[s.id for s in own_future[1:]]).update(
+            tradable=True
+        )
+        Shift.objects.filter(id=own_future[0].id).update(tradable=False)
+        pending = TradeRequest.objects.bulk_create(
+            [
+                TradeRequest(
+                    group=group,
+                    requester=peer,
+                    target_shift=shift,
+                    offered_shift=peer_future[i % len(peer_future)],
+                )
+                for i, shift in enumerate(own_future[1:])
+            ]
+        )
+
+        client = Client()
+        client.force_login(user)
+        session = client.session
+        session["active_group_id"] = group.id
+        session.save()
+
+        return {
+            "client": client,
+            "group": group,
+            "user": user,
+            "peer": peer,
+            "own_future": own_future,
+            "peer_future": peer_future,
+            "pending": pending,
+        }
+
+    def assertConstantQueries(self, label, request, ignore=None):
+        counts = []
+        for members, days in SIZES:
+            ctx = self.scenario(members, days)
+            with CaptureQueriesContext(connection) as captured:
+                response = request(ctx)
+            self.assertLess(response.status_code, 400, label)
+            counts.append(
+                sum(
+                    1
+                    for query in captured.captured_queries
+                    if not (ignore and ignore(query["sql"]))
+                )
+            )
+
+        print(f"   👉 {label}: {counts}")
+        self.assertEqual(
+            len(set(counts)),
+            1,
+            f"{label}: queries crescem com o volume de dados {counts}",
+        )
+
+    # -------------------------------------------------------------------------
+    # Dashboard e calendário
+    # -------------------------------------------------------------------------
+
+    def test_dashboard_modes(self):
+        print("\n🧪 TESTE: Dashboard com número constante de queries em todos os modos")
+        today = timezone.localdate()
+        month = {"year": today.year, "month": today.month}
+
+        modes = {
+            "monthly_grid": {},
+            "filter_type": {"filter_type": "__type__"},
+            "user_extract:month": {"filter_user": "__user__", "view_mode": today.month},
+            "user_extract:all": {"filter_user": "__user__", "view_mode": "all"},
+            "annual_calendar": {"display": "annual"},
+        }
+
+        for label, extra in modes.items():
+
+            def request(ctx, extra=extra):
+                params = {**month, "group_id": ctx["group"].id, **extra}
+                if "filter_type" in params:
+                    params["filter_type"] = ctx["own_future"][0].shift_type_id
+                if "filter_user" in params:
+                    params["filter_user"] = ctx["user"].id
+                return ctx["client"].get(reverse("dashboard"), params)
+
+            self.assertConstantQueries(f"dashboard:{label}", request)
+
+        self.assertConstantQueries(
+            "home", lambda ctx: ctx["client"].get(reverse("home"))
+        )
+
+    def test_calendar_fragment(self):
+        print("\n🧪 TESTE: Fragmento do calendário com número constante de queries")
+        self.assertConstantQueries(
+            "calendar_fragment",
+            lambda ctx: ctx["client"].get(
+                reverse("calendar_fragment"),
+                {"group_id": ctx["group"].id},
+                HTTP_HX_REQUEST="true",
+            ),
+        )
+
+    @override_settings(EXTRACT_PAGE_SIZE=3)
+    def test_extract_page(self):
+        print("\n🧪 TESTE: Página do extrato com número constante de queries")
+
+        def second_page(ctx):
+            params = {
+                "group_id": ctx["group"].id,
+                "year": timezone.localdate().year,
+                "filter_user": ctx["user"].id,
+                "view_mode": "all",
+            }
+            first = ctx["client"].get(reverse("dashboard"), params)
+            return ctx["client"].get(
+                f"{reverse('extract_page')}?{first.context['extract_next_query']}",
+                HTTP_HX_REQUEST="true",
+            )
+
+        self.assertConstantQueries("extract_page", second_page)
+
+    # -------------------------------------------------------------------------
+    # Grupos
+    # -------------------------------------------------------------------------
+
+    def test_group_views(self):
+        print("\n🧪 TESTE: Views de grupo com número constante de queries")
+        self.assertConstantQueries(
+            "create_group",
+            lambda ctx: ctx["client"].post(
+                reverse("create_group"), {"name": "Novo Hospital"}
+            ),
+        )
+        self.assertConstantQueries(
+            "reset_invite",
+            lambda ctx: ctx["client"].post(reverse("reset_invite", args=[ctx["group"].id])),
+        )
+
+        def join(ctx, via_form=False):
+            outsider = User.objects.create_user(
+                email=f"novo{ctx['group'].id}@hospital.com", password="x"
+            )
+            ctx["client"].force_login(outsider)
+            if via_form:
+                return ctx["client"].post(
+                    reverse("join_via_form"), {"invite_token": ctx["group"].invite_token}
+                )
+            return ctx["client"].get(
+                reverse("join_via_link", args=[ctx["group"].invite_token])
+            )
+
+        self.assertConstantQueries("join_via_link", join)
+        self.assertConstantQueries("join_via_form", lambda ctx: join(ctx, via_form=True))
+
+    # -------------------------------------------------------------------------
+    # Plantões e tipos
+    # -------------------------------------------------------------------------
+
+    def test_shift_views(self):
+        print("\n🧪 TESTE: CRUD de plantões e tipos com número constante de queries")
+        self.assertConstantQueries(
+            "edit_shift:get",
+            lambda ctx: ctx["client"].get(
+                reverse("edit_shift", args=[ctx["own_future"][0].id])
+            ),
+        )
+
+        def edit(ctx):
+            shift = ctx["own_future"][0]
+            return ctx["client"].post(
+                reverse("edit_shift", args=[shift.id]),
+                {
+                    "shift_type": shift.shift_type_id,
+                    "start_time": timezone.localtime(shift.start_time).strftime(
+                        "%Y-%m-%dT%H:%M"
+                    ),
+                    "duration": shift.duration,
+                },
+            )
+
+        self.assertConstantQueries("edit_shift:post", edit)
+        # Com workers, a difusão é expandida fora da requisição
+        with override_settings(EMAIL_WORKER_COUNT=2):
+            self.assertConstantQueries(
+                "switch_shift_tradable",
+                lambda ctx: ctx["client"].post(
+                    reverse("switch_shift_tradable", args=[ctx["own_future"][0].id])
+                ),
+            )
+        self.assertConstantQueries(
+            "manage_shift_types:get",
+            lambda ctx: ctx["client"].get(reverse("manage_shift_types")),
+        )
+        self.assertConstantQueries(
+            "manage_shift_types:post",
+            lambda ctx: ctx["client"].post(
+                reverse("manage_shift_types"),
+                {"name": "Sobreaviso", "color": "#123456", "is_active": "on"},
+            ),
+        )
+
+    # -------------------------------------------------------------------------
+    # Trocas
+    # -------------------------------------------------------------------------
+
+    def test_trade_views(self):
+        print("\n🧪 TESTE: Fluxo de troca com número constante de queries")
+
+        def propose(ctx):
+            target = Shift.objects.filter(
+                group=ctx["group"], start_time__gt=timezone.now()
+            ).exclude(owner=ctx["user"]).first()
+            Shift.objects.filter(pk=target.pk).update(tradable=True)
+            return ctx["client"].post(
+                reverse("create_trade_request"),
+                {
+                    "target_shift_id": target.id,
+                    "offered_shift_id": ctx["own_future"][0].id,
+                },
+            )
+
+        self.assertConstantQueries("create_trade_request", propose)
+        self.assertConstantQueries(
+            "accept_trade_request",
+            lambda ctx: ctx["client"].post(
+                reverse("accept_trade_request", args=[ctx["pending"][0].id])
+            ),
+        )
+        self.assertConstantQueries(
+            "reject_trade_request",
+            lambda ctx: ctx["client"].post(
+                reverse("reject_trade_request", args=[ctx["pending"][0].id])
+            ),
+        )
+        for view in ("bulk_accept_trade_requests", "bulk_reject_trade_requests"):
+            self.assertConstantQueries(
+                view,
+                lambda ctx, view=view: ctx["client"].post(
+                    reverse(view), {"trade_ids": [t.id for t in ctx["pending"]]}
+                ),
+            )
+        for label, headers in (("json", {}), ("htmx", {"HTTP_HX_REQUEST": "true"})):
+            self.assertConstantQueries(
+                f"swap_candidates:{label}",
+                lambda ctx, headers=headers: ctx["client"].get(
+                    reverse("swap_candidates", args=[ctx["peer_future"][0].id]),
+                    **headers,
+                ),
+            )
+
+    @override_settings(MARKETPLACE_PAGE_SIZE=3)
+    def test_marketplace(self):
+        print("\n🧪 TESTE: Mural de trocas com número constante de queries")
+
+        def next_page(ctx):
+            first = ctx["client"].get(reverse("marketplace"))
+            return ctx["client"].get(
+                f"{reverse('marketplace')}?{first.context['marketplace_next_query']}",
+                HTTP_HX_REQUEST="true",
+            )
+
+        self.assertConstantQueries(
+            "marketplace", lambda ctx: ctx["client"].get(reverse("marketplace"))
+        )
+        self.assertConstantQueries("marketplace:next_page", next_page)
+
+    def test_delete_views(self):
+        print("\n🧪 TESTE: Exclusões com número constante de queries")
+
+        def delete_shift(ctx):
+            # Mesmo formato de relações nos dois tamanhos: o plantão é alvo de
+            # uma proposta e contra-oferta em outra
+            shift = ctx["own_future"][-1]
+            TradeRequest.objects.create(
+                group=ctx["group"],
+                requester=ctx["user"],
+                target_shift=ctx["peer_future"][0],
+                offered_shift=shift,
+            )
+            return ctx["client"].post(reverse("delete_shift", args=[shift.id]))
+
+        self.assertConstantQueries("delete_shift", delete_shift)
+        self.assertConstantQueries(
+            "delete_group",
+            lambda ctx: ctx["client"].post(reverse("delete_group", args=[ctx["group"].id])),
+            # O Collector do Django apaga em lotes de 100 ids; os SELECTs da
+            # cascata e os UPDATEs (SET_NULL) precisam continuar constantes
+            ignore=lambda sql: sql.startswith("DELETE FROM"),
+        )
+
+    # -------------------------------------------------------------------------
+    # Conta
+    # -------------------------------------------------------------------------
+
+    def test_profile_view(self):
+        print("\n🧪 TESTE: Perfil com número constante de queries")
+        self.assertConstantQueries(
+            "profile_view:get", lambda ctx: ctx["client"].get(reverse("profile_view"))
+        )
+        self.assertConstantQueries(
+            "profile_view:post",
+            lambda ctx: ctx["client"].post(
+                reverse("profile_view"),
+                {"full_name": "Dr. Carga", "phone": "11999990000"},
+            ),
+        )
@@ -0,0 +1,381 @@
+# trades.py
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, UUIDField, Value, When
+from django.template.loader import get_template, render_to_string
+from django.utils.html import strip_tags
+
+from .cache import invalidate_group, invalidate_users
+from .intervals import IntervalIndex
+from .models import Shift, TradeRequest
+from .outbox import queue_email
+
+
+class TradeConflict(Exception):
+    """A proposta ou os plantões mudaram desde a leitura (outra ação venceu)."""
+
+
+def _lock(shift_ids, trade_ids):
+    """
+    Trava os plantões envolvidos (em ordem de id) e depois as propostas (idem).
+    Toda aceitação segue a mesma ordem, então duas aceitações concorrentes
+    esperam uma pela outra em vez de entrar em deadlock. Só essas linhas são
+    travadas: nada de select_related (que travaria usuários e grupo juntos).
+    """
+    list(
+        Shift.objects.select_for_update()
+        .filter(id__in=shift_ids)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    list(
+        TradeRequest.objects.select_for_update()
+        .filter(id__in=trade_ids)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+
+
+def _approve(trade):
+    if not TradeRequest.objects.filter(
+        pk=trade.pk, status=TradeRequest.Status.PENDING
+    ).update(status=TradeRequest.Status.APPROVED):
+        raise TradeConflict("Solicitação já finalizada.")
+
+
+def _reassign(shift_id, from_owner_id, to_owner_id, conflict_message):
+    """Passa o plantão adiante só se ainda estiver com o dono esperado."""
+    if not Shift.objects.filter(pk=shift_id, owner_id=from_owner_id).update(
+        owner_id=to_owner_id, tradable=False
+    ):
+        raise TradeConflict(conflict_message)
+
+
+def _check_overlaps(moves):
+    """
+    Nenhum plantão recebido pode sobrepor a agenda do novo dono. Poucos
+    movimentos (aceite simples, ciclo): uma consulta de intervalo em
+    shift_owner_start_idx por plantão, sem carregar a agenda de ninguém.
+    """
+    new_owners = dict(moves)
+    received = Shift.objects.filter(
+        id__in=new_owners, is_active=True
+    ).values_list("id", "start_time", "end_time")
+    for shift_id, start, end in received:
+        if (
+            Shift.objects.overlapping(new_owners[shift_id], start, end)
+            .exclude(pk=shift_id)
+            .exists()
+        ):
+            raise TradeConflict("A troca criaria dois plantões no mesmo horário.")
+
+
+def _check_bulk_overlaps(moves):
+    """Como _check_overlaps, para lotes: a agenda dos donos em uma query."""
+    if IntervalIndex.check_moves(moves):
+        raise TradeConflict("A troca criaria dois plantões no mesmo horário.")
+
+
+def _reject_siblings(shift_ids, trade_ids=()):
+    """
+    Recusa as demais propostas pendentes para plantões que mudaram de dono,
+    mais as de `trade_ids` (perderam o plantão oferecido para outra do lote).
+    """
+    siblings = TradeRequest.objects.filter(
+        Q(target_shift_id__in=shift_ids) | Q(id__in=trade_ids),
+        status=TradeRequest.Status.PENDING,
+    )
+    requester_ids = list(siblings.values_list("requester_id", flat=True))
+    siblings.update(status=TradeRequest.Status.REJECTED)
+    return requester_ids
+
+
+def accept_trade(trade, user):
+    """
+    Efetiva a troca para o dono do plantão alvo (`user`).
+
+    Cada mudança é um UPDATE condicional sobre o estado esperado (proposta
+    pendente, plantões ainda com os donos de quando ela foi feita). Se
+    alguma não afetar linha nenhuma, outra ação chegou antes: levanta
+    TradeConflict e a transação desfaz o que já tinha sido aplicado. O mesmo
+    vale se algum dos dois passar a ter plantões sobrepostos.
+    Retorna os ids dos solicitantes das propostas concorrentes recusadas.
+    """
+    with transaction.atomic():
+        _lock(
+            sorted(pk for pk in (trade.target_shift_id, trade.offered_shift_id) if pk),
+            [trade.pk],
+        )
+        _approve(trade)
+        _reassign(
+            trade.target_shift_id,
+            user.pk,
+            trade.requester_id,
+            "Este plantão não é mais seu.",
+        )
+        if trade.offered_shift_id:
+            _reassign(
+                trade.offered_shift_id,
+                trade.requester_id,
+                user.pk,
+                "O plantão oferecido já não pertence ao solicitante.",
+            )
+        _check_overlaps(
+            [(trade.target_shift_id, trade.requester_id)]
+            + ([(trade.offered_shift_id, user.pk)] if trade.offered_shift_id else [])
+        )
+        sibling_requesters = _reject_siblings([trade.target_shift_id])
+
+        # UPDATE não dispara signals: titularidade mudou, invalida a agenda do
+        # grupo e o estado de todos os envolvidos
+        invalidate_group(trade.group_id)
+        invalidate_users(user.pk, trade.requester_id, *sibling_requesters)
+
+    trade.status = TradeRequest.Status.APPROVED
+    return sibling_requesters
+
+
+def execute_cycle(trade_ids):
+    """
+    Efetiva de uma vez uma troca circular: cada solicitante recebe o plantão
+    alvo da sua proposta e entrega o que ofereceu, que é o alvo de outra
+    proposta do ciclo. Mesmas travas e UPDATEs condicionais do aceite
+    simples; se qualquer proposta ou plantão tiver mudado, nada é aplicado.
+    Retorna as propostas aprovadas.
+    """
+    with transaction.atomic():
+        trades = list(
+            TradeRequest.objects.filter(id__in=trade_ids)
+            .select_related("group", "requester", "target_shift")
+            .order_by("id")
+        )
+        if len(trades) != len(set(trade_ids)):
+            raise TradeConflict("Proposta do ciclo não encontrada.")
+
+        # Quem entrega cada plantão: o solicitante que o ofereceu
+        givers = {trade.offered_shift_id: trade.requester_id for trade in trades}
+        if any(trade.target_shift_id not in givers for trade in trades):
+            raise TradeConflict("As propostas não formam um ciclo.")
+
+        _lock(sorted(givers), [trade.pk for trade in trades])
+        for trade in trades:
+            _approve(trade)
+            _reassign(
+                trade.target_shift_id,
+                givers[trade.target_shift_id],
+                trade.requester_id,
+                "Um plantão do ciclo mudou de dono.",
+            )
+        _check_overlaps([(trade.target_shift_id, trade.requester_id) for trade in trades])
+        sibling_requesters = _reject_siblings(list(givers))
+
+        for group_id in {trade.group_id for trade in trades}:
+            invalidate_group(group_id)
+        invalidate_users(*givers.values(), *sibling_requesters)
+
+    for trade in trades:
+        trade.status = TradeRequest.Status.APPROVED
+    return trades
+
+
+def _pending_for_owner(trade_ids, user):
+    """Propostas pendentes, dentre `trade_ids`, para plantões do usuário."""
+    return (
+        TradeRequest.objects.filter(
+            id__in=trade_ids,
+            status=TradeRequest.Status.PENDING,
+            target_shift__owner=user,
+        )
+        .select_related("group", "requester", "target_shift")
+        .order_by("id")
+    )
+
+
+def bulk_accept_trades(trade_ids, user):
+    """
+    Aceita de uma vez várias propostas para plantões do usuário, em uma
+    transação e com UPDATEs por conjunto: um para as propostas, um para a
+    titularidade de todos os plantões (CASE por id) e um para as
+    concorrentes. Só propostas pendentes para plantões do usuário são
+    travadas; as finalizadas, de outro dono ou cujo plantão oferecido já
+    mudou de mãos ficam de fora. Se duas disputam o mesmo plantão (alvo ou
+    oferecido), vence a mais antiga e a outra é recusada junto com as
+    concorrentes. Sobreposição de horário em qualquer agenda desfaz o lote
+    inteiro.
+    Retorna (aprovadas, ids dos solicitantes das recusadas).
+    """
+    with transaction.atomic():
+        candidates = list(
+            TradeRequest.objects.filter(
+                id__in=trade_ids,
+                status=TradeRequest.Status.PENDING,
+                target_shift__owner=user,
+            ).values_list("id", "target_shift_id", "offered_shift_id")
+        )
+        _lock(
+            sorted({pk for _, *shifts in candidates for pk in shifts if pk}),
+            [pk for pk, _, _ in candidates],
+        )
+        # Relido depois das travas: o estado agora não muda até o commit
+        eligible = _pending_for_owner(trade_ids, user).filter(
+            Q(offered_shift__isnull=True) | Q(offered_shift__owner=F("requester"))
+        )
+
+        trades, losers, taken = [], [], set()
+        for trade in eligible:
+            shifts = {trade.target_shift_id, trade.offered_shift_id} - {None}
+            if shifts & taken:
+                losers.append(trade.pk)
+                continue
+            taken |= shifts
+            trades.append(trade)
+        if not trades:
+            return [], []
+
+        TradeRequest.objects.filter(id__in=[t.pk for t in trades]).update(
+            status=TradeRequest.Status.APPROVED
+        )
+        moves = [(t.target_shift_id, t.requester_id) for t in trades] + [
+            (t.offered_shift_id, user.pk) for t in trades if t.offered_shift_id
+        ]
+        Shift.objects.filter(id__in=[shift_id for shift_id, _ in moves]).update(
+            owner_id=Case(
+                *(When(id=shift_id, then=Value(owner_id)) for shift_id, owner_id in moves),
+                output_field=UUIDField(),
+            ),
+            tradable=False,
+        )
+        _check_bulk_overlaps(moves)
+        sibling_requesters = _reject_siblings(
+            [t.target_shift_id for t in trades], losers
+        )
+
+        for group_id in {t.group_id for t in trades}:
+            invalidate_group(group_id)
+        invalidate_users(user.pk, *(t.requester_id for t in trades), *sibling_requesters)
+
+    for trade in trades:
+        trade.status = TradeRequest.Status.APPROVED
+    return trades, sibling_requesters
+
+
+def bulk_reject_trades(trade_ids, user):
+    """
+    Recusa de uma vez as propostas pendentes, dentre `trade_ids`, para
+    plantões do usuário: um único UPDATE condicional. Retorna as recusadas.
+    """
+    with transaction.atomic():
+        trades = list(_pending_for_owner(trade_ids, user).select_for_update(of=("self",)))
+        if not trades:
+            return []
+        TradeRequest.objects.filter(
+            id__in=[t.pk for t in trades], status=TradeRequest.Status.PENDING
+        ).update(status=TradeRequest.Status.REJECTED)
+        invalidate_users(user.pk, *(t.requester_id for t in trades))
+
+    for trade in trades:
+        trade.status = TradeRequest.Status.REJECTED
+    return trades
+
+
+def reject_trade(trade, user):
+    """Recusa a proposta, se ainda estiver pendente (UPDATE condicional)."""
+    with transaction.atomic():
+        if not TradeRequest.objects.filter(
+            pk=trade.pk,
+            status=TradeRequest.Status.PENDING,
+            target_shift__owner=user,
+        ).update(status=TradeRequest.Status.REJECTED):
+            raise TradeConflict("Solicitação já finalizada.")
+
+        invalidate_users(user.pk, trade.requester_id)
+
+    trade.status = TradeRequest.Status.REJECTED
+
+
+def send_trade_notification(trade):
+    """
+    Centraliza o envio de emails de troca (Aprovada ou Recusada) via caixa de saída.
+    """
+    if not trade.requester.email:
+        return
+
+    # Usa o Enum do Model para evitar erros de digitação
+    if trade.status == TradeRequest.Status.APPROVED:
+        subject_prefix = "✅ Troca Confirmada"
+        template_name = "shifts/emails/trade_accepted.html"
+        title_text = "Sua proposta foi aceita!"
+        color_theme = "#198754"
+        message_body = "Boas notícias! Sua proposta de troca foi confirmada."
+    else:
+        subject_prefix = "❌ Troca Recusada"
+        template_name = "shifts/emails/trade_rejected.html"
+        title_text = "Proposta não aceita"
+        color_theme = "#dc3545"
+        message_body = (
+            "Infelizmente sua proposta de troca não pôde ser aceita neste momento."
+        )
+
+    subject = f"{subject_prefix}: Dia {trade.target_shift.start_time.strftime('%d/%m')}"
+
+    context = {
+        "requester_name": trade.requester.full_name or trade.requester.email,
+        "shift_date": trade.target_shift.start_time.strftime("%d/%m/%Y às %H:%M"),
+        "group_name": trade.group.name,
+        "dashboard_url": f"{getattr(settings, 'BASE_URL', 'http://127.0.0.1:8000')}/dashboard/",
+        "title_text": title_text,
+        "message_body": message_body,
+        "color_scheme": color_theme,
+    }
+
+    html_content = render_to_string(template_name, context)
+    text_content = strip_tags(html_content)
+
+    queue_email(
+        subject=subject,
+        message=text_content,
+        recipient_list=[trade.requester.email],
+        html_message=html_content,
+    )
+
+
+def send_trade_notifications(trades):
+    """
+    Uma mensagem por solicitante para um lote de decisões: quem tem uma só
+    recebe o e-mail de sempre; quem tem várias, um resumo com todas. O
+    template do resumo é carregado uma vez para o lote.
+    """
+    by_requester = defaultdict(list)
+    for trade in trades:
+        if trade.requester.email:
+            by_requester[trade.requester_id].append(trade)
+
+    template = None
+    for batch in by_requester.values():
+        if len(batch) == 1:
+            send_trade_notification(batch[0])
+            continue
+
+        template = template or get_template("shifts/emails/trade_summary.html")
+        requester = batch[0].requester
+        approved = [t for t in batch if t.status == TradeRequest.Status.APPROVED]
+        rejected = [t for t in batch if t.status != TradeRequest.Status.APPROVED]
+        html_content = template.render(
+            {
+                "requester_name": requester.full_name or requester.email,
+                "approved": approved,
+                "rejected": rejected,
+                "dashboard_url": f"{getattr(settings, 'BASE_URL', 'http://127.0.0.1:8000')}/dashboard/",
+            }
+        )
+        queue_email(
+            subject=(
+                f"🔄 Trocas: {len(approved)} confirmada(s), "
+                f"{len(rejected)} recusada(s)"
+            ),
+            message=strip_tags(html_content),
+            recipient_list=[requester.email],
+            html_message=html_content,
+        )
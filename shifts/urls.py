@@ -4,6 +4,8 @@ from . import views
 urlpatterns = [
     path("dashboard/", views.dashboard, name="dashboard"),
     path("", views.dashboard, name="home"),
+    path("calendar/", views.calendar_fragment, name="calendar_fragment"),
+    path("calendar/extract/", views.extract_page, name="extract_page"),
     # Grupos
     path("group/create/", views.create_group, name="create_group"),
     path("group/delete/<int:group_id>/", views.delete_group, name="delete_group"),
@@ -36,4 +38,20 @@ urlpatterns = [
         views.reject_trade_request,
         name="reject_trade_request",
     ),
+    path(
+        "trade/bulk/accept/",
+        views.bulk_accept_trade_requests,
+        name="bulk_accept_trade_requests",
+    ),
+    path(
+        "trade/bulk/reject/",
+        views.bulk_reject_trade_requests,
+        name="bulk_reject_trade_requests",
+    ),
+    path("trade/marketplace/", views.marketplace, name="marketplace"),
+    path(
+        "trade/candidates/<int:shift_id>/",
+        views.swap_candidates_view,
+        name="swap_candidates",
+    ),
 ]
@@ -1,42 +1,322 @@
 # utils.py
+import atexit
+import json
+import logging
+import os
+import queue
 import threading
-from django.core.mail import EmailMultiAlternatives
+import time
+
 from django.conf import settings
+from django.core.mail import get_connection
+from django.db import close_old_connections, connections as db_connections
+
+logger = logging.getLogger("shifts.email")
+
+_STOP = object()
+_UNSENT = object()
+
+
+def close_connection(connection):
+    """Fecha a conexão SMTP ignorando erros (ela pode já ter caído). Retorna None."""
+    if connection is not None:
+        try:
+            connection.close()
+        except Exception:
+            pass
+    return None
+
+
+class EmailMetrics:
+    """Contadores do processo: volume, falhas, fila e latência de envio."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.inline = 0
+        self.batches = 0
+        self.max_depth = 0
+        self.send_ms_total = 0.0
+        self.send_ms_max = 0.0
+        self.wait_ms_max = 0.0
+
+    def record_enqueue(self, depth):
+        with self._lock:
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, depth)
+
+    def record_batch(self, sent, failed, send_ms, wait_ms):
+        with self._lock:
+            self.batches += 1
+            self.sent += sent
+            self.failed += failed
+            self.send_ms_total += send_ms
+            self.send_ms_max = max(self.send_ms_max, send_ms)
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
 
+    def record_inline(self):
+        with self._lock:
+            self.inline += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "enqueued": self.enqueued,
+                "sent": self.sent,
+                "failed": self.failed,
+                "inline": self.inline,
+                "batches": self.batches,
+                "max_queue_depth": self.max_depth,
+                "avg_batch_send_ms": (
+                    round(self.send_ms_total / self.batches, 1) if self.batches else 0.0
+                ),
+                "max_batch_send_ms": round(self.send_ms_max, 1),
+                "max_queue_wait_ms": round(self.wait_ms_max, 1),
+            }
+
+
+class EmailDispatcher:
+    """
+    Fila limitada + pool fixo de workers por processo. Cada worker mantém a
+    sua conexão SMTP aberta e envia lotes por ela, uma mensagem por vez, em
+    vez de uma thread e um handshake TLS por e-mail.
+
+    - Backpressure: com a fila cheia, submit() espera até enqueue_timeout e
+      então envia na própria thread (nenhum e-mail é descartado).
+    - Encerramento: shutdown() (atexit) esvazia a fila antes de parar.
+    - on_done(ok, error) é chamado após cada envio (ex.: caixa de saída).
+    """
 
-class EmailThread(threading.Thread):
     def __init__(
-        self, subject, message, recipient_list, html_message=None, bcc_list=None
+        self,
+        workers=None,
+        queue_size=None,
+        batch_size=None,
+        enqueue_timeout=None,
+        idle_timeout=None,
     ):
-        self.subject = subject
-        self.message = message
-        self.recipient_list = recipient_list
-        self.html_message = html_message
-        self.bcc_list = bcc_list
-        threading.Thread.__init__(self)
-
-    def run(self):
+        self.worker_count = (
+            settings.EMAIL_WORKER_COUNT if workers is None else workers
+        )
+        self.batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+        self.enqueue_timeout = (
+            settings.EMAIL_ENQUEUE_TIMEOUT if enqueue_timeout is None else enqueue_timeout
+        )
+        self.idle_timeout = idle_timeout or settings.EMAIL_IDLE_TIMEOUT
+        self.queue = queue.Queue(maxsize=queue_size or settings.EMAIL_QUEUE_SIZE)
+        self.metrics = EmailMetrics()
+        self.pid = os.getpid()
+        self._workers = []
+        self._lock = threading.Lock()
+
+    # --- Produtor ---
+
+    def submit(self, message, on_done=None):
+        if not self.worker_count:
+            self._send_inline(message, on_done)
+            return
+
+        self._ensure_workers()
+        try:
+            self.queue.put(
+                (message, time.monotonic(), on_done), timeout=self.enqueue_timeout
+            )
+        except queue.Full:
+            logger.warning(
+                "Fila de e-mails cheia (%s); enviando na requisição", self.queue.maxsize
+            )
+            self.metrics.record_inline()
+            self._send_inline(message, on_done)
+            return
+        self.metrics.record_enqueue(self.queue.qsize())
+
+    def _send_inline(self, message, on_done=None):
+        error = None
         try:
-            # Usamos EmailMultiAlternatives para suportar HTML e BCC
-            email = EmailMultiAlternatives(
-                subject=self.subject,
-                body=self.message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=self.recipient_list,
-                bcc=self.bcc_list,
+            message.send(fail_silently=False)
+        except Exception as exc:
+            error = exc
+            logger.exception("Erro ao enviar e-mail")
+        self._notify([on_done], error)
+
+    def _notify(self, callbacks, error):
+        for on_done in callbacks:
+            if on_done is None:
+                continue
+            try:
+                on_done(error is None, error)
+            except Exception:
+                logger.exception("Erro no callback de e-mail enviado")
+
+    def _ensure_workers(self):
+        if len(self._workers) == self.worker_count:
+            return
+        with self._lock:
+            while len(self._workers) < self.worker_count:
+                worker = threading.Thread(
+                    target=self._work,
+                    name=f"email-worker-{len(self._workers)}",
+                    daemon=True,
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    # --- Workers ---
+
+    def _work(self):
+        connection = None
+        stop = False
+
+        while not stop:
+            try:
+                item = self.queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                connection = close_connection(connection)
+                continue
+
+            if item is _STOP:
+                self.queue.task_done()
+                break
+
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self.queue.task_done()
+                    stop = True
+                    break
+                batch.append(item)
+
+            try:
+                connection = self._send_batch(connection, batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+                # Callbacks podem ter usado o banco nesta thread
+                close_old_connections()
+
+        close_connection(connection)
+        # Conexões ao banco são por thread: fecha as deste worker ao sair
+        db_connections.close_all()
+
+    def _send_batch(self, connection, batch):
+        wait_ms = (time.monotonic() - batch[0][1]) * 1000
+        start = time.perf_counter()
+        # Resultado por mensagem: None = enviada, exceção = falhou. Uma falha
+        # (ex.: destinatário recusado) não derruba nem reenvia as demais.
+        errors = [_UNSENT] * len(batch)
+
+        # Uma nova tentativa, com conexão nova, só para as não enviadas: o
+        # servidor pode ter derrubado a conexão ociosa entre um lote e outro
+        for _attempt in range(2):
+            for i, (message, _, _) in enumerate(batch):
+                if errors[i] is None:
+                    continue
+                try:
+                    if connection is None:
+                        connection = get_connection(fail_silently=False)
+                        connection.open()
+                    connection.send_messages([message])
+                    errors[i] = None
+                except Exception as exc:
+                    errors[i] = exc
+                    connection = close_connection(connection)
+            if not any(errors):
+                break
+
+        failed = sum(1 for error in errors if error is not None)
+        if failed:
+            logger.error(
+                "Falha ao enviar %s de %s e-mail(s) do lote: %s",
+                failed,
+                len(batch),
+                next(error for error in errors if error is not None),
+            )
+
+        send_ms = (time.perf_counter() - start) * 1000
+        for (_, _, on_done), error in zip(batch, errors):
+            self._notify([on_done], error)
+        self.metrics.record_batch(len(batch) - failed, failed, send_ms, wait_ms)
+        logger.info(
+            json.dumps(
+                {
+                    "event": "email_batch",
+                    "size": len(batch),
+                    "failed": failed,
+                    "send_ms": round(send_ms, 1),
+                    "queue_wait_ms": round(wait_ms, 1),
+                    "queue_depth": self.queue.qsize(),
+                }
             )
+        )
+        return connection
+
+
+    # --- Controle ---
+
+    def flush(self, timeout=None):
+        """Espera a fila esvaziar. Retorna False se o tempo acabar antes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def shutdown(self, timeout=None):
+        """Envia o que está na fila e encerra os workers."""
+        timeout = settings.EMAIL_SHUTDOWN_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            try:
+                self.queue.put(_STOP, timeout=max(deadline - time.monotonic(), 0))
+            except queue.Full:
+                break
+        for worker in workers:
+            worker.join(max(deadline - time.monotonic(), 0))
+        if self.queue.unfinished_tasks:
+            logger.warning(
+                "Encerrando com %s e-mail(s) não enviados", self.queue.unfinished_tasks
+            )
+
+    def stats(self):
+        return {
+            **self.metrics.snapshot(),
+            "queue_depth": self.queue.qsize(),
+            "workers": len(self._workers),
+        }
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
 
-            if self.html_message:
-                email.attach_alternative(self.html_message, "text/html")
 
-            email.send(fail_silently=False)
+def get_email_dispatcher():
+    """Dispatcher do processo atual (recriado após fork, ex.: gunicorn)."""
+    global _dispatcher
+    if _dispatcher is None or _dispatcher.pid != os.getpid():
+        with _dispatcher_lock:
+            if _dispatcher is None or _dispatcher.pid != os.getpid():
+                _dispatcher = EmailDispatcher()
+                atexit.register(_dispatcher.shutdown)
+    return _dispatcher
 
-        except Exception as e:
-            print(f"❌ Erro ao enviar email em background: {e}")
 
+def reset_email_dispatcher(timeout=None):
+    """Encerra o dispatcher atual; o próximo uso cria outro com os settings vigentes."""
+    global _dispatcher
+    with _dispatcher_lock:
+        dispatcher, _dispatcher = _dispatcher, None
+    if dispatcher is not None:
+        dispatcher.shutdown(timeout)
+        atexit.unregister(dispatcher.shutdown)
 
-def send_email_background(
-    subject, message, recipient_list, html_message=None, bcc_list=None
-):
-    email_thread = EmailThread(subject, message, recipient_list, html_message, bcc_list)
-    email_thread.start()
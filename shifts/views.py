@@ -1,21 +1,58 @@
-import calendar
+import hashlib
+import time
 import uuid
 from datetime import date, timedelta
-from itertools import groupby
+from functools import partial
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.mail import EmailMessage, EmailMultiAlternatives
 from django.db import transaction
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from django.utils.html import strip_tags
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django_htmx.http import HttpResponseClientRedirect, push_url
+from .agenda import (
+    build_extract_agenda,
+    build_month_agenda,
+    build_year_heatmap,
+    drop_trailing_day,
+)
+from .cache import (
+    cached_month_agenda,
+    group_shift_types,
+    group_version,
+    user_version,
+)
+from .digest import notify
 from .forms import GroupForm, ShiftForm, ShiftTypeForm
-from .models import Group, Shift, ShiftType, TradeRequest
-from .utils import send_email_background
+from .inbox import TradeInbox
+from .marketplace import marketplace_page, open_offers_count
+from .matching import swap_candidates
+from .models import Group, NotificationEvent, Shift, ShiftType, TradeRequest
+from .queries import (
+    annual_day_stats,
+    date_range,
+    keyset_page,
+    period_range,
+    shift_cursor,
+)
+from .outbox import queue_broadcast
+from .trades import (
+    TradeConflict,
+    accept_trade,
+    bulk_accept_trades,
+    bulk_reject_trades,
+    reject_trade,
+    send_trade_notification,
+    send_trade_notifications,
+)
 
 # ------------------------------------------------------------------------------
 # Utilidades
@@ -37,45 +74,70 @@ def _get_redirect_url(request, fallback="dashboard"):
 # ------------------------------------------------------------------------------
 
 
-@login_required
-def dashboard(request):
-    today = timezone.now().date()
-
-    # Desativa plantões passados automaticamente
-    Shift.objects.filter(is_active=True, end_time__date__lt=today).update(
-        is_active=False
-    )
-
-    # --- Gestão de Grupo Ativo ---
+def _resolve_active_group(request, fallback=False):
+    """
+    Grupo ativo pedido (GET ou sessão), só entre os grupos do usuário; com
+    `fallback`, o primeiro grupo dele quando o pedido não é válido (ex.:
+    favorito com o id de um grupo que ele deixou). Fonte única para as
+    views e para o ETag, que assim segue o grupo de fato renderizado.
+    Memorizado na requisição: o ETag e a view não repetem a query.
+    """
+    memo = request.__dict__.setdefault("_active_groups", {})
+    if fallback not in memo:
+        groups = request.user.work_groups.all()
+        requested = request.GET.get("group_id") or request.session.get(
+            "active_group_id"
+        )
+        group = None
+        if str(requested or "").isdigit():
+            group = groups.filter(id=requested).first()
+        if group is None and fallback:
+            group = groups.first()
+        memo[fallback] = group
+    return memo[fallback]
 
-    user_groups = request.user.work_groups.all()
-    if not user_groups.exists():
-        return render(request, "shifts/no_group.html", {"group_form": GroupForm()})
 
-    active_group_id = request.GET.get("group_id") or request.session.get(
-        "active_group_id"
+def _calendar_etag(request, *args, fallback=False, **kwargs):
+    """
+    ETag do dashboard e do fragmento do calendário, calculado só com as
+    versões do grupo e do usuário (cache), sem montar contexto nem
+    renderizar templates. A janela de tempo cobre o que muda sozinho com o
+    relógio (plantões encerrando, "hoje").
+    """
+    if request.method not in ("GET", "HEAD"):
+        return None
+
+    # Mensagens pendentes precisam ser renderizadas
+    if len(messages.get_messages(request)):
+        return None
+
+    group = _resolve_active_group(request, fallback=fallback)
+    if group is None:
+        return None
+    group_id = group.id
+
+    parts = (
+        settings.ETAG_SALT,
+        request.path,
+        request.GET.urlencode(),
+        request.user.pk,
+        user_version(request.user.pk),
+        group_id,
+        group_version(group_id),
+        request.META.get("CSRF_COOKIE", ""),
+        int(time.time() // settings.ETAG_TIME_BUCKET),
     )
-    active_group = user_groups.filter(id=active_group_id).first() or user_groups.first()
+    return hashlib.md5(
+        "|".join(map(str, parts)).encode(), usedforsecurity=False
+    ).hexdigest()
 
-    if active_group:
-        request.session["active_group_id"] = active_group.id
-
-    # --- Criação Rápida de Plantão (Modal) ---
-
-    if request.method == "POST":
-        form = ShiftForm(request.POST)
-        if form.is_valid():
-            shift = form.save(commit=False)
-            shift.owner = request.user
-            shift.group = active_group
-            shift.save()
-            messages.success(request, "Plantão adicionado com sucesso.")
-            return HttpResponseRedirect(_get_redirect_url(request))  # Mantém filtros
-    else:
-        form = ShiftForm()
-
-    # --- Filtros e Navegação Temporal ---
 
+def _build_calendar_context(request, active_group, today):
+    """
+    Monta o contexto do calendário (grid mensal, extrato ou visão anual)
+    a partir dos parâmetros GET. Compartilhado pelo dashboard e pelo
+    fragmento htmx.
+    """
     try:
         req_year = int(request.GET.get("year", today.year))
         req_month = int(request.GET.get("month", today.month))
@@ -92,26 +154,32 @@ def dashboard(request):
 
     # Define Modo de Visualização
 
-    display_mode = "user_extract" if filter_user_id else "monthly_grid"
+    if filter_user_id:
+        display_mode = "user_extract"
+    elif request.GET.get("display") == "annual":
+        display_mode = "annual_calendar"
+    else:
+        display_mode = "monthly_grid"
+
+    # Período (intervalo semiaberto, usa o índice group + start_time)
+
+    if display_mode == "user_extract":
+        period_start, period_end = period_range(req_year, view_mode=filter_period_scope)
+    else:
+        period_start, period_end = period_range(req_year, req_month)
 
     # Query Base
 
     filters = {
         "group": active_group,
-        "start_time__year": req_year,
+        "start_time__gte": period_start,
+        "start_time__lt": period_end,
     }
 
     # Aplicação dos Filtros
 
     if display_mode == "user_extract":
         filters["owner__id"] = filter_user_id
-        if filter_period_scope and filter_period_scope != "all":
-            try:
-                filters["start_time__month"] = int(filter_period_scope)
-            except ValueError:
-                pass
-    elif display_mode == "monthly_grid":
-        filters["start_time__month"] = req_month
 
     if filter_type_id:
         filters["shift_type__id"] = filter_type_id
@@ -127,96 +195,163 @@ def dashboard(request):
     # Organização dos Dias (Agenda)
 
     agenda_days = []
+    year_heatmap = []
+    extract_next_query = None
 
-    if display_mode in ["user_extract", "annual_calendar"]:
-        for date_obj, day_shifts_iter in groupby(
-            shifts, key=lambda s: s.start_time.date()
-        ):
-            agenda_days.append(
-                {
-                    "date": date_obj,
-                    "day_number": date_obj.day,
-                    "is_today": date_obj == today,
-                    "is_weekend": date_obj.weekday() >= 5,
-                    "shifts": list(day_shifts_iter),
-                    "show_month": True,
-                }
-            )
-
+    if display_mode == "user_extract":
+        # Keyset por (start_time, id): a página custa o mesmo com 10 ou
+        # 1000 plantões no ano; o resto vem em fragmentos "Carregar mais"
+        page, has_more = keyset_page(
+            shifts, request.GET.get("cursor"), settings.EXTRACT_PAGE_SIZE
+        )
+        if has_more:
+            page = drop_trailing_day(page)
+            params = request.GET.copy()
+            params["cursor"] = shift_cursor(page[-1])
+            extract_next_query = params.urlencode()
+        agenda_days = build_extract_agenda(page, today)
+    elif display_mode == "annual_calendar":
+        # Visão anual: só agregados por dia, nenhum Shift é carregado
+        year_heatmap = build_year_heatmap(
+            req_year, annual_day_stats(active_group, req_year, filter_type_id), today
+        )
     elif display_mode == "monthly_grid":
+        # Mesmo grid para todos os membros: cache por (grupo, ano, mês, tipo)
+        agenda_days = cached_month_agenda(
+            active_group.id,
+            req_year,
+            req_month,
+            filter_type_id,
+            today,
+            build=lambda: build_month_agenda(req_year, req_month, shifts, today),
+        )
+
+    return {
+        "current_date": current_date,
+        "req_year": req_year,
+        "agenda_days": agenda_days,
+        "year_heatmap": year_heatmap,
+        "extract_next_query": extract_next_query,
+        # Controle Visual e Filtros
+        "display_mode": display_mode,
+        "filter_period_scope": filter_period_scope,
+        "selected_user_id": filter_user_id if filter_user_id else None,
+        "selected_type_id": filter_type_id if filter_type_id else None,
+        # Navegação
+        "prev_date": (current_date - timedelta(days=1)).replace(day=1),
+        "next_date": (current_date + timedelta(days=32)).replace(day=1),
+    }
 
-        # Preenchimento de calendário completo (1 a 31)
 
-        _, num_days = calendar.monthrange(req_year, req_month)
-        all_shifts_list = list(shifts)
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=partial(_calendar_etag, fallback=True))
+def dashboard(request):
+    today = timezone.localdate()
 
-        for day_num in range(1, num_days + 1):
-            date_obj = date(req_year, req_month, day_num)
-            day_shifts = [s for s in all_shifts_list if s.start_time.day == day_num]
+    # --- Gestão de Grupo Ativo ---
 
-            agenda_days.append(
-                {
-                    "date": date_obj,
-                    "day_number": day_num,
-                    "is_today": date_obj == today,
-                    "is_weekend": date_obj.weekday() >= 5,
-                    "shifts": day_shifts,
-                    "show_month": False,
-                }
-            )
+    user_groups = request.user.work_groups.all()
+    if not user_groups.exists():
+        return render(request, "shifts/no_group.html", {"group_form": GroupForm()})
 
-    # --- Contextos ---
+    active_group = _resolve_active_group(request, fallback=True)
 
-    # Plantões futuros (Para oferecer em troca)
-    user_future_shifts = []
     if active_group:
-        user_future_shifts = Shift.objects.filter(
-            group=active_group,
-            owner=request.user,
-            start_time__gte=timezone.now(),
-            is_active=True,
-        ).order_by("start_time")
+        request.session["active_group_id"] = active_group.id
 
-    # Propostas recebidas (Incoming)
-    incoming_trades = TradeRequest.objects.filter(
-        target_shift__owner=request.user, status=TradeRequest.Status.PENDING
-    ).select_related("requester", "target_shift", "offered_shift")
+    # --- Criação Rápida de Plantão (Modal) ---
 
-    # Minhas solicitações pendentes (Para bloquear botões)
+    if request.method == "POST":
+        form = ShiftForm(request.POST, group=active_group, owner=request.user)
+        if form.is_valid():
+            shift = form.save(commit=False)
+            shift.owner = request.user
+            shift.group = active_group
+            shift.save()
+            messages.success(request, "Plantão adicionado com sucesso.")
+            return HttpResponseRedirect(_get_redirect_url(request))  # Mantém filtros
+        # O modal não exibe erros de formulário: conflito de horário vira aviso
+        for error in form.non_field_errors():
+            messages.error(request, error)
+    else:
+        form = ShiftForm(group=active_group)
 
-    my_pending_requests = TradeRequest.objects.filter(
-        requester=request.user, status=TradeRequest.Status.PENDING
-    ).values_list("target_shift_id", flat=True)
+    # --- Contextos ---
 
     context = {
         "active_group": active_group,
-        "current_date": current_date,
-        "req_year": req_year,
-        "agenda_days": agenda_days,
-        # Controle Visual e Filtros
-        "display_mode": display_mode,
-        "filter_period_scope": filter_period_scope,
-        "selected_user_id": filter_user_id if filter_user_id else None,
-        "selected_type_id": filter_type_id if filter_type_id else None,
+        **_build_calendar_context(request, active_group, today),
         "years_range": range(today.year - 1, today.year + 2),
         # Forms e Dados
         "form": form,  # Shift form
         "group_form": GroupForm(),
         "user_groups": user_groups,
         "group_members": active_group.members.all(),
-        "group_shift_types": ShiftType.objects.all(),
-        # Navegação
-        "prev_date": (current_date - timedelta(days=1)).replace(day=1),
-        "next_date": (current_date + timedelta(days=32)).replace(day=1),
-        # Trocas
-        "user_future_shifts": user_future_shifts,
-        "incoming_trades": incoming_trades,
-        "my_pending_requests": my_pending_requests,
+        "group_shift_types": group_shift_types(active_group.id),
+        # Trocas (recebidas, enviadas e plantões para contra-oferta)
+        "inbox": TradeInbox.for_user(request.user, active_group),
+        # Badge do mural na navbar (contador cacheado por versão do grupo)
+        "open_offers": open_offers_count(active_group.id),
     }
 
     return render(request, "shifts/dashboard.html", context)
 
 
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_calendar_etag)
+def calendar_fragment(request):
+    """
+    Fragmento htmx do calendário: navegação de mês e filtros trocam só o
+    grid, sem refazer inbox de trocas, membros e modais do dashboard.
+    """
+    if not request.htmx:
+        return redirect(f"{reverse('dashboard')}?{request.GET.urlencode()}")
+
+    active_group = _resolve_active_group(request)
+    if not active_group:
+        return HttpResponseClientRedirect(reverse("dashboard"))
+
+    context = {
+        "active_group": active_group,
+        **_build_calendar_context(request, active_group, timezone.localdate()),
+        # Só carregado se algum card precisar do estado "Proposta enviada"
+        "inbox": SimpleLazyObject(
+            lambda: TradeInbox.for_user(request.user, active_group)
+        ),
+    }
+    response = render(request, "shifts/components/calendar_fragment.html", context)
+    return push_url(response, f"{reverse('dashboard')}?{request.GET.urlencode()}")
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_calendar_etag)
+def extract_page(request):
+    """
+    Próxima página do extrato individual ("Carregar mais"): só os dias da
+    página e o botão da seguinte, anexados ao fim da lista.
+    """
+    if not request.htmx:
+        params = request.GET.copy()
+        params.pop("cursor", None)
+        return redirect(f"{reverse('dashboard')}?{params.urlencode()}")
+
+    active_group = _resolve_active_group(request)
+    if not active_group or not request.GET.get("filter_user"):
+        return HttpResponseClientRedirect(reverse("dashboard"))
+
+    context = {
+        "active_group": active_group,
+        **_build_calendar_context(request, active_group, timezone.localdate()),
+        "inbox": SimpleLazyObject(
+            lambda: TradeInbox.for_user(request.user, active_group)
+        ),
+    }
+    return render(request, "shifts/components/extract_page.html", context)
+
+
 # ------------------------------------------------------------------------------
 # Gestão de Grupos
 # ------------------------------------------------------------------------------
@@ -224,7 +359,7 @@ def dashboard(request):
 
 @login_required
 def _process_group_entry(request, group):
-    if request.user in group.members.all():
+    if group.members.filter(pk=request.user.pk).exists():
         messages.info(request, f"Você já é membro do grupo {group.name}.")
     else:
         group.members.add(request.user)
@@ -302,7 +437,7 @@ def join_via_form(request):
 def reset_invite_token(request, group_id):
     # TODO: Somente admin reseta?
     group = get_object_or_404(Group, id=group_id)
-    if request.user in group.members.all():
+    if group.members.filter(pk=request.user.pk).exists():
         group.invite_token = str(uuid.uuid4())[:8]
         group.save()
         messages.success(request, "Link redefinido.")
@@ -322,13 +457,13 @@ def edit_shift(request, shift_id):
         return redirect("dashboard")
 
     if request.method == "POST":
-        form = ShiftForm(request.POST, instance=shift)
+        form = ShiftForm(request.POST, instance=shift, group=shift.group)
         if form.is_valid():
             form.save()
             messages.success(request, "Plantão atualizado.")
             return redirect("dashboard")
     else:
-        form = ShiftForm(instance=shift)
+        form = ShiftForm(instance=shift, group=shift.group)
 
     return render(request, "shifts/edit_shift.html", {"form": form, "shift": shift})
 
@@ -380,8 +515,11 @@ def manage_shift_types(request):
 
 
 @login_required
+@transaction.atomic
 def switch_shift_tradable(request, shift_id):
-    shift = get_object_or_404(Shift, id=shift_id)
+    shift = get_object_or_404(
+        Shift.objects.select_related("group", "shift_type"), id=shift_id
+    )
 
     if shift.owner != request.user:
         messages.error(request, "Permissão negada.")
@@ -403,34 +541,31 @@ def switch_shift_tradable(request, shift_id):
         shift.save()
 
         if shift.tradable:
-            group_members = shift.group.members.exclude(id=request.user.id)
-            bcc_list = [m.email for m in group_members if m.email]
-
-            if bcc_list:
-                subject = f"📢 Oportunidade em {shift.group.name}: {shift.start_time.strftime('%d/%m')}"
-
-                context = {
-                    "owner_name": request.user.full_name or request.user.email,
-                    "group_name": shift.group.name,
-                    "shift_date": shift.start_time.strftime("%d/%m/%Y"),
-                    "shift_time": f"{shift.start_time.strftime('%H:%M')} - {shift.end_time.strftime('%H:%M')}",
-                    "shift_type": shift.shift_type.name,
-                    "dashboard_url": f"{getattr(settings, 'BASE_URL', 'http://127.0.0.1:8000')}/dashboard/",
-                }
+            subject = f"📢 Oportunidade em {shift.group.name}: {shift.start_time.strftime('%d/%m')}"
 
-                html_content = render_to_string(
-                    "shifts/emails/new_opportunity.html", context
-                )
-                text_content = strip_tags(html_content)
-
-                # Envia em background sem travar a tela
-                send_email_background(
-                    subject=subject,
-                    message=text_content,
-                    recipient_list=[settings.DEFAULT_FROM_EMAIL],
-                    html_message=html_content,
-                    bcc_list=bcc_list,
-                )
+            context = {
+                "owner_name": request.user.full_name or request.user.email,
+                "group_name": shift.group.name,
+                "shift_date": shift.start_time.strftime("%d/%m/%Y"),
+                "shift_time": f"{shift.start_time.strftime('%H:%M')} - {shift.end_time.strftime('%H:%M')}",
+                "shift_type": shift.shift_type.name,
+                "dashboard_url": f"{getattr(settings, 'BASE_URL', 'http://127.0.0.1:8000')}/dashboard/",
+            }
+
+            html_content = render_to_string(
+                "shifts/emails/new_opportunity.html", context
+            )
+            text_content = strip_tags(html_content)
+
+            # Difusão: uma linha na caixa de saída, independente do tamanho
+            # do grupo; os destinatários são expandidos fora da requisição
+            queue_broadcast(
+                shift.group,
+                subject=subject,
+                message=text_content,
+                html_message=html_content,
+                exclude_user=request.user,
+            )
 
             messages.success(request, "Plantão ofertado para troca.")
         else:
@@ -440,6 +575,7 @@ def switch_shift_tradable(request, shift_id):
 
 
 @login_required
+@transaction.atomic
 def create_trade_request(request):
     if request.method == "POST":
         target_id = request.POST.get("target_shift_id")
@@ -450,7 +586,9 @@ def create_trade_request(request):
             return redirect("dashboard")
 
         try:
-            target_shift = Shift.objects.get(id=target_id)
+            target_shift = Shift.objects.select_related(
+                "group", "owner", "shift_type"
+            ).get(id=target_id)
         except Shift.DoesNotExist:
             return redirect("dashboard")
 
@@ -488,28 +626,25 @@ def create_trade_request(request):
 
         trade.save()
 
-        if target_shift.owner.email:
-            subject = f"🔄 Nova Proposta de Troca: {target_shift.start_time.strftime('%d/%m')}"
-
-            context = {
+        requester_name = request.user.full_name or request.user.email
+        notify(
+            target_shift.owner,
+            NotificationEvent.Kind.TRADE_PROPOSAL,
+            title=(
+                f"🔄 {requester_name} propôs troca para o seu plantão de "
+                f"{timezone.localtime(target_shift.start_time).strftime('%d/%m %H:%M')}"
+            ),
+            subject=f"🔄 Nova Proposta de Troca: {target_shift.start_time.strftime('%d/%m')}",
+            template_name="shifts/emails/trade_proposal.html",
+            context={
                 "requester": request.user,
                 "target": target_shift,
                 "offered": trade.offered_shift,
                 "msg": msg,
                 "dashboard_url": f"{request.scheme}://{request.get_host()}/dashboard/",
-            }
-
-            html_content = render_to_string(
-                "shifts/emails/trade_proposal.html", context
-            )
-            text_content = strip_tags(html_content)
-
-            send_email_background(
-                subject=subject,
-                message=text_content,
-                recipient_list=[target_shift.owner.email],
-                html_message=html_content,
-            )
+            },
+            group=target_shift.group,
+        )
 
         messages.success(request, "Proposta enviada com sucesso.")
         return HttpResponseRedirect(_get_redirect_url(request))
@@ -520,106 +655,208 @@ def create_trade_request(request):
 @login_required
 @transaction.atomic
 def accept_trade_request(request, trade_id):
-    trade = get_object_or_404(TradeRequest, id=trade_id)
+    trade = get_object_or_404(
+        TradeRequest.objects.select_related(
+            "group", "requester", "target_shift", "offered_shift"
+        ),
+        id=trade_id,
+    )
 
     if request.user != trade.target_shift.owner:
         messages.error(request, "Ação não autorizada.")
         return redirect("dashboard")
 
-    if trade.status != TradeRequest.Status.PENDING:
-        messages.warning(request, "Solicitação já finalizada.")
+    # Trava as linhas e aplica a troca com UPDATEs condicionais: um aceite
+    # concorrente (ou uma recusa) que chegar antes faz este falhar
+    try:
+        accept_trade(trade, request.user)
+    except TradeConflict as exc:
+        messages.warning(request, str(exc))
         return redirect("dashboard")
 
-    # Executa a Troca
-    t_shift = trade.target_shift
-    o_shift = trade.offered_shift
-
-    t_shift.owner = trade.requester
-    t_shift.tradable = False
-    t_shift.save()
-
-    if o_shift:
-        o_shift.owner = request.user  # Aceitante
-        o_shift.tradable = False
-        o_shift.save()
-
-    trade.status = TradeRequest.Status.APPROVED
-    trade.save()
-
-    # Cancela outras propostas pendentes para o mesmo plantão
-
-    TradeRequest.objects.filter(
-        target_shift=trade.target_shift, status=TradeRequest.Status.PENDING
-    ).update(status=TradeRequest.Status.REJECTED)
-
     # Notifica
 
-    _send_trade_notification(trade)
+    send_trade_notification(trade)
     messages.success(request, "Troca realizada!")
 
     return HttpResponseRedirect(_get_redirect_url(request))
 
 
 @login_required
+@transaction.atomic
 def reject_trade_request(request, trade_id):
-    trade = get_object_or_404(TradeRequest, id=trade_id)
+    trade = get_object_or_404(
+        TradeRequest.objects.select_related("group", "requester", "target_shift"),
+        id=trade_id,
+    )
 
     if request.user != trade.target_shift.owner:
         messages.error(request, "Ação não autorizada.")
         return redirect("dashboard")
 
-    trade.status = TradeRequest.Status.REJECTED
-    trade.save()
+    try:
+        reject_trade(trade, request.user)
+    except TradeConflict as exc:
+        messages.warning(request, str(exc))
+        return redirect("dashboard")
 
     # Notifica
 
-    _send_trade_notification(trade)
+    send_trade_notification(trade)
     messages.info(request, "Proposta recusada.")
 
     return HttpResponseRedirect(_get_redirect_url(request))
 
 
-def _send_trade_notification(trade):
+def _posted_trade_ids(request):
+    return [int(pk) for pk in request.POST.getlist("trade_ids") if pk.isdigit()]
+
+
+@login_required
+@transaction.atomic
+def bulk_accept_trade_requests(request):
+    """Aceita as propostas marcadas na caixa de entrada, em uma transação."""
+    if request.method != "POST":
+        return redirect("dashboard")
+
+    trade_ids = _posted_trade_ids(request)
+    try:
+        trades, _ = bulk_accept_trades(trade_ids, request.user)
+    except TradeConflict as exc:
+        messages.warning(request, str(exc))
+        return redirect("dashboard")
+
+    # Notifica: um e-mail por solicitante
+    send_trade_notifications(trades)
+
+    if trades:
+        messages.success(request, f"{len(trades)} troca(s) realizada(s)!")
+    skipped = len(set(trade_ids)) - len(trades)
+    if skipped:
+        messages.warning(
+            request, f"{skipped} proposta(s) não puderam ser aceitas e ficaram de fora."
+        )
+    return HttpResponseRedirect(_get_redirect_url(request))
+
+
+@login_required
+@transaction.atomic
+def bulk_reject_trade_requests(request):
+    """Recusa as propostas marcadas na caixa de entrada com um único UPDATE."""
+    if request.method != "POST":
+        return redirect("dashboard")
+
+    trades = bulk_reject_trades(_posted_trade_ids(request), request.user)
+
+    send_trade_notifications(trades)
+
+    if trades:
+        messages.info(request, f"{len(trades)} proposta(s) recusada(s).")
+    else:
+        messages.warning(request, "Nenhuma proposta pendente selecionada.")
+    return HttpResponseRedirect(_get_redirect_url(request))
+
+
+@login_required
+def swap_candidates_view(request, shift_id):
     """
-    Centraliza o envio de emails de troca (Aprovada ou Recusada) usando Background Task.
+    Sugestões de troca para o plantão: para o modal de proposta (htmx, as
+    opções do select de contra-oferta) ou em JSON.
     """
-    if not trade.requester.email:
-        return
-
-    # Usa o Enum do Model para evitar erros de digitação
-    if trade.status == TradeRequest.Status.APPROVED:
-        subject_prefix = "✅ Troca Confirmada"
-        template_name = "shifts/emails/trade_accepted.html"
-        title_text = "Sua proposta foi aceita!"
-        color_theme = "#198754"
-        message_body = "Boas notícias! Sua proposta de troca foi confirmada."
-    else:
-        subject_prefix = "❌ Troca Recusada"
-        template_name = "shifts/emails/trade_rejected.html"
-        title_text = "Proposta não aceita"
-        color_theme = "#dc3545"
-        message_body = (
-            "Infelizmente sua proposta de troca não pôde ser aceita neste momento."
+    target = get_object_or_404(
+        Shift.objects.select_related("group"),
+        id=shift_id,
+        group__members=request.user,
+    )
+    candidates = swap_candidates(target, request.user)
+
+    if request.htmx:
+        return render(
+            request,
+            "shifts/components/swap_candidates.html",
+            {"candidates": candidates},
         )
 
-    subject = f"{subject_prefix}: Dia {trade.target_shift.start_time.strftime('%d/%m')}"
+    return JsonResponse(
+        {
+            "target": target.id,
+            "candidates": [
+                {
+                    "id": slot.id,
+                    "owner": slot.owner_name,
+                    "shift_type": slot.shift_type_name,
+                    "duration": slot.duration,
+                    "start_time": slot.start.isoformat(),
+                    "end_time": slot.end.isoformat(),
+                    "tradable": slot.tradable,
+                }
+                for slot in candidates
+            ],
+        }
+    )
 
-    context = {
-        "requester_name": trade.requester.full_name or trade.requester.email,
-        "shift_date": trade.target_shift.start_time.strftime("%d/%m/%Y às %H:%M"),
-        "group_name": trade.group.name,
-        "dashboard_url": f"{getattr(settings, 'BASE_URL', 'http://127.0.0.1:8000')}/dashboard/",
-        "title_text": title_text,
-        "message_body": message_body,
-        "color_scheme": color_theme,
-    }
 
-    html_content = render_to_string(template_name, context)
-    text_content = strip_tags(html_content)
+@login_required
+@cache_control(private=True, no_cache=True)
+def marketplace(request):
+    """
+    Mural de trocas do grupo ativo: plantões ofertados que ainda não
+    começaram, filtráveis por período e tipo. Com htmx devolve só a lista
+    (mudança de filtro) ou a página seguinte ("Carregar mais").
+    """
+    active_group = _resolve_active_group(request)
+    if not active_group:
+        if request.htmx:
+            return HttpResponseClientRedirect(reverse("dashboard"))
+        return redirect("dashboard")
+
+    def parse_date(name):
+        try:
+            return date.fromisoformat(request.GET.get(name, ""))
+        except ValueError:
+            return None
+
+    date_from, date_to = parse_date("date_from"), parse_date("date_to")
+    filter_type_id = request.GET.get("filter_type")
+    if not (filter_type_id or "").isdigit():
+        filter_type_id = None
+
+    start, end = date_range(date_from, date_to)
+    page, has_more = marketplace_page(
+        active_group,
+        request.GET.get("cursor"),
+        start=start,
+        end=end,
+        shift_type_id=filter_type_id,
+    )
+
+    next_query = None
+    if has_more:
+        # Um dia nunca fica partido entre duas páginas
+        page = drop_trailing_day(page)
+        params = request.GET.copy()
+        params["group_id"] = active_group.id
+        params["cursor"] = shift_cursor(page[-1])
+        next_query = params.urlencode()
 
-    send_email_background(
-        subject=subject,
-        message=text_content,
-        recipient_list=[trade.requester.email],
-        html_message=html_content,
+    context = {
+        "active_group": active_group,
+        "agenda_days": build_extract_agenda(page, timezone.localdate()),
+        "marketplace_next_query": next_query,
+        "inbox": SimpleLazyObject(
+            lambda: TradeInbox.for_user(request.user, active_group)
+        ),
+    }
+    if request.htmx:
+        return render(request, "shifts/components/marketplace_page.html", context)
+
+    context.update(
+        {
+            "group_shift_types": group_shift_types(active_group.id),
+            "open_offers": open_offers_count(active_group.id),
+            "date_from": date_from,
+            "date_to": date_to,
+            "selected_type_id": filter_type_id,
+        }
     )
+    return render(request, "shifts/marketplace.html", context)
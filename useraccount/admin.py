@@ -22,7 +22,7 @@ class CustomUserAdmin(UserAdmin):
         ),
         (
             "Informações Pessoais",
-            {"fields": ("full_name", "phone", "role")},
+            {"fields": ("full_name", "phone", "role", "notification_delivery")},
         ),
         (
             "Permissões",
@@ -21,7 +21,7 @@ class CustomUserChangeForm(UserChangeForm):
 class UserProfileForm(forms.ModelForm):
     class Meta:
         model = User
-        fields = ["full_name", "email", "phone", "role"]
+        fields = ["full_name", "email", "phone", "role", "notification_delivery"]
 
         widgets = {
             "full_name": forms.TextInput(
@@ -34,12 +34,14 @@ class UserProfileForm(forms.ModelForm):
                 attrs={"class": "form-control", "placeholder": "(11) 99999-9999"}
             ),
             "role": forms.Select(attrs={"class": "form-select"}),
+            "notification_delivery": forms.Select(attrs={"class": "form-select"}),
         }
         labels = {
             "full_name": "Nome Completo",
             "email": "E-mail",
             "phone": "Telefone (WhatsApp)",
             "role": "Função/Cargo",
+            "notification_delivery": "Avisos de Trocas e Oportunidades",
         }
 
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-18 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('useraccount', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='notification_delivery',
+            field=models.CharField(choices=[('IMMEDIATE', 'Imediato (um e-mail por aviso)'), ('HOURLY', 'Resumo a cada hora'), ('DAILY', 'Resumo diário')], default='IMMEDIATE', max_length=10, verbose_name='Recebimento de Avisos'),
+        ),
+    ]
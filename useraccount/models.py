@@ -34,6 +34,11 @@ class User(AbstractBaseUser, PermissionsMixin):
         RESIDENT = "RESIDENT", "Residente"
         ADMIN = "ADMIN", "Gestor/Chefe"
 
+    class NotificationDelivery(models.TextChoices):
+        IMMEDIATE = "IMMEDIATE", "Imediato (um e-mail por aviso)"
+        HOURLY = "HOURLY", "Resumo a cada hora"
+        DAILY = "DAILY", "Resumo diário"
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     email = models.EmailField(unique=True)
     full_name = models.CharField("Nome Completo", max_length=255, blank=True)
@@ -46,6 +51,12 @@ class User(AbstractBaseUser, PermissionsMixin):
         default=Role.RESIDENT,
         verbose_name="Tipo de Perfil",
     )
+    notification_delivery = models.CharField(
+        max_length=10,
+        choices=NotificationDelivery.choices,
+        default=NotificationDelivery.IMMEDIATE,
+        verbose_name="Recebimento de Avisos",
+    )
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)